@@ -0,0 +1,267 @@
+"""Engine benchmarks: synthetic tables, timed operations, JSON report.
+
+Each (format, size) case runs in a fresh interpreter inside its own temporary
+directory, so caches start cold and the peak RSS belongs to that case alone.
+
+    python benchmarks/bench.py --rows 1k 100k --formats json mmap --out bench.json
+    python benchmarks/bench.py --rows 100k --baseline bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+TABLE = "bench"
+SCHEMA = {"name": "str", "n": "int", "score": "float", "flag": "bool"}
+# A range select covers about this share of the table.
+RANGE_FRACTION = 0.01
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text: str) -> int:
+    """`1000`, `10k`, `10M` -> row count."""
+    text = text.strip().lower()
+    mult = SIZE_SUFFIXES.get(text[-1:], 1)
+    digits = text[:-1] if mult != 1 else text
+    try:
+        value = int(float(digits) * mult)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"не число строк: {text}") from None
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"нужно положительное число строк: {text}")
+    return value
+
+
+def records(count: int, seed: int) -> Iterator[dict[str, Any]]:
+    """Synthetic rows as the loader receives them: raw string values, `n` in 0..count-1."""
+    rnd = random.Random(seed)
+    for i in range(count):
+        yield {
+            "name": f"user{i}",
+            "n": str(rnd.randrange(count)),
+            "score": f"{rnd.random() * 100:.3f}",
+            "flag": "true" if i % 2 else "false",
+        }
+
+
+def summarize(seconds: list[float], rows: int | None = None) -> dict[str, Any]:
+    """Throughput and latency percentiles of one operation's timings."""
+    ordered = sorted(seconds)
+    total = sum(ordered)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    done = rows if rows is not None else len(ordered)
+    return {
+        "count": len(ordered),
+        "seconds": round(total, 6),
+        "per_second": round(done / total, 1) if total else None,
+        "p50_ms": round(pct(0.50), 4),
+        "p99_ms": round(pct(0.99), 4),
+    }
+
+
+def run_case(fmt: str, rows: int, ops: int, seed: int, index: bool) -> dict[str, Any]:
+    """Build one table and time every operation on it (runs in the current directory)."""
+    from primitive_db.engine import DbEngine
+    from primitive_db.parser import parse_where, split_where
+
+    engine = DbEngine()
+    rnd = random.Random(seed + 1)
+
+    def where(text: str) -> Any:
+        return engine.resolve_where(TABLE, parse_where(split_where(f"where {text}")))
+
+    def timed(action: Callable[[], Any], count: int) -> list[float]:
+        times = []
+        for _ in range(count):
+            start = time.perf_counter()
+            with engine.command():
+                action()
+            times.append(time.perf_counter() - start)
+        return times
+
+    results: dict[str, Any] = {}
+    engine.create_table(TABLE, dict(SCHEMA), fmt)
+    start = time.perf_counter()
+    with engine.command():
+        engine.load_rows(TABLE, records(rows, seed))
+    results["load"] = summarize([time.perf_counter() - start], rows)
+    if index:
+        engine.create_index(TABLE, "n", "sorted")
+
+    def insert() -> None:
+        values = {"name": "extra", "n": str(rnd.randrange(rows)), "score": "1.5", "flag": "true"}
+        engine.insert_rows(TABLE, [engine.validate_and_build_row(TABLE, values)])
+
+    def point_select() -> None:
+        list(engine.iter_rows(TABLE, where(f"id = {rnd.randint(1, rows)}")))
+
+    width = max(1, int(rows * RANGE_FRACTION))
+
+    def range_select() -> None:
+        low = rnd.randrange(rows)
+        list(engine.iter_rows(TABLE, where(f"n >= {low} and n < {low + width}")))
+
+    def update() -> None:
+        updates = engine.cast_update_values(TABLE, {"score": f"{rnd.random():.3f}"})
+        with engine.writing(TABLE):
+            found = engine.find_rows(TABLE, where(f"id = {rnd.randint(1, rows)}"))
+            engine.update_rows(TABLE, found, updates)
+
+    # Each delete removes a different row, so none of them is a no-op.
+    doomed = iter(rnd.sample(range(1, rows + 1), min(ops, rows)))
+
+    def delete() -> None:
+        with engine.writing(TABLE):
+            engine.delete_rows(TABLE, engine.find_rows(TABLE, where(f"id = {next(doomed)}")))
+
+    for name, action in [
+        ("insert", insert),
+        ("point_select", point_select),
+        ("range_select", range_select),
+        ("update", update),
+        ("delete", delete),
+    ]:
+        results[name] = summarize(timed(action, ops if name != "delete" else min(ops, rows)))
+    engine.close()
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_kb = peak // 1024 if sys.platform == "darwin" else peak
+    return {"format": fmt, "rows": rows, "ops": ops, "operations": results, "peak_rss_kb": peak_kb}
+
+
+def spawn_case(fmt: str, rows: int, args: argparse.Namespace) -> dict[str, Any]:
+    """Run one case in a child interpreter with a scratch working directory."""
+    from primitive_db.constants import SCAN_WORKERS_ENV_VAR
+
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--case", fmt, str(rows)]
+    cmd += ["--ops", str(args.ops), "--seed", str(args.seed)]
+    if args.index:
+        cmd.append("--index")
+    env = os.environ | {
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))
+    }
+    if args.workers is not None:
+        env[SCAN_WORKERS_ENV_VAR] = str(args.workers)
+    with tempfile.TemporaryDirectory(prefix="primitive_db_bench_") as workdir:
+        proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{fmt}/{rows}: {proc.stderr.strip().splitlines()[-1:]}")
+    return json.loads(proc.stdout)
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Lines for every p50 that got slower than the baseline by more than `threshold`."""
+    old = {(c["format"], c["rows"]): c["operations"] for c in baseline.get("results", [])}
+    lines = []
+    for case in report["results"]:
+        before = old.get((case["format"], case["rows"]))
+        if before is None:
+            continue
+        for name, stats in case["operations"].items():
+            was = before.get(name, {}).get("p50_ms")
+            if was and stats["p50_ms"] > was * (1 + threshold):
+                lines.append(
+                    f"{case['format']}/{case['rows']} {name}: "
+                    f"p50 {was:.3f} -> {stats['p50_ms']:.3f} ms (x{stats['p50_ms'] / was:.2f})"
+                )
+    return lines
+
+
+def print_table(report: dict[str, Any]) -> None:
+    print(f"{'case':<18}{'operation':<14}{'per second':>14}{'p50 ms':>12}{'p99 ms':>12}")
+    for case in report["results"]:
+        label = f"{case['format']}/{case['rows']}"
+        for name, stats in case["operations"].items():
+            rate = f"{stats['per_second']:.1f}" if stats["per_second"] else "-"
+            print(
+                f"{label:<18}{name:<14}{rate:>14}{stats['p50_ms']:>12.3f}{stats['p99_ms']:>12.3f}"
+            )
+        print(f"{label:<18}{'peak RSS':<14}{case['peak_rss_kb'] / 1024:>13.1f}M")
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    from primitive_db.constants import SCAN_WORKERS_ENV_VAR, TABLE_FORMATS
+
+    parser = argparse.ArgumentParser(description="Primitive DB benchmarks")
+    parser.add_argument("--rows", nargs="+", type=parse_size, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--formats", nargs="+", choices=TABLE_FORMATS, default=list(TABLE_FORMATS))
+    parser.add_argument("--ops", type=int, default=200, help="запросов на операцию")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--index", action="store_true", help="sorted-индекс по столбцу n")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help=f"процессов для параллельных сканов (иначе ${SCAN_WORKERS_ENV_VAR})",
+    )
+    parser.add_argument("--out", help="куда записать JSON-отчёт")
+    parser.add_argument("--baseline", help="прошлый отчёт: показать замедления")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допуск замедления (доля)")
+    parser.add_argument("--case", nargs=2, metavar=("FORMAT", "ROWS"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    if args.case is not None:
+        fmt, rows = args.case
+        print(json.dumps(run_case(fmt, int(rows), args.ops, args.seed, args.index)))
+        return 0
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "ops": args.ops,
+            "seed": args.seed,
+            "index": args.index,
+            "workers": args.workers,
+        },
+        "results": [],
+    }
+    for rows in args.rows:
+        for fmt in args.formats:
+            print(f"... {fmt}/{rows}", file=sys.stderr)
+            report["results"].append(spawn_case(fmt, rows, args))
+    print_table(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        slower = compare(report, baseline, args.threshold)
+        for line in slower:
+            print(f"Медленнее: {line}")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(ROOT))
+    raise SystemExit(main())
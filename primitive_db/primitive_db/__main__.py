@@ -0,0 +1,5 @@
+from __future__ import annotations
+
+from primitive_db.main import main
+
+raise SystemExit(main())
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from operator import add, itemgetter
+from typing import Any
+
+Row = dict[str, Any]
+
+# How each value-based aggregate folds a new value into its accumulator.
+_STEPS: dict[str, Callable[[Any, Any], Any]] = {"sum": add, "avg": add, "min": min, "max": max}
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """`func(column)`; `column` is None for `count(*)`."""
+
+    func: str
+    column: str | None = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.func}({self.column or '*'})"
+
+
+SelectItem = str | Aggregate
+
+
+def item_label(item: SelectItem) -> str:
+    return item.label if isinstance(item, Aggregate) else item
+
+
+def check_items(
+    schema: dict[str, str], items: tuple[SelectItem, ...], group_by: tuple[str, ...]
+) -> None:
+    """Reject unknown columns, non-numeric sum/avg and plain items missing from group by."""
+    for col in group_by:
+        if col not in schema:
+            raise ValueError(f"Неизвестный столбец: {col}")
+    for item in items:
+        if not isinstance(item, Aggregate):
+            if item not in group_by:
+                raise ValueError(f"Столбец {item} должен быть в group by.")
+        elif item.column is not None and item.column not in schema:
+            raise ValueError(f"Неизвестный столбец: {item.column}")
+        elif item.func in {"sum", "avg"} and schema[item.column] not in {"int", "float"}:
+            raise ValueError(f"{item.func}: столбец {item.column} не числовой.")
+
+
+def key_getter(columns: tuple[str, ...]) -> Callable[[Row], Any]:
+    """Group key of a row: () with no columns, the bare value for one, a tuple for more."""
+    if not columns:
+        return lambda r: ()
+    return itemgetter(*columns)
+
+
+def _key_values(columns: tuple[str, ...], key: Any) -> tuple[Any, ...]:
+    return key if len(columns) != 1 else (key,)
+
+
+def hash_aggregate(
+    rows: Iterable[Row], items: tuple[SelectItem, ...], group_by: tuple[str, ...]
+) -> list[Row]:
+    """Evaluate `items` per group in one pass over `rows` (hash aggregation).
+
+    Each group keeps one accumulator list: the row count first, then one slot per
+    aggregate. Counts are read off the row count, so only sum/avg/min/max touch values.
+    Without `group_by` there is exactly one group, even over no rows.
+    """
+    aggs = [i for i in items if isinstance(i, Aggregate)]
+    valued = [
+        (slot, _STEPS[a.func], itemgetter(a.column))
+        for slot, a in enumerate(aggs, 1)
+        if a.func != "count"
+    ]
+    key_of = key_getter(group_by)
+    blank = [0] + [None] * len(aggs)
+    groups: dict[Any, list[Any]] = {}
+    for row in rows:
+        key = key_of(row)
+        acc = groups.get(key)
+        if acc is None:
+            acc = groups[key] = blank.copy()
+        acc[0] += 1
+        for slot, step, get in valued:
+            cur = acc[slot]
+            acc[slot] = get(row) if cur is None else step(cur, get(row))
+    if not group_by and not groups:
+        groups[()] = blank.copy()
+    return [finish(items, group_by, _key_values(group_by, key), acc) for key, acc in groups.items()]
+
+
+def finish(
+    items: tuple[SelectItem, ...],
+    group_by: tuple[str, ...],
+    key: tuple[Any, ...],
+    acc: list[Any],
+) -> Row:
+    """Output row of one group from its key values and accumulator list."""
+    keys = dict(zip(group_by, key, strict=True))
+    row: Row = {}
+    slot = 0
+    for item in items:
+        if not isinstance(item, Aggregate):
+            row[item] = keys[item]
+            continue
+        slot += 1
+        if item.func == "count":
+            row[item.label] = acc[0]
+        elif item.func == "avg":
+            row[item.label] = None if acc[slot] is None else acc[slot] / acc[0]
+        else:
+            row[item.label] = acc[slot]
+    return row
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from primitive_db import profile
+from primitive_db.compact import CompactTable
+from primitive_db.constants import CACHE_ENV_VAR, TABLE_CACHE_BYTES
+from primitive_db.utils import file_stamp, read_json
+
+
+def cache_budget() -> int:
+    """Byte budget from $PRIMITIVE_DB_CACHE_MB (megabytes; 0 disables caching)."""
+    raw = os.environ.get(CACHE_ENV_VAR)
+    if raw is None:
+        return TABLE_CACHE_BYTES
+    try:
+        mb = float(raw)
+    except ValueError:
+        mb = -1
+    if mb < 0:
+        raise ValueError(
+            f"{CACHE_ENV_VAR}: ожидалось неотрицательное число мегабайт, а не {raw!r}."
+        )
+    return int(mb * (1 << 20))
+
+
+@dataclass
+class _Entry:
+    stamp: tuple[int, int, int]
+    table: CompactTable
+    size: int
+
+
+class TableCache:
+    """Parsed JSON tables as `CompactTable`s, least recently used out first over a budget.
+
+    An entry is valid only while the file's (mtime_ns, size, inode) stamp is unchanged,
+    so a change by another process is noticed even within the same mtime tick. Sizes
+    are the files' JSON sizes: a stable measure that is cheap to get, and close to the
+    memory the columns take. A table larger than the whole budget is not kept.
+
+    Cached tables are shared by every reader and never change: writers build new
+    ones and hand them back with `put`, so a failed write never leaves a modified
+    cached version.
+    """
+
+    def __init__(self, budget: int = TABLE_CACHE_BYTES) -> None:
+        self.budget = budget
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read(self, path: str, schema: dict[str, str]) -> CompactTable:
+        stamp = file_stamp(path)
+        if not any(stamp):
+            return CompactTable.from_rows(schema, [])
+        entry = self._entries.get(path)
+        if entry is not None and entry.stamp == stamp:
+            self.hits += 1
+            profile.count("cache_hit")
+            self._entries.move_to_end(path)
+            return entry.table
+        self.misses += 1
+        profile.count("cache_miss")
+        with profile.phase("load"):
+            rows = read_json(path)
+            if not isinstance(rows, list):
+                raise ValueError("Файл таблицы повреждён (ожидался список записей).")
+            try:
+                table = CompactTable.from_rows(schema, rows)
+            except (KeyError, TypeError) as exc:
+                raise ValueError("Файл таблицы повреждён (записи не совпадают со схемой).") from exc
+        self._store(path, stamp, table)
+        return table
+
+    def put(self, path: str, table: CompactTable) -> None:
+        """Cache the table just written to `path`, so the next read does not parse it."""
+        self._store(path, file_stamp(path), table)
+
+    def invalidate(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _store(self, path: str, stamp: tuple[int, int, int], table: CompactTable) -> None:
+        self.invalidate(path)
+        size = stamp[1]
+        if size > self.budget:
+            return
+        self._entries[path] = _Entry(stamp, table, size)
+        self.size += size
+        while self.size > self.budget:
+            _, old = self._entries.popitem(last=False)
+            self.size -= old.size
+            self.evictions += 1
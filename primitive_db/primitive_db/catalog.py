@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from primitive_db import profile
+from primitive_db.constants import ID_BLOCK_SIZE, LOCK_SUFFIX, META_FILE
+from primitive_db.locks import FileLocks
+from primitive_db.utils import file_stamp, read_json, write_json
+
+
+class MetaCatalog:
+    """In-memory copy of db_meta.json.
+
+    The file is re-read only when its (mtime_ns, size) changes, and inside `pinned()`
+    it is checked once for the whole block. Row ids are reserved from the file in
+    blocks, so most inserts do not touch the meta file at all; unused ids are handed
+    back by `release_ids()` on a clean shutdown. Every read-modify-write of the file
+    holds an exclusive lock on `<path>.lock`, so concurrent processes do not lose
+    each other's changes; plain reads need no lock because saves are atomic renames
+    (fsync'ed unless `sync` is off).
+    """
+
+    def __init__(
+        self,
+        path: str = META_FILE,
+        id_block: int = ID_BLOCK_SIZE,
+        locks: FileLocks | None = None,
+        sync: bool = True,
+    ) -> None:
+        self._path = path
+        self._id_block = id_block
+        self._locks = locks or FileLocks()
+        self._sync = sync
+        self._lock_path = f"{path}{LOCK_SUFFIX}"
+        self._meta: dict[str, Any] = {"tables": {}}
+        self._stamp: tuple[int, int, int] | None = None
+        self._ids: dict[str, list[int]] = {}
+        self._pinned = 0
+
+    def reload_if_changed(self) -> None:
+        with profile.phase("meta"):
+            stamp = file_stamp(self._path)
+            if stamp == self._stamp:
+                return
+            meta = read_json(self._path)
+        if "tables" not in meta or not isinstance(meta["tables"], dict):
+            raise ValueError("Метаданные повреждены: отсутствует 'tables'.")
+        self._meta = meta
+        self._stamp = stamp
+        # A reserved block stays ours while the file still records it as taken.
+        for table, (_, limit) in list(self._ids.items()):
+            info = meta["tables"].get(table)
+            if info is None or int(info["next_id"]) < limit:
+                del self._ids[table]
+
+    @contextmanager
+    def pinned(self) -> Iterator[None]:
+        """Check the file once, then serve from memory until the block exits."""
+        self.reload_if_changed()
+        self._pinned += 1
+        try:
+            yield
+        finally:
+            self._pinned -= 1
+
+    @property
+    def meta(self) -> dict[str, Any]:
+        if not self._pinned:
+            self.reload_if_changed()
+        return self._meta
+
+    @property
+    def tables(self) -> dict[str, Any]:
+        return self.meta["tables"]
+
+    def table(self, name: str) -> dict[str, Any]:
+        info = self.tables.get(name)
+        if info is None:
+            raise ValueError(f"Таблица не найдена: {name}")
+        return info
+
+    def schema(self, name: str) -> dict[str, str]:
+        return self.table(name)["schema"]
+
+    def save(self) -> None:
+        with profile.phase("meta"):
+            write_json(self._path, self._meta, sync=self._sync)
+            self._stamp = file_stamp(self._path)
+
+    @contextmanager
+    def _changing(self) -> Iterator[None]:
+        """Lock the file and reload it; the caller changes `_meta` and calls `save()`."""
+        with self._locks.exclusive(self._lock_path):
+            self.reload_if_changed()
+            yield
+
+    def add_table(self, name: str, info: dict[str, Any]) -> None:
+        with self._changing():
+            if name in self._meta["tables"]:
+                raise ValueError(f"Таблица уже существует: {name}")
+            self._meta["tables"][name] = info
+            self.save()
+
+    @contextmanager
+    def edit_table(self, name: str) -> Iterator[dict[str, Any]]:
+        """Yield the fresh table entry for in-place changes and save it afterwards."""
+        with self._changing():
+            yield self.table(name)
+            self.save()
+
+    def drop_table(self, name: str) -> dict[str, Any]:
+        with self._changing():
+            info = self.table(name)
+            del self._meta["tables"][name]
+            self._ids.pop(name, None)
+            self.save()
+        return info
+
+    def next_id(self, table: str) -> int:
+        block = self._ids.get(table)
+        if block is None or block[0] >= block[1]:
+            # Reserving must see the latest file even when pinned.
+            with self._changing():
+                info = self.table(table)
+                start = int(info["next_id"])
+                info["next_id"] = start + self._id_block
+                self.save()
+            block = [start, start + self._id_block]
+            self._ids[table] = block
+        block[0] += 1
+        return block[0] - 1
+
+    def reserve_ids(self, table: str, count: int) -> range:
+        """Take `count` consecutive ids with a single meta write."""
+        with self._changing():
+            info = self.table(table)
+            start = int(info["next_id"])
+            info["next_id"] = start + count
+            self.save()
+        return range(start, start + count)
+
+    def release_ids(self) -> None:
+        """Give back reserved but unused ids if nobody reserved after us."""
+        if not self._ids:
+            return
+        with self._changing():
+            changed = False
+            for table, (cursor, limit) in self._ids.items():
+                info = self._meta["tables"].get(table)
+                if info is not None and int(info["next_id"]) == limit:
+                    info["next_id"] = cursor
+                    changed = True
+            self._ids.clear()
+            if changed:
+                self.save()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import queue
+import socket
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+from primitive_db.constants import CLIENT_POOL_SIZE, SERVER_HOST, SERVER_PORT
+
+
+class Connection:
+    """One socket to a `DbServer`; `pipeline` sends a batch before reading any reply."""
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+        self._sock = socket.create_connection((host, port))
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rwb")
+
+    def execute(self, command: str) -> str:
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands: Iterable[str]) -> list[str]:
+        """Send all commands in one write, then read the replies in order.
+
+        Every reply is read even if one is an error, so the connection stays usable;
+        the first error is raised afterwards.
+        """
+        commands = list(commands)
+        if any("\n" in c for c in commands):
+            raise ValueError("Команда не может содержать перевод строки.")
+        self._file.write("".join(f"{c}\n" for c in commands).encode("utf-8"))
+        self._file.flush()
+        replies = [self._receive() for _ in commands]
+        for ok, body in replies:
+            if not ok:
+                raise ValueError(body)
+        return [body for _, body in replies]
+
+    def _receive(self) -> tuple[bool, str]:
+        header = self._file.readline()
+        if not header:
+            raise ConnectionError("Сервер закрыл соединение.")
+        status, size = header.split()
+        body = self._file.read(int(size)).decode("utf-8")
+        return status == b"ok", body
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+
+class Client:
+    """Thread-safe pool of up to `size` connections, opened on demand and reused.
+
+    `execute`/`pipeline` borrow any free connection. A transaction must stay on one
+    connection, so run it inside `with client.connection() as conn:`.
+    """
+
+    def __init__(
+        self, host: str = SERVER_HOST, port: int = SERVER_PORT, size: int = CLIENT_POOL_SIZE
+    ) -> None:
+        self._address = (host, port)
+        self._idle: queue.LifoQueue[Connection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = Connection(*self._address)
+            broken = False
+            try:
+                yield conn
+            except OSError:
+                broken = True
+                raise
+            finally:
+                if broken:
+                    conn.close()  # The stream may be out of sync: do not reuse it.
+                else:
+                    self._idle.put(conn)
+
+    def execute(self, command: str) -> str:
+        with self.connection() as conn:
+            return conn.execute(command)
+
+    def pipeline(self, commands: Iterable[str]) -> list[str]:
+        with self.connection() as conn:
+            return conn.pipeline(commands)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def __enter__(self) -> Client:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
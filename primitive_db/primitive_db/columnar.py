@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import struct
+import sys
+from array import array
+from collections.abc import Collection, Sequence
+from itertools import chain, pairwise
+from typing import Any
+
+MAGIC = b"PDBCOL1\n"
+_HEADER_LEN = struct.Struct("<I")
+
+Column = Sequence[Any]
+# Where a column part lies in the file: (offset, size).
+_Span = tuple[int, int]
+
+# Byte value -> its 8 bits as bools, least significant first (bitmap decoding).
+_BYTE_BITS = [tuple(bool(b >> i & 1) for i in range(8)) for b in range(256)]
+
+
+def _le(arr: array) -> array:
+    """Arrays are stored little-endian regardless of the host."""
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+def new_column(type_name: str, values: Sequence[Any] = ()) -> Column:
+    """In-memory column: typed arrays for numbers, lists for bool/str."""
+    if type_name == "int":
+        try:
+            return array("q", values)
+        except OverflowError as exc:
+            raise ValueError("Значение int не помещается в 64 бита.") from exc
+    if type_name == "float":
+        return array("d", values)
+    return list(values)
+
+
+def _encode_column(type_name: str, values: Column) -> list[bytes]:
+    if type_name in {"int", "float"}:
+        return [_le(new_column(type_name, values)).tobytes()]
+    if type_name == "bool":
+        bits = bytearray((len(values) + 7) // 8)
+        for i, v in enumerate(values):
+            if v:
+                bits[i >> 3] |= 1 << (i & 7)
+        return [bytes(bits)]
+    blobs = [str(v).encode("utf-8") for v in values]
+    offsets = array("q", [0])
+    total = 0
+    for b in blobs:
+        total += len(b)
+        offsets.append(total)
+    return [_le(offsets).tobytes(), b"".join(blobs)]
+
+
+def _decode_column(type_name: str, n: int, parts: list[bytes]) -> Column:
+    if type_name in {"int", "float"}:
+        arr = array("q" if type_name == "int" else "d")
+        arr.frombytes(parts[0])
+        return _le(arr)
+    if type_name == "bool":
+        return list(chain.from_iterable(map(_BYTE_BITS.__getitem__, parts[0])))[:n]
+    offsets = array("q")
+    offsets.frombytes(parts[0])
+    return _split_blob(parts[1], _le(offsets))
+
+
+def _split_blob(blob: bytes, offsets: Sequence[int]) -> list[str]:
+    """Strings of a str column: `blob` holds them back to back from `offsets[0]` on."""
+    base = offsets[0]
+    if blob.isascii():
+        # Byte offsets are character offsets: decode once and slice the str.
+        text = blob.decode("ascii")
+        return [text[a - base : b - base] for a, b in pairwise(offsets)]
+    return [blob[a - base : b - base].decode("utf-8") for a, b in pairwise(offsets)]
+
+
+def _decode_range(type_name: str, start: int, stop: int, data: Any, spans: list[_Span]) -> Column:
+    """Rows [start, stop) of one column, read from its parts inside `data`."""
+    at = spans[0][0]
+    if type_name in {"int", "float"}:
+        return _decode_column(type_name, stop - start, [data[at + start * 8 : at + stop * 8]])
+    if type_name == "bool":
+        first, skip = divmod(start, 8)
+        bits = data[at + first : at + (stop + 7) // 8]
+        return _decode_column(type_name, skip + stop - start, [bits])[skip:]
+    offsets = _decode_column("int", stop - start + 1, [data[at + start * 8 : at + stop * 8 + 8]])
+    blob_at = spans[1][0]
+    return _split_blob(data[blob_at + offsets[0] : blob_at + offsets[-1]], offsets)
+
+
+def encode_table(schema: dict[str, str], columns: dict[str, Column]) -> bytes:
+    """Serialise columns as: magic, header length, JSON header, column parts."""
+    n = len(columns["id"]) if "id" in columns else 0
+    header_cols = []
+    payload: list[bytes] = []
+    for name, typ in schema.items():
+        parts = _encode_column(typ, columns[name])
+        header_cols.append([name, typ, [len(p) for p in parts]])
+        payload.extend(parts)
+    header = json.dumps({"rows": n, "columns": header_cols}).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LEN.pack(len(header)), header, *payload])
+
+
+def _parse_layout(data: Any) -> tuple[int, list[tuple[str, str, list[_Span]]]]:
+    """Row count and, per column, its name, type and the (offset, size) of each part."""
+    if bytes(data[: len(MAGIC)]) != MAGIC:
+        raise ValueError("Файл таблицы повреждён (неверная сигнатура columnar).")
+    pos = len(MAGIC)
+    (header_len,) = _HEADER_LEN.unpack_from(data, pos)
+    pos += _HEADER_LEN.size
+    header = json.loads(data[pos : pos + header_len])
+    pos += header_len
+
+    layout = []
+    for name, typ, sizes in header["columns"]:
+        spans = []
+        for size in sizes:
+            spans.append((pos, size))
+            pos += size
+        layout.append((name, typ, spans))
+    return int(header["rows"]), layout
+
+
+def decode_table(data: bytes) -> tuple[int, dict[str, Column]]:
+    n, layout = _parse_layout(data)
+    columns: dict[str, Column] = {}
+    for name, typ, spans in layout:
+        columns[name] = _decode_column(typ, n, [data[pos : pos + size] for pos, size in spans])
+    return n, columns
+
+
+def read_columns(data: Any, names: Collection[str], start: int, stop: int) -> dict[str, Column]:
+    """Rows [start, stop) of the columns `names`, read from `data` (e.g. a file mapping)."""
+    _, layout = _parse_layout(data)
+    return {
+        name: _decode_range(typ, start, stop, data, spans)
+        for name, typ, spans in layout
+        if name in names
+    }
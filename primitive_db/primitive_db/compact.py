@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator
+from itertools import compress, repeat
+from typing import Any
+
+from primitive_db.columnar import Column, new_column
+from primitive_db.predicate import Expr, column_mask
+
+Row = dict[str, Any]
+
+
+def _column(type_name: str, values: Iterable[Any]) -> Column:
+    values = list(values)
+    try:
+        return new_column(type_name, values)
+    except (TypeError, ValueError):
+        return values  # Ints beyond 64 bits or hand-edited values: kept as they are.
+
+
+class CompactTable:
+    """A table held as one column per field instead of one dict per row.
+
+    int and float columns are typed arrays (8 bytes a value, no boxed objects), and
+    column names are stored once instead of in every row, so a cached table takes
+    several times less memory than its list of dicts. Dicts are built only when rows
+    are handed out; filters test whole columns and build dicts for matches only.
+
+    Instances are shared through the table cache and never change: every write
+    returns a new table (arrays are copied, which is a memcpy).
+    """
+
+    def __init__(self, columns: dict[str, Column]) -> None:
+        self.columns = columns
+        self._positions: dict[int, int] | None = None
+
+    @classmethod
+    def from_rows(cls, schema: dict[str, str], rows: list[Row]) -> CompactTable:
+        return cls({c: _column(t, (r[c] for r in rows)) for c, t in schema.items()})
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def row(self, pos: int) -> Row:
+        return {name: col[pos] for name, col in self.columns.items()}
+
+    def rows(self) -> Iterator[Row]:
+        names = list(self.columns)
+        return map(dict, map(zip, repeat(names), zip(*self.columns.values(), strict=True)))
+
+    def take(self, positions: Iterable[int]) -> Iterator[Row]:
+        return map(self.row, positions)
+
+    def positions(self) -> dict[int, int]:
+        """Primary-key map id -> position (built on first use)."""
+        if self._positions is None:
+            self._positions = {rid: i for i, rid in enumerate(self.columns["id"])}
+        return self._positions
+
+    def find(self, ids: Iterable[int]) -> list[int]:
+        """Positions of the rows with `ids`, in table order (unknown ids are skipped)."""
+        pos = self.positions()
+        return sorted(pos[i] for i in ids if i in pos)
+
+    def matches(self, expr: Expr) -> Iterator[int]:
+        """Positions of the rows matching `expr`, tested column by column."""
+        return compress(range(len(self)), column_mask(expr, self.columns))
+
+    def appended(self, rows: list[Row]) -> CompactTable:
+        return CompactTable(
+            {c: _extended(col, [r[c] for r in rows]) for c, col in self.columns.items()}
+        )
+
+    def updated(self, positions: Iterable[int], updates: Row) -> CompactTable:
+        """Copy with `updates` applied to the given rows (unchanged columns are shared)."""
+        columns = dict(self.columns)
+        positions = list(positions)
+        for c, value in updates.items():
+            col = self.columns[c][:]
+            try:
+                for pos in positions:
+                    col[pos] = value
+            except (TypeError, OverflowError):
+                col = list(self.columns[c])
+                for pos in positions:
+                    col[pos] = value
+            columns[c] = col
+        return CompactTable(columns)
+
+    def without(self, positions: Iterable[int]) -> CompactTable:
+        keep = [True] * len(self)
+        for pos in positions:
+            keep[pos] = False
+        return CompactTable({c: _kept(col, keep) for c, col in self.columns.items()})
+
+
+def _extended(col: Column, values: list[Any]) -> Column:
+    """A copy of `col` with `values` appended (as a list if the array cannot hold them)."""
+    out = col[:]
+    try:
+        out.extend(values)
+    except (TypeError, OverflowError):
+        return [*col, *values]
+    return out
+
+
+def _kept(col: Column, keep: list[bool]) -> Column:
+    if isinstance(col, array):
+        return array(col.typecode, compress(col, keep))
+    return list(compress(col, keep))
@@ -5,6 +5,69 @@ from typing import Final
 DATA_DIR: Final[str] = "data"
 META_FILE: Final[str] = "db_meta.json"
 
+TABLE_FORMATS: Final[tuple[str, ...]] = ("json", "log", "columnar", "mmap", "segmented")
+DEFAULT_TABLE_FORMAT: Final[str] = "json"
+LOG_SUFFIX: Final[str] = ".log"
+COLUMNAR_SUFFIX: Final[str] = ".col"
+ROWS_SUFFIX: Final[str] = ".rows"
+SEGMENTS_SUFFIX: Final[str] = ".seg"
+SEGMENT_MANIFEST: Final[str] = "manifest.json"
+# Rows per segment file of a segmented table (a write re-encodes whole segments).
+SEGMENT_ROWS: Final[int] = 65_536
+# Initial byte width of a str slot in fixed-width (mmap) tables; grows on demand.
+STR_MIN_WIDTH: Final[int] = 16
+# Log tables are compacted once the log outgrows both this size and the snapshot.
+LOG_COMPACT_MIN_BYTES: Final[int] = 1 << 20
+# When WAL appends are fsync'ed: every commit, in groups, or never (left to the OS).
+SYNC_MODES: Final[tuple[str, ...]] = ("always", "group", "off")
+DEFAULT_SYNC_MODE: Final[str] = "group"
+SYNC_ENV_VAR: Final[str] = "PRIMITIVE_DB_SYNC"
+# Group commit: one fsync per this many commits, or this long after the first unsynced one.
+WAL_GROUP_COMMITS: Final[int] = 64
+WAL_GROUP_MS: Final[int] = 10
+# Redo record of a commit that changes several tables (in DATA_DIR); it exists only
+# while the tables are being written, or after a crash until another command finishes it.
+COMMIT_INTENT_FILE: Final[str] = "commit.intent"
+INDEX_KINDS: Final[tuple[str, ...]] = ("hash", "sorted")
+DEFAULT_INDEX_KIND: Final[str] = "hash"
+INDEX_SUFFIX: Final[str] = ".idx"
+LOCK_SUFFIX: Final[str] = ".lock"
+# Parsed JSON tables are kept in memory up to this many bytes of table files (LRU).
+TABLE_CACHE_BYTES: Final[int] = 256 << 20
+CACHE_ENV_VAR: Final[str] = "PRIMITIVE_DB_CACHE_MB"
+# The planner skips an index expected to return more than this share of its rows.
+INDEX_SCAN_FRACTION: Final[float] = 0.3
+# Parallel scans of mmap/segmented tables: worker processes (default: none, opt-in), the
+# number of rows to test from which they are used, and how finely a table is split.
+SCAN_WORKERS_ENV_VAR: Final[str] = "PRIMITIVE_DB_SCAN_WORKERS"
+PARALLEL_SCAN_MIN_ROWS: Final[int] = 100_000
+SCAN_PARTITIONS_PER_WORKER: Final[int] = 4
+SCAN_PARTITION_MIN_ROWS: Final[int] = 16_384
+# Row ids are reserved in db_meta.json this many at a time.
+ID_BLOCK_SIZE: Final[int] = 100
+LOAD_FORMATS: Final[tuple[str, ...]] = ("csv", "jsonl")
+# `load` casts and converts the input file this many records at a time.
+LOAD_BATCH_ROWS: Final[int] = 50_000
+OUTPUT_FORMATS: Final[tuple[str, ...]] = ("table", "csv", "tsv", "jsonl")
+DEFAULT_OUTPUT_FORMAT: Final[str] = "table"
+# `select` prints table output in pages of this many rows as they are produced.
+SELECT_PAGE_SIZE: Final[int] = 100
+# `order by` over a sorted index fetches rows this many ids at a time.
+ORDER_FETCH_BATCH: Final[int] = 256
+# A join looks up this many outer rows' values in the inner table's index at once.
+JOIN_BATCH_ROWS: Final[int] = 1024
+AGGREGATE_FUNCS: Final[tuple[str, ...]] = ("count", "sum", "avg", "min", "max")
+# Column statistics: HyperLogLog registers (2**precision) and equi-depth histogram buckets.
+HLL_PRECISION: Final[int] = 10
+HISTOGRAM_BUCKETS: Final[int] = 32
+# Phases a profiled command's time is split into, and the table the numbers go to.
+PROFILE_PHASES: Final[tuple[str, ...]] = ("meta", "load", "cast", "filter", "render", "write")
+PROFILE_TABLE: Final[str] = "query_stats"
+SERVER_HOST: Final[str] = "127.0.0.1"
+SERVER_PORT: Final[int] = 7432
+# Connections kept open by the client pool.
+CLIENT_POOL_SIZE: Final[int] = 4
+
 SUPPORTED_TYPES: Final[dict[str, type]] = {
     "int": int,
     "float": float,
@@ -18,6 +81,6 @@ FALSE_VALUES: Final[set[str]] = {"false", "0", "no", "n", "f"}
 PROMPT_TEXT: Final[str] = "db> "
 WELCOME_TEXT: Final[str] = (
     "Primitive DB\n"
-    "Команды: help, create_table, drop_table, list_tables, insert, select, update, delete, quit\n"
+    "Команды: help, create_table, drop_table, list_tables, insert, load, select, update, delete, create_index, drop_index, compact, checkpoint, analyze, explain, profile, begin, commit, rollback, quit\n"
     "Подсказка: help"
 )
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
+from itertools import islice
+from operator import itemgetter
+from typing import Any
+
 from prettytable import PrettyTable
 
+from primitive_db import profile
+from primitive_db.aggregate import Aggregate, check_items, hash_aggregate, item_label
+from primitive_db.constants import DEFAULT_TABLE_FORMAT, PROFILE_TABLE
 from primitive_db.decorators import confirm_action, handle_db_errors, log_time
-from primitive_db.engine import DbEngine
-from primitive_db.parser import WhereClause, compare
+from primitive_db.engine import DbEngine, order_rows
+from primitive_db.loader import detect_format, iter_records
+from primitive_db.parser import SelectQuery, WhereExpr
+from primitive_db.predicate import Expr
+from primitive_db.profile import profiling
+from primitive_db.render import write_rows
 
 
 class DbCore:
@@ -15,8 +27,10 @@ class DbCore:
 
     @handle_db_errors
     @log_time
-    def create_table(self, name: str, schema: dict[str, str]) -> None:
-        self.engine.create_table(name, schema)
+    def create_table(
+        self, name: str, schema: dict[str, str], fmt: str = DEFAULT_TABLE_FORMAT
+    ) -> None:
+        self.engine.create_table(name, schema, fmt)
         print(f"Таблица создана: {name}")
 
     @handle_db_errors
@@ -43,70 +57,169 @@ class DbCore:
     @log_time
     def insert(self, table: str, assignments: dict[str, str]) -> None:
         row = self.engine.validate_and_build_row(table, assignments)
-        rows = self.engine.read_rows(table)
-        rows.append(row)
-        self.engine.write_rows(table, rows)
+        self.engine.insert_rows(table, [row])
         print("OK (insert)")
 
     @handle_db_errors
     @log_time
-    def select(self, table: str, where_clause: WhereClause | None) -> None:
-        rows = self.engine.read_rows(table)
-
-        where = None
-        if where_clause is not None:
-            value = self.engine.cast_where_value(table, where_clause.column, where_clause.value_raw)
-            where = (where_clause.column, where_clause.op, value)
+    def load(self, table: str, path: str, fmt: str | None = None) -> None:
+        records = iter_records(path, detect_format(path, fmt))
+        count = self.engine.load_rows(table, records)
+        print(f"Загружено строк: {count}")
 
-        result = rows if where is None else [r for r in rows if compare(r.get(where[0]), where[1], where[2])]
-        schema = self.engine.get_schema(table)
+    def _where(self, table: str, where_clause: WhereExpr | None) -> Expr | None:
+        if where_clause is None:
+            return None
+        return self.engine.resolve_where(table, where_clause)
 
-        if not result:
+    @handle_db_errors
+    @log_time
+    def select(self, query: SelectQuery) -> None:
+        rows, columns = self._select_rows(query)
+        with profile.phase("render"):
+            count = write_rows(profile.timed(rows, "filter"), columns, query.output)
+        profile.count("returned", count)
+        if not count and query.output == "table":
             print("Пусто.")
-            return
 
-        t = PrettyTable()
-        t.field_names = list(schema.keys())
-        for r in result:
-            t.add_row([r.get(c) for c in schema.keys()])
-        print(t)
+    @handle_db_errors
+    def explain(self, query: SelectQuery) -> None:
+        """Run the query without printing it; show the plan, row counts and timings."""
+        with profiling("explain") as prof, self.engine.command():
+            rows, _ = self._select_rows(query)
+            returned = sum(1 for _ in profile.timed(rows, "filter"))
+        for plan in prof.plans or ["без чтения таблиц"]:
+            print(f"План: {plan}")
+        print(f"Просмотрено строк: {prof.counts['examined']}, возвращено: {returned}")
+        print(f"Время: {prof.total * 1000:.2f} ms ({prof.breakdown()})")
+
+    def _select_rows(self, query: SelectQuery) -> tuple[Iterator[dict[str, Any]], list[str]]:
+        """Rows of a select (streamed where possible) and the columns to show."""
+        table, where_clause, join = query.table, query.where, query.join
+        items, group_by = query.items, query.group_by
+        order_by, descending = query.order_by, query.descending
+        limit, offset = query.limit, query.offset
+        top = None if limit is None else offset + limit
+        if join is None:
+            schema = self.engine.get_schema(table)
+            where = self._where(table, where_clause)
+        else:
+            # Joined rows are only ever streamed, so ordering and grouping happen here.
+            schema = self.engine.join_schema(table, join.table)
+            joined = self.engine.iter_join(table, join.table, (join.left, join.right), where_clause)
+        if group_by or any(isinstance(i, Aggregate) for i in items):
+            with profile.phase("filter"):
+                if join is None:
+                    groups = self.engine.aggregate(table, where, items, group_by)
+                else:
+                    check_items(schema, items, group_by)
+                    groups = hash_aggregate(joined, items, group_by)
+            columns = [item_label(i) for i in items]
+            if order_by is not None:
+                if order_by not in columns:
+                    raise ValueError(f"order by: {order_by} нет в списке select")
+                groups.sort(key=itemgetter(order_by), reverse=descending)
+            rows = iter(groups)
+        else:
+            columns = list(schema)
+            if unknown := [c for c in (*items, order_by) if c is not None and c not in schema]:
+                raise ValueError(f"Неизвестный столбец: {unknown[0]}")
+            columns = list(items) or columns
+            if join is not None:
+                rows = joined if order_by is None else order_rows(joined, order_by, descending, top)
+            elif order_by is None:
+                rows = self.engine.iter_rows(table, where, top)
+            else:
+                rows = self.engine.iter_ordered(table, where, order_by, descending, top)
+        if offset or limit is not None:
+            rows = islice(rows, offset, None if limit is None else offset + limit)
+        return rows, columns
 
     @handle_db_errors
     @log_time
-    def update(self, table: str, updates_raw: dict[str, str], where_clause: WhereClause | None) -> None:
-        rows = self.engine.read_rows(table)
+    def update(
+        self, table: str, updates_raw: dict[str, str], where_clause: WhereExpr | None
+    ) -> None:
+        where = self._where(table, where_clause)
+        updates = self.engine.cast_update_values(table, updates_raw)
 
-        where = None
-        if where_clause is not None:
-            value = self.engine.cast_where_value(table, where_clause.column, where_clause.value_raw)
-            where = (where_clause.column, where_clause.op, value)
+        with self.engine.writing(table):
+            matched = self.engine.find_rows(table, where)
+            self.engine.update_rows(table, matched, updates)
+        print(f"OK (update): {len(matched)} rows")
 
-        updates = self.engine.cast_update_values(table, updates_raw)
+    @handle_db_errors
+    @confirm_action("Удалить записи?")
+    @log_time
+    def delete(self, table: str, where_clause: WhereExpr | None) -> None:
+        where = self._where(table, where_clause)
+        with self.engine.writing(table):
+            if where is None:
+                count = len(self.engine.read_rows(table))
+                self.engine.delete_rows(table, None)
+                print(f"OK (delete): {count} rows")
+                return
+
+            matched = self.engine.find_rows(table, where)
+            self.engine.delete_rows(table, matched)
+        print(f"OK (delete): {len(matched)} rows")
 
-        updated = 0
-        for r in rows:
-            if where is None or compare(r.get(where[0]), where[1], where[2]):
-                r.update(updates)
-                updated += 1
+    @handle_db_errors
+    @log_time
+    def create_index(self, table: str, column: str, kind: str) -> None:
+        self.engine.create_index(table, column, kind)
+        print(f"Индекс создан: {table}.{column} ({kind})")
 
-        self.engine.write_rows(table, rows)
-        print(f"OK (update): {updated} rows")
+    @handle_db_errors
+    @log_time
+    def drop_index(self, table: str, column: str) -> None:
+        self.engine.drop_index(table, column)
+        print(f"Индекс удалён: {table}.{column}")
 
     @handle_db_errors
-    @confirm_action("Удалить записи?")
     @log_time
-    def delete(self, table: str, where_clause: WhereClause | None) -> None:
-        rows = self.engine.read_rows(table)
+    def analyze(self, table: str) -> None:
+        stats = self.engine.analyze(table)
+        t = PrettyTable()
+        t.field_names = ["column", "nulls", "min", "max", "distinct", "buckets"]
+        for name, col in stats.columns.items():
+            buckets = 0 if col.histogram is None else len(col.histogram.counts)
+            t.add_row([name, col.nulls, col.min, col.max, stats.distinct(name), buckets])
+        print(t)
+        print(f"Статистика обновлена: {table} ({stats.rows} строк)")
 
-        if where_clause is None:
-            self.engine.write_rows(table, [])
-            print(f"OK (delete): {len(rows)} rows")
-            return
+    @handle_db_errors
+    @log_time
+    def compact(self, table: str) -> None:
+        self.engine.compact_table(table)
+        print(f"OK (compact): {table}")
 
-        value = self.engine.cast_where_value(table, where_clause.column, where_clause.value_raw)
-        where = (where_clause.column, where_clause.op, value)
+    @handle_db_errors
+    def begin(self) -> None:
+        self.engine.begin()
+        print("OK (begin)")
 
-        kept = [r for r in rows if not compare(r.get(where[0]), where[1], where[2])]
-        deleted = len(rows) - len(kept)
-        self.engine.write_rows(table, kept)
-        print(f"OK (delete): {deleted} rows")
+    @handle_db_errors
+    @log_time
+    def commit(self) -> None:
+        tables = self.engine.commit()
+        print(f"OK (commit): {', '.join(tables) if tables else 'без изменений'}")
+
+    @handle_db_errors
+    def rollback(self) -> None:
+        self.engine.rollback()
+        print("OK (rollback)")
+
+    @handle_db_errors
+    def profile(self, enabled: bool | None) -> None:
+        """Turn per-command profiling on or off (None: show whether it is on)."""
+        if enabled is not None:
+            self.engine.profiling = enabled
+        state = "включено" if self.engine.profiling else "выключено"
+        print(f"Профилирование {state} (статистика: {PROFILE_TABLE})")
+
+    @handle_db_errors
+    @log_time
+    def checkpoint(self) -> None:
+        tables = self.engine.checkpoint()
+        print(f"OK (checkpoint): {', '.join(tables) if tables else 'нечего переносить'}")
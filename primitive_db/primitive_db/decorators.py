@@ -4,8 +4,33 @@ import time
 from functools import wraps
 from typing import Any, Callable, TypeVar
 
+from primitive_db import profile
+
 T = TypeVar("T")
 
+# Fixed answer to every `confirm_action` prompt when there is no one to ask
+# (server, scripts); None asks on the terminal. A fixed "no" fails the command.
+_auto_confirm: bool | None = None
+# Let `handle_db_errors` re-raise instead of printing, so a script can stop on failure.
+_raise_errors = False
+# Let `log_time` print its "[time] ..." line (off where output is a reply, as in the server).
+_show_time = True
+
+
+def set_auto_confirm(answer: bool | None) -> None:
+    global _auto_confirm
+    _auto_confirm = answer
+
+
+def set_raise_errors(enabled: bool) -> None:
+    global _raise_errors
+    _raise_errors = enabled
+
+
+def set_show_time(enabled: bool) -> None:
+    global _show_time
+    _show_time = enabled
+
 
 def handle_db_errors(func: Callable[..., T]) -> Callable[..., T | None]:
     """Catch common errors and print a readable message instead of crashing."""
@@ -14,29 +39,40 @@ def handle_db_errors(func: Callable[..., T]) -> Callable[..., T | None]:
     def wrapper(*args: Any, **kwargs: Any) -> T | None:
         try:
             return func(*args, **kwargs)
-        except ValueError as exc:
-            print(f"Ошибка: {exc}")
-            return None
-        except FileNotFoundError as exc:
-            print(f"Файл не найден: {exc}")
-            return None
-        except KeyError as exc:
-            print(f"Неизвестный ключ/поле: {exc}")
+        except (ValueError, FileNotFoundError, KeyError) as exc:
+            if _raise_errors:
+                raise
+            print(describe_error(exc))
             return None
 
     return wrapper
 
 
+def describe_error(exc: Exception) -> str:
+    if isinstance(exc, FileNotFoundError):
+        return f"Файл не найден: {exc}"
+    if isinstance(exc, KeyError):
+        return f"Неизвестный ключ/поле: {exc}"
+    return f"Ошибка: {exc}"
+
+
 def confirm_action(message: str) -> Callable[[Callable[..., T]], Callable[..., T | None]]:
-    """Ask for confirmation before destructive operations (drop/delete)."""
+    """Ask for confirmation before destructive operations (drop/delete).
+
+    With no one to ask and no standing "yes" (a script without `--yes`), the operation
+    is an error rather than quietly skipped, so the script does not report success.
+    """
 
     def decorator(func: Callable[..., T]) -> Callable[..., T | None]:
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> T | None:
-            answer = input(f"{message} [y/N]: ").strip().lower()
-            if answer not in {"y", "yes"}:
-                print("Отменено.")
-                return None
+            if _auto_confirm is False:
+                raise ValueError(f"{message} Нет подтверждения (запустите скрипт с --yes).")
+            if _auto_confirm is None:
+                answer = input(f"{message} [y/N]: ").strip().lower()
+                if answer not in {"y", "yes"}:
+                    print("Отменено.")
+                    return None
             return func(*args, **kwargs)
 
         return wrapper
@@ -45,14 +81,17 @@ def confirm_action(message: str) -> Callable[[Callable[..., T]], Callable[..., T
 
 
 def log_time(func: Callable[..., T]) -> Callable[..., T]:
-    """Measure and print execution time."""
+    """Measure and print execution time (split into phases while profiling is on)."""
 
     @wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> T:
         start = time.perf_counter()
         result = func(*args, **kwargs)
         elapsed_ms = (time.perf_counter() - start) * 1000
-        print(f"[time] {func.__name__}: {elapsed_ms:.2f} ms")
+        if _show_time:
+            prof = profile.active()
+            detail = f" ({prof.breakdown()})" if prof is not None else ""
+            print(f"[time] {func.__name__}: {elapsed_ms:.2f} ms{detail}")
         return result
 
     return wrapper
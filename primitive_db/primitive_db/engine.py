@@ -1,114 +1,1037 @@
 from __future__ import annotations
 
+import copy
+import heapq
+import os
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import ExitStack, contextmanager
+from dataclasses import replace
+from functools import partial
+from itertools import chain, islice
+from operator import itemgetter
 from typing import Any
 
-from primitive_db.constants import META_FILE
+from primitive_db import profile
+from primitive_db.aggregate import Aggregate, SelectItem, check_items, finish, hash_aggregate
+from primitive_db.cache import TableCache, cache_budget
+from primitive_db.catalog import MetaCatalog
+from primitive_db.constants import (
+    DEFAULT_TABLE_FORMAT,
+    INDEX_KINDS,
+    INDEX_SCAN_FRACTION,
+    JOIN_BATCH_ROWS,
+    LOAD_BATCH_ROWS,
+    ORDER_FETCH_BATCH,
+    PROFILE_TABLE,
+    TABLE_FORMATS,
+)
+from primitive_db.indexes import (
+    Index,
+    SortedIndex,
+    build_index,
+    drop_index_file,
+    load_index,
+    save_index,
+)
+from primitive_db.join import hash_join, index_join, qualify
+from primitive_db.locks import FileLocks
+from primitive_db.parallel import ParallelScanner, scan_worker_count
+from primitive_db.parser import BetweenClause, InClause, WhereClause, WhereExpr, WhereGroup
+from primitive_db.planner import Plan, conjoin, conjuncts, make_plan
+from primitive_db.predicate import (
+    And,
+    Cmp,
+    Expr,
+    Or,
+    compile_test,
+    expr_columns,
+    iter_filter,
+    rename_columns,
+)
+from primitive_db.profile import STATS_SCHEMA, Profile
+from primitive_db.stats import TableStats
+from primitive_db.storage import (
+    ColumnarTableStorage,
+    JsonTableStorage,
+    LogTableStorage,
+    MemoryTableStorage,
+    MmapTableStorage,
+    SegmentedTableStorage,
+    TableStorage,
+)
 from primitive_db.utils import (
+    cast_column,
     cast_value,
+    commit_intent_path,
     ensure_storage,
-    get_table_cache,
+    lock_path,
     read_json,
-    table_path,
+    remove_durably,
     write_json,
 )
+from primitive_db.wal import SyncPolicy
+
+StatsChange = Callable[[TableStats], None]
+
+
+def order_rows(
+    rows: Iterable[dict[str, Any]], column: str, descending: bool = False, limit: int | None = None
+) -> Iterator[dict[str, Any]]:
+    """Rows ordered by `column`: top-k through a bounded heap when `limit` is given."""
+    key = itemgetter(column)
+    if limit is None:
+        return iter(sorted(rows, key=key, reverse=descending))
+    pick = heapq.nlargest if descending else heapq.nsmallest
+    return iter(pick(limit, rows, key=key))
+
+
+def _split_qualified(column: str) -> tuple[str, str]:
+    table, _, name = column.partition(".")
+    return table, name
 
 
 class DbEngine:
-    """Low-level storage engine: reads/writes meta and table files."""
+    """Low-level storage engine: reads/writes meta (via MetaCatalog) and table files."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        sync: SyncPolicy | None = None,
+        cache_bytes: int | None = None,
+        scan_workers: int | None = None,
+    ) -> None:
         ensure_storage()
-        self._read_table_cached = get_table_cache()
+        sync = sync or SyncPolicy()
+        # Files replaced whole (tables, meta, indexes) follow the policy too, minus grouping.
+        self._sync_files = sync.syncs_files
+        self._locks = FileLocks()
+        self.catalog = MetaCatalog(locks=self._locks, sync=self._sync_files)
+        self.table_cache = TableCache(cache_budget() if cache_bytes is None else cache_bytes)
+        schema = self.catalog.schema
+        self._storages: dict[str, TableStorage] = {
+            "json": JsonTableStorage(self.table_cache, schema, sync),
+            "log": LogTableStorage(policy=sync),
+            "columnar": ColumnarTableStorage(schema, sync),
+            "mmap": MmapTableStorage(schema, self._locks, sync),
+            "segmented": SegmentedTableStorage(schema, self._locks, sync),
+        }
+        self.scanner = ParallelScanner(
+            scan_worker_count() if scan_workers is None else scan_workers
+        )
+        self._indexes: dict[str, dict[str, Index]] = {}
+        self._index_stamps: dict[str, tuple[int, ...]] = {}
+        self._dirty_indexes: set[str] = set()
+        # Column statistics as maintained by our writes, and the table stamp they match;
+        # flushed into the meta like indexes are to their files.
+        self._stats: dict[str, TableStats] = {}
+        self._stats_stamps: dict[str, tuple[int, ...]] = {}
+        self._dirty_stats: set[str] = set()
+        # Copies of the statistics of tables staged by the open transaction.
+        self._tx_stats: dict[str, TableStats] = {}
+        # Private copies of the tables changed by the open transaction (None: autocommit).
+        self._overlay: MemoryTableStorage | None = None
+        # Stamp of each staged table when it was copied, checked again at commit.
+        self._base_stamps: dict[str, tuple[int, ...]] = {}
+        # `profile on`: per-command stats rows, held back while a transaction is open.
+        self.profiling = False
+        self._pending_stats: list[dict[str, Any]] = []
+        # Set while the tables of a multi-table commit are written (ours or a redone one).
+        self._committing = False
+        self._finish_commit()
+
+    @contextmanager
+    def command(self) -> Iterator[None]:
+        """Scope of one user command: meta is checked for outside changes once."""
+        self._finish_commit()
+        with self.catalog.pinned():
+            yield
+
+    @contextmanager
+    def writing(self, *tables: str) -> Iterator[None]:
+        """Hold the exclusive lock of each table (in name order, so writers cannot deadlock).
+
+        Readers never wait for it, except on `mmap` tables, which change in place, and
+        `segmented` ones, whose replaced segment files are removed. Inside a
+        transaction nothing is locked: changes only reach the files at commit.
+        """
+        if self._overlay is not None:
+            yield
+            return
+        self._finish_commit()
+        with ExitStack() as stack:
+            for table in sorted(set(tables)):
+                stack.enter_context(self._locks.exclusive(lock_path(table)))
+            yield
+
+    def record_profile(self, prof: Profile) -> None:
+        """File a finished command's numbers in the stats table (created on first use).
+
+        Inside a transaction they wait for it to end, so they are kept even on rollback.
+        """
+        if prof.target == PROFILE_TABLE:
+            return  # Reading the stats must not add to them.
+        self._pending_stats.append(prof.stats_row())
+        if self._overlay is not None:
+            return
+        with self.command():
+            if PROFILE_TABLE not in self.catalog.tables:
+                self.create_table(PROFILE_TABLE, dict(STATS_SCHEMA), "log")
+            ids = self.catalog.reserve_ids(PROFILE_TABLE, len(self._pending_stats))
+            rows = [{"id": rid, **row} for rid, row in zip(ids, self._pending_stats, strict=True)]
+            self.insert_rows(PROFILE_TABLE, rows)
+        self._pending_stats.clear()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._overlay is not None
+
+    def begin(self) -> None:
+        if self._overlay is not None:
+            raise ValueError("Транзакция уже открыта.")
+        self._overlay = MemoryTableStorage()
+
+    def commit(self) -> list[str]:
+        """Write every table changed in the transaction once; return their names.
+
+        First committer wins: if another process changed one of the tables after it was
+        staged, nothing is written and the whole transaction is discarded.
+
+        Several tables are committed all or nothing: their rows are first saved in one
+        redo record (`commit_intent_path`), which is removed once every table is
+        written. If the process dies in between, `_finish_commit` writes them again.
+        """
+        overlay = self._end_transaction()
+        base = self._base_stamps
+        staged = self._tx_stats
+        self._base_stamps, self._tx_stats = {}, {}
+        tables = [t for t in overlay.tables() if t in self.catalog.tables]
+        with self.writing(*tables):
+            for table in tables:
+                if self._storage(table).stamp(table) != base[table]:
+                    raise ValueError(
+                        f"Таблицу {table} изменил другой процесс, транзакция отменена."
+                    )
+            intent = commit_intent_path() if len(tables) > 1 else None
+            if intent is not None:
+                write_json(
+                    intent,
+                    {t: overlay.read(t) for t in tables},
+                    indent=None,
+                    sync=self._sync_files,
+                )
+            self._committing = True
+            try:
+                for table in tables:
+                    with self._keeping_stats(table, staged=staged.get(table)):
+                        self.write_rows(table, overlay.read(table))
+            finally:
+                self._committing = False
+            if intent is not None:
+                remove_durably(intent, self._sync_files)
+        return tables
+
+    def _finish_commit(self) -> None:
+        """Redo a multi-table commit whose process died before writing all its tables.
+
+        Called before anything is locked for writing and at the start of each command.
+        The record holds every committed row, so rewriting a table the commit already
+        reached is harmless. A live committer holds the tables' locks until it removes
+        the record, so waiting for them ends with the record gone.
+        """
+        path = commit_intent_path()
+        if self._committing or self._overlay is not None or not os.path.exists(path):
+            return
+        self._committing = True
+        try:
+            while True:
+                try:
+                    tables = sorted(read_json(path))
+                except FileNotFoundError:
+                    return
+                with self.writing(*tables):
+                    try:
+                        intent: dict[str, list[dict[str, Any]]] = read_json(path)
+                    except FileNotFoundError:
+                        return
+                    if sorted(intent) != tables:
+                        continue  # A newer commit's record: take its tables' locks instead.
+                    for table, rows in intent.items():
+                        if table in self.catalog.tables:
+                            self.write_rows(table, rows)
+                    remove_durably(path, self._sync_files)
+                    return
+        finally:
+            self._committing = False
+
+    def rollback(self) -> None:
+        self._end_transaction()
+        self._base_stamps.clear()
+        self._tx_stats.clear()
 
-    def load_meta(self) -> dict[str, Any]:
-        meta = read_json(META_FILE)
-        if "tables" not in meta or not isinstance(meta["tables"], dict):
-            raise ValueError("Метаданные повреждены: отсутствует 'tables'.")
-        return meta
+    def _end_transaction(self) -> MemoryTableStorage:
+        overlay = self._overlay
+        if overlay is None:
+            raise ValueError("Нет открытой транзакции.")
+        self._overlay = None
+        return overlay
 
-    def save_meta(self, meta: dict[str, Any]) -> None:
-        write_json(META_FILE, meta)
+    def _stage(self, table: str) -> None:
+        """Inside a transaction, give `table` a private copy before its first change."""
+        overlay = self._overlay
+        if overlay is not None and table not in overlay:
+            storage = self._storage(table)
+            # Stamp first: a change that lands during the read still fails the commit.
+            self._base_stamps[table] = storage.stamp(table)
+            stats, _ = self.table_stats(table)
+            if stats is not None:
+                self._tx_stats[table] = copy.deepcopy(stats)
+            overlay.write(table, [dict(r) for r in storage.read(table)])
 
-    def create_table(self, name: str, schema: dict[str, str]) -> None:
-        meta = self.load_meta()
-        if name in meta["tables"]:
-            raise ValueError(f"Таблица уже существует: {name}")
+    def _outside_transaction(self, action: str) -> None:
+        if self._overlay is not None:
+            raise ValueError(f"{action}: недоступно внутри транзакции (commit или rollback).")
+
+    def close(self) -> None:
+        self._overlay = None  # An unfinished transaction is discarded.
+        self._base_stamps.clear()
+        self._tx_stats.clear()
+        self.flush_indexes()
+        self.flush_stats()
+        self.catalog.release_ids()
+        for storage in self._storages.values():
+            storage.close()
+        self.scanner.close()
+
+    def create_table(
+        self, name: str, schema: dict[str, str], fmt: str = DEFAULT_TABLE_FORMAT
+    ) -> None:
+        self._outside_transaction("create_table")
         if "id" in schema:
             raise ValueError("Столбец 'id' создаётся автоматически, не указывай его.")
+        if fmt not in TABLE_FORMATS:
+            raise ValueError(f"Неизвестный формат таблицы: {fmt}")
 
         full_schema = {"id": "int", **schema}
-        meta["tables"][name] = {"schema": full_schema, "next_id": 1}
-        self.save_meta(meta)
-        write_json(table_path(name), [])
+        self.catalog.add_table(name, {"schema": full_schema, "next_id": 1, "format": fmt})
+        self._storages[fmt].write(name, [])
+        self._stats[name] = TableStats.empty(full_schema)
+        self._stats_stamps[name] = self._storages[fmt].stamp(name)
+        self._dirty_stats.add(name)
 
     def drop_table(self, name: str) -> None:
-        meta = self.load_meta()
-        if name not in meta["tables"]:
-            raise ValueError(f"Таблица не найдена: {name}")
-
-        meta["tables"].pop(name)
-        self.save_meta(meta)
-
-        import os
-
-        path = table_path(name)
-        if os.path.exists(path):
-            os.remove(path)
+        self._outside_transaction("drop_table")
+        with self.writing(name):
+            info = self.catalog.drop_table(name)
+            self._storages[info.get("format", DEFAULT_TABLE_FORMAT)].drop(name)
+        for column in info.get("indexes", {}):
+            drop_index_file(name, column)
+        self._indexes.pop(name, None)
+        self._index_stamps.pop(name, None)
+        self._stats.pop(name, None)
+        self._stats_stamps.pop(name, None)
 
     def list_tables(self) -> list[str]:
-        meta = self.load_meta()
-        return sorted(meta["tables"].keys())
+        return sorted(self.catalog.tables.keys())
 
     def get_schema(self, table: str) -> dict[str, str]:
-        meta = self.load_meta()
-        if table not in meta["tables"]:
-            raise ValueError(f"Таблица не найдена: {table}")
-        return dict(meta["tables"][table]["schema"])
-
-    def _next_id(self, table: str) -> int:
-        meta = self.load_meta()
-        next_id = int(meta["tables"][table]["next_id"])
-        meta["tables"][table]["next_id"] = next_id + 1
-        self.save_meta(meta)
-        return next_id
+        return dict(self.catalog.schema(table))
+
+    def _storage(self, table: str) -> TableStorage:
+        profile.touch(table)
+        if self._overlay is not None and table in self._overlay:
+            return self._overlay
+        return self._storages[self.catalog.table(table).get("format", DEFAULT_TABLE_FORMAT)]
 
     def read_rows(self, table: str) -> list[dict[str, Any]]:
-        _ = self.get_schema(table)
-        return self._read_table_cached(table_path(table))
+        return self._storage(table).read(table)
+
+    @contextmanager
+    def _changing(self, table: str) -> Iterator[None]:
+        """Scope of one change to a table, from reading its indexes to writing it.
+
+        The table lock is held throughout, so another process cannot write between the
+        index update and the write and leave our indexes valid-looking but stale. If
+        the change fails, the in-memory indexes (which may already hold it) are dropped.
+        """
+        with self.writing(table):
+            try:
+                yield
+            except BaseException:
+                self._indexes.pop(table, None)
+                raise
 
     def write_rows(self, table: str, rows: list[dict[str, Any]]) -> None:
-        write_json(table_path(table), rows)
+        self._stage(table)
+        storage = self._storage(table)
+        with self._changing(table):
+            with profile.phase("write"):
+                storage.write(table, rows)
+            if storage is self._overlay:
+                return
+            indexes = self._indexes.get(table)
+            if indexes:
+                defs = self.catalog.table(table).get("indexes", {})
+                self._indexes[table] = {
+                    col: build_index(defs[col], col, rows) for col in indexes if col in defs
+                }
+            self._index_stamps[table] = storage.stamp(table)
+            self._dirty_indexes.add(table)
+
+    def insert_rows(self, table: str, rows: list[dict[str, Any]]) -> None:
+        self._stage(table)
+        with self._changing(table):
+            indexes = self.table_indexes(table)
+            for col, index in indexes.items():
+                index.add_many((r[col], r["id"]) for r in rows)
+            self._persist(
+                table,
+                lambda storage: storage.insert(table, rows),
+                bool(indexes),
+                lambda stats: stats.insert(rows),
+            )
+
+    def load_rows(self, table: str, records: Iterable[dict[str, Any]]) -> int:
+        """Bulk insert: cast column-at-a-time in batches, reserve ids once, write once.
+
+        Nothing is stored unless every record is valid. Returns the number of rows added.
+        """
+        schema = self.catalog.schema(table)
+        columns = [c for c in schema if c != "id"]
+        cast: dict[str, list[Any]] = {c: [] for c in columns}
+        count = 0
+        it = iter(records)
+        while batch := list(islice(it, LOAD_BATCH_ROWS)):
+            if set(map(len, batch)) != {len(columns)}:
+                for rec in batch:
+                    if extra := set(rec) - set(columns):
+                        raise ValueError(f"Лишние столбцы: {sorted(extra)}")
+            try:
+                with profile.phase("cast"):
+                    for c in columns:
+                        cast[c].extend(cast_column(schema[c], list(map(itemgetter(c), batch))))
+            except KeyError as exc:
+                raise ValueError(f"Не задано значение для столбца: {exc.args[0]}") from exc
+            count += len(batch)
+        if not count:
+            return 0
+
+        ids = self.catalog.reserve_ids(table, count)
+        names = ["id", *columns]
+        rows = [
+            dict(zip(names, vals, strict=True)) for vals in zip(ids, *cast.values(), strict=True)
+        ]
+        self.insert_rows(table, rows)
+        return count
+
+    def update_rows(self, table: str, rows: list[dict[str, Any]], updates: dict[str, Any]) -> None:
+        """Apply `updates` to the given rows (as returned by read_rows/find_rows)."""
+        if not rows:
+            return
+        self._stage(table)
+        with self._changing(table):
+            indexes = self.table_indexes(table)
+            for col, index in indexes.items():
+                if col in updates:
+                    for r in rows:
+                        index.remove(r[col], r["id"])
+                        index.add(updates[col], r["id"])
+            ids = [r["id"] for r in rows]
+            # Old values are taken now: some storages change the row dicts in place.
+            old = {c: [r[c] for r in rows] for c in updates}
+            self._persist(
+                table,
+                lambda storage: storage.update(table, ids, updates),
+                bool(indexes),
+                lambda stats: stats.replace(old, updates),
+            )
+
+    def delete_rows(self, table: str, rows: list[dict[str, Any]] | None) -> None:
+        """Delete the given rows; `None` deletes every row."""
+        if rows is not None and not rows:
+            return
+        self._stage(table)
+        with self._changing(table):
+            indexes = self.table_indexes(table)
+            for col, index in indexes.items():
+                if rows is None:
+                    index.clear()
+                else:
+                    for r in rows:
+                        index.remove(r[col], r["id"])
+            ids = None if rows is None else [r["id"] for r in rows]
+            if rows is None:
+                change: StatsChange = TableStats.clear
+            else:
+                gone = {c: [r[c] for r in rows] for c in self.catalog.schema(table)}
+                change = partial(TableStats.remove, values=gone)
+            self._persist(table, lambda storage: storage.delete(table, ids), bool(indexes), change)
+
+    def _persist(
+        self,
+        table: str,
+        write: Callable[[TableStorage], None],
+        has_indexes: bool,
+        change: StatsChange,
+    ) -> None:
+        """Run `write` on the table's storage (under `_changing`) and bring stats along."""
+        storage = self._storage(table)
+        if storage is self._overlay:
+            with profile.phase("write"):
+                write(storage)
+            if (stats := self._tx_stats.get(table)) is not None:
+                change(stats)
+            return
+        with self._keeping_stats(table, change), profile.phase("write"):
+            write(storage)
+        if has_indexes:
+            self._index_stamps[table] = storage.stamp(table)
+            self._dirty_indexes.add(table)
+
+    def table_stats(self, table: str) -> tuple[TableStats | None, bool]:
+        """Statistics of a table and whether they are exact for it as it is now.
+
+        Ours are exact while the table's stamp is the one they were last brought up to
+        date with; otherwise the meta's copy is exact if it was saved for this stamp.
+        Inexact statistics (another process wrote, or a crash lost our changes) still
+        serve as estimates. Tables staged in a transaction only get estimates.
+        """
+        if self._overlay is not None and table in self._overlay:
+            return self._stats.get(table), False
+        stamp = self._storage(table).stamp(table)
+        stats = self._stats.get(table)
+        if stats is not None and self._stats_stamps.get(table) == stamp:
+            return stats, True
+        saved = self.catalog.table(table).get("stats")
+        if saved is not None and (tuple(saved["stamp"]) == stamp or stats is None):
+            stats = self._stats[table] = TableStats.from_json(saved)
+            self._stats_stamps[table] = tuple(saved["stamp"])
+        return stats, stats is not None and self._stats_stamps[table] == stamp
+
+    @contextmanager
+    def _keeping_stats(
+        self, table: str, change: StatsChange | None = None, staged: TableStats | None = None
+    ) -> Iterator[None]:
+        """Around a write (under the table lock): apply `change` to the statistics (or take
+        a transaction's `staged` ones), and keep them exact if they were exact before."""
+        stats, exact = self.table_stats(table)
+        yield
+        if staged is not None:
+            stats = self._stats[table] = staged
+        if stats is None:
+            return
+        if change is not None:
+            change(stats)
+        if exact:
+            self._stats_stamps[table] = self._storage(table).stamp(table)
+            self._dirty_stats.add(table)
+
+    def flush_stats(self) -> None:
+        """Save statistics changed by our writes to the meta (if still exact)."""
+        for table in self._dirty_stats:
+            stats = self._stats.get(table)
+            if stats is None or table not in self.catalog.tables:
+                continue
+            stamp = self._storage(table).stamp(table)
+            if stamp != self._stats_stamps.get(table):
+                continue
+            with self.catalog.edit_table(table) as info:
+                info["stats"] = stats.to_json(stamp)
+        self._dirty_stats.clear()
+
+    def analyze(self, table: str) -> TableStats:
+        """Rebuild a table's statistics from its rows and save them to the meta."""
+        self._outside_transaction("analyze")
+        storage = self._storage(table)
+        with self.writing(table):
+            stats = TableStats.build(self.catalog.schema(table), storage.iter_rows(table))
+            stamp = storage.stamp(table)
+        self._stats[table] = stats
+        self._stats_stamps[table] = stamp
+        self._dirty_stats.discard(table)
+        with self.catalog.edit_table(table) as info:
+            info["stats"] = stats.to_json(stamp)
+        return stats
+
+    def compact_table(self, table: str) -> None:
+        self._outside_transaction("compact")
+        with self.writing(table), self._keeping_stats(table):
+            self._storage(table).compact(table)
+        if table in self._indexes:
+            self._index_stamps[table] = self._storage(table).stamp(table)
+            self._dirty_indexes.add(table)
+        self.flush_indexes()
+        self.flush_stats()
+
+    def checkpoint(self) -> list[str]:
+        """Fold every pending write-ahead log into its table files; return those tables."""
+        self._outside_transaction("checkpoint")
+        done = []
+        for table in self.list_tables():
+            storage = self._storage(table)
+            with self.writing(table), self._keeping_stats(table):
+                folded = storage.checkpoint(table)
+            if folded:
+                done.append(table)
+                if table in self._indexes:
+                    self._index_stamps[table] = storage.stamp(table)
+                    self._dirty_indexes.add(table)
+        self.flush_indexes()
+        self.flush_stats()
+        return done
+
+    def create_index(self, table: str, column: str, kind: str) -> None:
+        self._outside_transaction("create_index")
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Неизвестный тип индекса: {kind}")
+        if column not in self.catalog.schema(table):
+            raise ValueError(f"Неизвестный столбец: {column}")
+        with self.catalog.edit_table(table) as info:
+            indexes = info.setdefault("indexes", {})
+            if column in indexes:
+                raise ValueError(f"Индекс уже существует: {table}.{column}")
+            indexes[column] = kind
+        self._indexes.pop(table, None)
+        self.table_indexes(table)
+
+    def drop_index(self, table: str, column: str) -> None:
+        self._outside_transaction("drop_index")
+        with self.catalog.edit_table(table) as info:
+            if column not in info.get("indexes", {}):
+                raise ValueError(f"Индекс не найден: {table}.{column}")
+            del info["indexes"][column]
+        self._indexes.get(table, {}).pop(column, None)
+        drop_index_file(table, column)
+
+    def table_indexes(self, table: str) -> dict[str, Index]:
+        """Indexes of a table, loaded from disk or rebuilt if the table changed under them."""
+        defs: dict[str, str] = self.catalog.table(table).get("indexes", {})
+        storage = self._storage(table)
+        if not defs or storage is self._overlay:
+            # Staged copies are not indexed: the committed indexes must stay untouched.
+            return {}
+        stamp = storage.stamp(table)
+        loaded = self._indexes.get(table)
+        if (
+            loaded is not None
+            and self._index_stamps.get(table) == stamp
+            and loaded.keys() == defs.keys()
+        ):
+            return loaded
+
+        loaded = {}
+        rows: list[dict[str, Any]] | None = None
+        for col, kind in defs.items():
+            with profile.phase("load"):
+                index = load_index(table, col, kind, stamp)
+                if index is None:
+                    if rows is None:
+                        rows = storage.read(table)
+                    index = build_index(kind, col, rows)
+                    save_index(table, index, stamp, self._sync_files)
+            loaded[col] = index
+        self._indexes[table] = loaded
+        self._index_stamps[table] = stamp
+        return loaded
+
+    def flush_indexes(self) -> None:
+        """Write indexes changed in memory back to disk (if their table was not changed by others)."""
+        for table in self._dirty_indexes:
+            indexes = self._indexes.get(table)
+            if not indexes or table not in self.catalog.tables:
+                continue
+            stamp = self._storage(table).stamp(table)
+            if stamp != self._index_stamps.get(table):
+                continue
+            with profile.phase("write"):
+                for index in indexes.values():
+                    save_index(table, index, stamp, self._sync_files)
+        self._dirty_indexes.clear()
+
+    def resolve_where(self, table: str, clause: WhereExpr) -> Expr:
+        """Cast the raw values of a parsed where expression to the column types."""
+        with profile.phase("cast"):
+            return self._resolve_where(table, clause)
+
+    def _resolve_where(self, table: str, clause: WhereExpr) -> Expr:
+        if isinstance(clause, WhereClause):
+            value = self.cast_where_value(table, clause.column, clause.value_raw)
+            return Cmp(clause.column, clause.op, value)
+        if isinstance(clause, InClause):
+            values = frozenset(
+                self.cast_where_value(table, clause.column, raw) for raw in clause.values_raw
+            )
+            return Cmp(clause.column, "in", values)
+        if isinstance(clause, BetweenClause):
+            low = self.cast_where_value(table, clause.column, clause.low_raw)
+            high = self.cast_where_value(table, clause.column, clause.high_raw)
+            return And((Cmp(clause.column, ">=", low), Cmp(clause.column, "<=", high)))
+        parts = tuple(self._resolve_where(table, p) for p in clause.parts)
+        return And(parts) if clause.kind == "and" else Or(parts)
+
+    def plan_query(self, table: str, where: Expr | None) -> Plan:
+        """The access path for `where`; a scan's row estimate comes from the statistics."""
+        plan = make_plan(where, self.table_indexes(table) if where is not None else {})
+        if plan.access == "scan" and where is not None:
+            stats, _ = self.table_stats(table)
+            if stats is not None:
+                plan = replace(plan, estimate=round(stats.rows * stats.selectivity(where)))
+        return plan
+
+    def iter_rows(
+        self, table: str, where: Expr | None = None, top: int | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """Stream rows matching `where` through the planned access path, in table order.
+
+        Nothing is materialised on the way, so a consumer that stops early (LIMIT)
+        also stops the scan. `top` says the caller reads at most that many rows: such
+        scans stay in this process, where the first rows come without pool overhead.
+        """
+        plan = self.plan_query(table, where)
+        storage = self._storage(table)
+        if plan.residual is not None and plan.access == "scan":
+            rows = None
+            if top is None:
+                rows = storage.iter_parallel(table, plan.residual, self.scanner)
+            if rows is not None:
+                profile.note(f"{table}: {plan.describe()}, процессов: {self.scanner.workers}")
+                return rows
+            rows = storage.iter_filtered(table, plan.residual)
+            if rows is not None:
+                profile.note(f"{table}: {plan.describe()}")
+                return rows
+        profile.note(f"{table}: {plan.describe()}")
+        if plan.access == "all":
+            return profile.counted(storage.iter_rows(table), "examined")
+        if plan.access == "scan":
+            residual = plan.residual
+            if isinstance(residual, Cmp):
+                if profile.active() is not None:
+                    # The storage tests the column itself and only yields matches.
+                    profile.count("examined", storage.row_estimate(table))
+                return storage.iter_scan(
+                    table, residual.column, compile_test(residual.op, residual.value)
+                )
+            return iter_filter(residual, profile.counted(storage.iter_rows(table), "examined"))
+
+        rows = storage.iter_fetch(table, self._lookup_ids(table, plan.lookup))
+        rows = profile.counted(rows, "examined")
+        return rows if plan.residual is None else iter_filter(plan.residual, rows)
+
+    def iter_ordered(
+        self,
+        table: str,
+        where: Expr | None,
+        column: str,
+        descending: bool = False,
+        limit: int | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Rows matching `where` ordered by `column`; at most `limit` of them.
+
+        A sorted index on `column` is walked in order (unless a more selective index
+        answers `where`), fetching rows a batch at a time, so a limit stops the walk
+        early. Otherwise the matching rows stream through a bounded heap of `limit`
+        rows (top-k) or, without a limit, are sorted.
+        """
+        if column not in self.catalog.schema(table):
+            raise ValueError(f"Неизвестный столбец: {column}")
+        index = self.table_indexes(table).get(column)
+        access = self.plan_query(table, where).access
+        if isinstance(index, SortedIndex) and access in {"all", "scan"}:
+            profile.note(f"{table}: обход sorted-индекса {column}")
+            rows = profile.counted(self._walk_index(table, index, descending), "examined")
+            if where is not None:
+                rows = iter_filter(where, rows)
+            return rows if limit is None else islice(rows, limit)
+        return order_rows(self.iter_rows(table, where), column, descending, limit)
+
+    def _walk_index(
+        self, table: str, index: SortedIndex, descending: bool
+    ) -> Iterator[dict[str, Any]]:
+        storage = self._storage(table)
+        ids = index.ordered_ids(descending)
+        while batch := list(islice(ids, ORDER_FETCH_BATCH)):
+            found = {r["id"]: r for r in storage.iter_fetch(table, batch)}
+            yield from (found[rid] for rid in batch if rid in found)
+
+    def join_schema(self, left: str, right: str) -> dict[str, str]:
+        """Column types of a joined row, keyed `table.column`."""
+        return {
+            f"{table}.{col}": typ
+            for table in (left, right)
+            for col, typ in self.catalog.schema(table).items()
+        }
+
+    def _join_column(self, tables: tuple[str, str], name: str) -> tuple[str, str]:
+        """(table, column) for `table.column`, or for a bare column found in one table only."""
+        table, dot, column = name.partition(".")
+        if dot:
+            if table not in tables or column not in self.catalog.schema(table):
+                raise ValueError(f"Неизвестный столбец: {name}")
+            return table, column
+        owners = [t for t in tables if name in self.catalog.schema(t)]
+        if len(owners) != 1:
+            what = "Неоднозначный" if owners else "Неизвестный"
+            raise ValueError(f"{what} столбец: {name} (пиши <table>.<column>)")
+        return owners[0], name
+
+    def _resolve_join_where(self, tables: tuple[str, str], clause: WhereExpr) -> Expr:
+        """`resolve_where` for a join: values cast by the owning table, columns qualified."""
+        if isinstance(clause, WhereGroup):
+            parts = tuple(self._resolve_join_where(tables, p) for p in clause.parts)
+            return And(parts) if clause.kind == "and" else Or(parts)
+        table, column = self._join_column(tables, clause.column)
+        expr = self.resolve_where(table, replace(clause, column=column))
+        return rename_columns(expr, lambda c: f"{table}.{c}")
+
+    def _estimate_rows(self, table: str, where: Expr | None) -> int:
+        plan = self.plan_query(table, where)
+        if plan.estimate is not None:
+            return plan.estimate
+        return self._storage(table).row_estimate(table)
+
+    def iter_join(
+        self, left: str, right: str, on: tuple[str, str], where_clause: WhereExpr | None = None
+    ) -> Iterator[dict[str, Any]]:
+        """Stream joined rows (keys `table.column`) where the `on` columns are equal.
+
+        Conjuncts of `where` that touch one table are pushed down to that table's scan
+        (and may use its indexes); the rest filter the joined rows. The side expected to
+        be smaller drives the join: if the other side's join column is indexed (or is its
+        `id`), matches are looked up there a batch at a time (index nested loop);
+        otherwise the smaller side is hashed and the larger one streamed past it.
+        """
+        if left == right:
+            raise ValueError("join: таблица не может соединяться сама с собой.")
+        tables = (left, right)
+        ends = dict((self._join_column(tables, on[0]), self._join_column(tables, on[1])))
+        if ends.keys() != set(tables):
+            raise ValueError("join: условие on должно связывать столбцы двух таблиц.")
+        if self.catalog.schema(left)[ends[left]] != self.catalog.schema(right)[ends[right]]:
+            raise ValueError("join: типы столбцов в условии on не совпадают.")
+
+        pushed: dict[str, list[Expr]] = {left: [], right: []}
+        residual: list[Expr] = []
+        if where_clause is not None:
+            for part in conjuncts(self._resolve_join_where(tables, where_clause)):
+                owners = {_split_qualified(c)[0] for c in expr_columns(part)}
+                if len(owners) == 1:
+                    bare = rename_columns(part, lambda c: _split_qualified(c)[1])
+                    pushed[owners.pop()].append(bare)
+                else:
+                    residual.append(part)
+        wheres = {t: conjoin(pushed[t]) for t in tables}
+
+        sizes = {t: self._estimate_rows(t, wheres[t]) for t in tables}
+        small, big = sorted(tables, key=sizes.__getitem__)
+        rest = map(partial(qualify, small), self.iter_rows(small, wheres[small]))
+        # A filtered scan has no estimate; if its first batch is all there is, use the count.
+        head = list(islice(rest, JOIN_BATCH_ROWS + 1))
+        if len(head) <= JOIN_BATCH_ROWS:
+            sizes[small] = len(head)
+        outer = chain(head, rest)
+        if self._index_join_pays(big, ends[big], sizes[small], sizes[big]):
+            profile.note(f"join: index nested loop {small} -> {big}.{ends[big]}")
+            matches = partial(self._join_matches, big, ends[big], wheres[big])
+            pairs = index_join(outer, f"{small}.{ends[small]}", matches)
+        else:
+            profile.note(f"join: hash, построение по {small}")
+            inner = map(partial(qualify, big), self.iter_rows(big, wheres[big]))
+            pairs = hash_join(outer, inner, f"{small}.{ends[small]}", f"{big}.{ends[big]}")
+        first = 0 if small == left else 1
+        rows = (p[first] | p[1 - first] for p in pairs)
+        return rows if not residual else iter_filter(conjoin(residual), rows)
+
+    def _index_join_pays(self, table: str, column: str, outer_rows: int, rows: int) -> bool:
+        """Whether looking up `outer_rows` values in `table` beats scanning it.
+
+        Same rule as the planner: lookups must fetch at most INDEX_SCAN_FRACTION of it.
+        """
+        if column == "id":
+            fetched = outer_rows
+        elif (index := self.table_indexes(table).get(column)) is not None:
+            stats, _ = self.table_stats(table)
+            distinct = index.distinct if stats is None else stats.distinct(column)
+            fetched = outer_rows * index.size // max(distinct, 1)
+        else:
+            return False
+        return fetched <= rows * INDEX_SCAN_FRACTION
+
+    def _join_matches(
+        self, table: str, column: str, where: Expr | None, values: set[Any]
+    ) -> dict[Any, list[dict[str, Any]]]:
+        """Rows of `table` whose `column` is in `values`, found via its index or primary key."""
+        if column == "id":
+            ids: Iterable[int] = values
+        else:
+            ids = self.table_indexes(table)[column].lookup("in", frozenset(values))
+        rows = profile.counted(self._storage(table).iter_fetch(table, ids), "examined")
+        if where is not None:
+            rows = iter_filter(where, rows)
+        found: dict[Any, list[dict[str, Any]]] = {}
+        for row in rows:
+            found.setdefault(row[column], []).append(qualify(table, row))
+        return found
+
+    def find_rows(self, table: str, where: Expr | None) -> list[dict[str, Any]]:
+        """Rows matching `where` as a list (see `iter_rows`)."""
+        with profile.phase("filter"):
+            rows = self.read_rows(table) if where is None else list(self.iter_rows(table, where))
+        profile.count("returned", len(rows))
+        return rows
+
+    def aggregate(
+        self,
+        table: str,
+        where: Expr | None,
+        items: tuple[SelectItem, ...],
+        group_by: tuple[str, ...] = (),
+    ) -> list[dict[str, Any]]:
+        """One output row per `group_by` group of the rows matching `where`.
+
+        Answered from the indexes alone when they hold everything needed (see
+        `_aggregate_from_indexes`), otherwise by hash aggregation over the planned scan.
+        """
+        check_items(self.catalog.schema(table), items, group_by)
+        rows = self._aggregate_from_stats(table, where, items, group_by)
+        if rows is not None:
+            profile.note(f"{table}: агрегаты по статистике")
+            return rows
+        rows = self._aggregate_from_indexes(table, where, items, group_by)
+        if rows is not None:
+            profile.note(f"{table}: агрегаты по индексам")
+            return rows
+        return hash_aggregate(self.iter_rows(table, where), items, group_by)
+
+    def _aggregate_from_stats(
+        self,
+        table: str,
+        where: Expr | None,
+        items: tuple[SelectItem, ...],
+        group_by: tuple[str, ...],
+    ) -> list[dict[str, Any]] | None:
+        """Whole-table count/min/max from exact statistics, else None."""
+        aggs = [i for i in items if isinstance(i, Aggregate)]
+        if (
+            where is not None
+            or group_by
+            or any(a.func not in {"count", "min", "max"} for a in aggs)
+        ):
+            return None
+        stats, exact = self.table_stats(table)
+        if stats is None or not exact:
+            return None
+        acc: list[Any] = [stats.rows]
+        for a in aggs:
+            if a.func == "count":
+                acc.append(None)
+                continue
+            col = stats.columns[a.column or ""]
+            if not col.exact_bounds:
+                return None
+            acc.append(col.max if a.func == "max" else col.min)
+        return [finish(items, (), (), acc)]
+
+    def _aggregate_from_indexes(
+        self,
+        table: str,
+        where: Expr | None,
+        items: tuple[SelectItem, ...],
+        group_by: tuple[str, ...],
+    ) -> list[dict[str, Any]] | None:
+        """Counts and min/max that the indexes answer without reading rows, else None.
+
+        Covered: count/min/max over the whole table (index size and bounds), counts per
+        value of one indexed group-by column, and count of one indexed comparison. The
+        answer is taken under the table's shared lock and only from indexes confirmed
+        to match the table's current stamp; anything else falls back to a scan.
+        """
+        aggs = [i for i in items if isinstance(i, Aggregate)]
+        if any(a.func not in {"count", "min", "max"} for a in aggs):
+            return None
+        storage = self._storage(table)
+        with self._locks.shared(lock_path(table)):
+            indexes = self.table_indexes(table)
+            if not indexes or self._index_stamps.get(table) != storage.stamp(table):
+                return None
+            return self._answer_from_indexes(indexes, where, items, group_by, aggs)
+
+    @staticmethod
+    def _answer_from_indexes(
+        indexes: dict[str, Index],
+        where: Expr | None,
+        items: tuple[SelectItem, ...],
+        group_by: tuple[str, ...],
+        aggs: list[Aggregate],
+    ) -> list[dict[str, Any]] | None:
+        if where is not None:
+            index = indexes.get(where.column) if isinstance(where, Cmp) else None
+            if group_by or any(a.func != "count" for a in aggs) or index is None:
+                return None
+            if where.op not in index.ops:
+                return None
+            return [finish(items, (), (), [index.estimate(where.op, where.value)])]
+        if group_by:
+            col = group_by[0]
+            if len(group_by) != 1 or col not in indexes:
+                return None
+            if any(a.func != "count" and a.column != col for a in aggs):
+                return None
+            return [
+                finish(items, group_by, (value,), [count] + [value] * len(aggs))
+                for value, count in indexes[col].value_counts()
+            ]
+        acc: list[Any] = [next(iter(indexes.values())).size]
+        for a in aggs:
+            if a.func == "count":
+                acc.append(None)
+                continue
+            index = indexes.get(a.column or "")
+            if index is None:
+                return None
+            bounds = index.bounds()
+            acc.append(None if bounds is None else bounds[a.func == "max"])
+        return [finish(items, (), (), acc)]
+
+    def _lookup_ids(self, table: str, expr: Expr) -> set[int]:
+        if isinstance(expr, Or):
+            return set().union(*(self._lookup_ids(table, p) for p in expr.parts))
+        assert isinstance(expr, Cmp)
+        if expr.column == "id" and expr.op in {"=", "in"}:
+            return {expr.value} if expr.op == "=" else set(expr.value)
+        return self.table_indexes(table)[expr.column].lookup(expr.op, expr.value)
 
     def validate_and_build_row(self, table: str, assignments: dict[str, str]) -> dict[str, Any]:
-        schema = self.get_schema(table)
-        row: dict[str, Any] = {"id": self._next_id(table)}
+        schema = self.catalog.schema(table)
+        row: dict[str, Any] = {}
 
         for col, typ in schema.items():
             if col == "id":
                 continue
             if col not in assignments:
                 raise ValueError(f"Не задано значение для столбца: {col}")
-            row[col] = cast_value(typ, assignments[col])
+            with profile.phase("cast"):
+                row[col] = cast_value(typ, assignments[col])
 
         extra = set(assignments.keys()) - set(schema.keys())
         if extra:
             raise ValueError(f"Лишние столбцы: {sorted(extra)}")
 
-        return row
+        # Allocate the id last so rejected rows do not burn ids.
+        return {"id": self.catalog.next_id(table), **row}
 
     def cast_where_value(self, table: str, column: str, value_raw: str) -> Any:
-        schema = self.get_schema(table)
+        schema = self.catalog.schema(table)
         if column not in schema:
             raise ValueError(f"Неизвестный столбец: {column}")
         return cast_value(schema[column], value_raw)
 
     def cast_update_values(self, table: str, updates: dict[str, str]) -> dict[str, Any]:
-        schema = self.get_schema(table)
+        schema = self.catalog.schema(table)
         if "id" in updates:
             raise ValueError("Нельзя обновлять столбец id.")
         result: dict[str, Any] = {}
         for col, raw in updates.items():
             if col not in schema:
                 raise ValueError(f"Неизвестный столбец: {col}")
-            result[col] = cast_value(schema[col], raw)
+            with profile.phase("cast"):
+                result[col] = cast_value(schema[col], raw)
         return result
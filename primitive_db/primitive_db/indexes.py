@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from itertools import chain, groupby
+from typing import Any
+
+from primitive_db.utils import index_path, read_json, write_json
+
+Row = dict[str, Any]
+
+# SortedIndex.add_many merges instead of inserting one by one from this many entries.
+_MERGE_MIN = 256
+
+
+class HashIndex:
+    """value -> set of row ids; answers `=` and `!=`."""
+
+    kind = "hash"
+    ops = frozenset({"=", "!=", "in"})
+
+    def __init__(self, column: str) -> None:
+        self.column = column
+        self._map: dict[Any, set[int]] = {}
+        self.size = 0
+
+    @classmethod
+    def from_entries(cls, column: str, entries: Iterable[tuple[Any, int]]) -> HashIndex:
+        index = cls(column)
+        for value, rid in entries:
+            index.add(value, rid)
+        return index
+
+    def add(self, value: Any, rid: int) -> None:
+        ids = self._map.setdefault(value, set())
+        if rid not in ids:
+            ids.add(rid)
+            self.size += 1
+
+    def add_many(self, entries: Iterable[tuple[Any, int]]) -> None:
+        for value, rid in entries:
+            self.add(value, rid)
+
+    def remove(self, value: Any, rid: int) -> None:
+        ids = self._map.get(value)
+        if ids is not None and rid in ids:
+            ids.discard(rid)
+            self.size -= 1
+            if not ids:
+                del self._map[value]
+
+    def clear(self) -> None:
+        self._map.clear()
+        self.size = 0
+
+    def estimate(self, op: str, value: Any) -> int:
+        """Exact number of ids `lookup` would return, without building the set."""
+        if op == "=":
+            return len(self._map.get(value, ()))
+        if op == "in":
+            return sum(len(self._map.get(v, ())) for v in value)
+        return self.size - len(self._map.get(value, ()))
+
+    def lookup(self, op: str, value: Any) -> set[int]:
+        if op == "=":
+            return set(self._map.get(value, ()))
+        if op == "in":
+            return set().union(*(self._map.get(v, ()) for v in value))
+        result: set[int] = set()
+        for key, ids in self._map.items():
+            if key != value:
+                result |= ids
+        return result
+
+    def entries(self) -> Iterable[tuple[Any, int]]:
+        for key, ids in self._map.items():
+            for rid in ids:
+                yield key, rid
+
+    @property
+    def distinct(self) -> int:
+        return len(self._map)
+
+    def bounds(self) -> tuple[Any, Any] | None:
+        """(min, max) indexed value, over the distinct keys only."""
+        return (min(self._map), max(self._map)) if self._map else None
+
+    def value_counts(self) -> Iterable[tuple[Any, int]]:
+        return ((key, len(ids)) for key, ids in self._map.items())
+
+
+class SortedIndex:
+    """Parallel sorted lists of values and row ids; answers range queries via bisect."""
+
+    kind = "sorted"
+    ops = frozenset({"=", "!=", "<", "<=", ">", ">=", "in"})
+
+    def __init__(self, column: str) -> None:
+        self.column = column
+        self._keys: list[Any] = []
+        self._ids: list[int] = []
+
+    @classmethod
+    def from_entries(cls, column: str, entries: Iterable[tuple[Any, int]]) -> SortedIndex:
+        index = cls(column)
+        pairs = sorted(entries)
+        index._keys = [v for v, _ in pairs]
+        index._ids = [rid for _, rid in pairs]
+        return index
+
+    def add(self, value: Any, rid: int) -> None:
+        pos = bisect_right(self._keys, value)
+        self._keys.insert(pos, value)
+        self._ids.insert(pos, rid)
+
+    def add_many(self, entries: Iterable[tuple[Any, int]]) -> None:
+        pairs = sorted(entries)
+        if len(pairs) < _MERGE_MIN:
+            for value, rid in pairs:
+                self.add(value, rid)
+            return
+        # Two sorted runs: timsort merges them in linear time, unlike repeated list.insert.
+        merged = sorted(chain(zip(self._keys, self._ids, strict=True), pairs))
+        self._keys = [v for v, _ in merged]
+        self._ids = [rid for _, rid in merged]
+
+    def remove(self, value: Any, rid: int) -> None:
+        lo = bisect_left(self._keys, value)
+        hi = bisect_right(self._keys, value, lo)
+        for pos in range(lo, hi):
+            if self._ids[pos] == rid:
+                del self._keys[pos]
+                del self._ids[pos]
+                return
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._ids.clear()
+
+    @property
+    def size(self) -> int:
+        return len(self._keys)
+
+    def _span(self, op: str, value: Any) -> tuple[int, int]:
+        """[lo, hi) slice of the sorted lists matching a range operator."""
+        keys = self._keys
+        if op == "=":
+            return bisect_left(keys, value), bisect_right(keys, value)
+        if op == "<":
+            return 0, bisect_left(keys, value)
+        if op == "<=":
+            return 0, bisect_right(keys, value)
+        if op == ">":
+            return bisect_right(keys, value), len(keys)
+        if op == ">=":
+            return bisect_left(keys, value), len(keys)
+        raise ValueError(f"Неверный оператор: {op}")
+
+    def estimate(self, op: str, value: Any) -> int:
+        """Exact number of ids `lookup` would return, via bisect only."""
+        if op == "in":
+            return sum(self.estimate("=", v) for v in value)
+        if op == "!=":
+            lo, hi = self._span("=", value)
+            return len(self._keys) - (hi - lo)
+        lo, hi = self._span(op, value)
+        return hi - lo
+
+    def lookup(self, op: str, value: Any) -> set[int]:
+        ids = self._ids
+        if op == "in":
+            return set().union(*(self.lookup("=", v) for v in value))
+        if op == "!=":
+            lo, hi = self._span("=", value)
+            return set(ids[:lo]) | set(ids[hi:])
+        lo, hi = self._span(op, value)
+        return set(ids[lo:hi])
+
+    def entries(self) -> Iterable[tuple[Any, int]]:
+        return zip(self._keys, self._ids, strict=True)
+
+    @property
+    def distinct(self) -> int:
+        return sum(1 for _ in groupby(self._keys))
+
+    def bounds(self) -> tuple[Any, Any] | None:
+        return (self._keys[0], self._keys[-1]) if self._keys else None
+
+    def ordered_ids(self, descending: bool = False) -> Iterator[int]:
+        """Row ids in value order (ties in id order, reversed for `descending`)."""
+        return reversed(self._ids) if descending else iter(self._ids)
+
+    def value_counts(self) -> Iterable[tuple[Any, int]]:
+        return ((key, sum(1 for _ in run)) for key, run in groupby(self._keys))
+
+
+Index = HashIndex | SortedIndex
+
+INDEX_TYPES: dict[str, type[HashIndex] | type[SortedIndex]] = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+}
+
+
+def build_index(kind: str, column: str, rows: Iterable[Row]) -> Index:
+    return INDEX_TYPES[kind].from_entries(column, ((r[column], r["id"]) for r in rows))
+
+
+def save_index(table: str, index: Index, stamp: tuple[int, ...], sync: bool = True) -> None:
+    """Persist an index together with the table stamp it is valid for."""
+    data = {
+        "kind": index.kind,
+        "column": index.column,
+        "stamp": list(stamp),
+        "entries": [[v, rid] for v, rid in index.entries()],
+    }
+    write_json(index_path(table, index.column), data, indent=None, sync=sync)
+
+
+def load_index(table: str, column: str, kind: str, stamp: tuple[int, ...]) -> Index | None:
+    """Load a persisted index, or None if it is missing or out of date."""
+    path = index_path(table, column)
+    if not os.path.exists(path):
+        return None
+    data = read_json(path)
+    if data.get("kind") != kind or data.get("stamp") != list(stamp):
+        return None
+    return INDEX_TYPES[kind].from_entries(column, ((v, rid) for v, rid in data["entries"]))
+
+
+def drop_index_file(table: str, column: str) -> None:
+    path = index_path(table, column)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import Any
+
+from primitive_db.constants import JOIN_BATCH_ROWS
+
+Row = dict[str, Any]
+Pair = tuple[Row, Row]
+
+
+def qualify(table: str, row: Row) -> Row:
+    """Row with `table.column` keys, as joined rows are addressed."""
+    return {f"{table}.{c}": v for c, v in row.items()}
+
+
+def hash_join(
+    build: Iterable[Row], probe: Iterable[Row], build_col: str, probe_col: str
+) -> Iterator[Pair]:
+    """(build row, probe row) pairs with equal join values.
+
+    Only the build side is held in memory (value -> rows); the probe side streams, and
+    pairs come out in probe order.
+    """
+    table: dict[Any, list[Row]] = {}
+    for row in build:
+        table.setdefault(row[build_col], []).append(row)
+    get = table.get
+    for row in probe:
+        for match in get(row[probe_col], ()):
+            yield match, row
+
+
+def index_join(
+    outer: Iterable[Row],
+    outer_col: str,
+    matches: Callable[[set[Any]], dict[Any, list[Row]]],
+    batch_size: int = JOIN_BATCH_ROWS,
+) -> Iterator[Pair]:
+    """(outer row, inner row) pairs via lookups on the inner side, in outer order.
+
+    `matches` returns the inner rows for a set of join values (from an index or the
+    primary key); it is called once per batch of outer rows, not once per row.
+    """
+    it = iter(outer)
+    while batch := list(islice(it, batch_size)):
+        found = matches({row[outer_col] for row in batch})
+        for row in batch:
+            for match in found.get(row[outer_col], ()):
+                yield row, match
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from collections.abc import Iterator
+from typing import Any
+
+from primitive_db.constants import LOAD_FORMATS
+
+
+def detect_format(path: str, fmt: str | None) -> str:
+    """Explicit `--format`, otherwise the file extension."""
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt == "json":
+            fmt = "jsonl"
+    if fmt not in LOAD_FORMATS:
+        raise ValueError(f"Формат файла: ожидалось {'|'.join(LOAD_FORMATS)}")
+    return fmt
+
+
+def iter_records(path: str, fmt: str) -> Iterator[dict[str, Any]]:
+    """Stream records from a CSV file (with a header line) or a JSON Lines file."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for rec in reader:
+                if None in rec or None in rec.values():
+                    raise ValueError(
+                        f"Строка {reader.line_num}: число полей не совпадает с заголовком."
+                    )
+                yield rec
+            return
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"Строка {lineno}: невалидный JSON.") from exc
+            if not isinstance(rec, dict):
+                raise ValueError(f"Строка {lineno}: ожидался объект JSON.")
+            yield rec
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only.
+    fcntl = None  # type: ignore[assignment]
+
+
+class FileLocks:
+    """Advisory `flock` locks on lock files, reentrant within the process.
+
+    Exclusive locks serialise writers across processes; shared locks let readers of
+    formats that are modified in place wait for a writer to finish. While this process
+    holds a lock exclusively, a shared request for it is already satisfied, and a
+    shared lock is upgraded (then downgraded again) when an exclusive one is needed.
+    """
+
+    def __init__(self) -> None:
+        # path -> (fd, stack of held modes)
+        self._held: dict[str, tuple[int, list[bool]]] = {}
+
+    @contextmanager
+    def exclusive(self, path: str) -> Iterator[None]:
+        self._acquire(path, True)
+        try:
+            yield
+        finally:
+            self._release(path)
+
+    @contextmanager
+    def shared(self, path: str) -> Iterator[None]:
+        self._acquire(path, False)
+        try:
+            yield
+        finally:
+            self._release(path)
+
+    def _acquire(self, path: str, exclusive: bool) -> None:
+        held = self._held.get(path)
+        if held is None:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            held = self._held[path] = (fd, [])
+        fd, modes = held
+        if fcntl is not None and (not modes or (exclusive and not any(modes))):
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            except BaseException:
+                if not modes:
+                    os.close(fd)
+                    del self._held[path]
+                raise
+        modes.append(exclusive)
+
+    def _release(self, path: str) -> None:
+        fd, modes = self._held[path]
+        was_exclusive = any(modes)
+        modes.pop()
+        if not modes:
+            del self._held[path]
+            os.close(fd)  # Closing the descriptor drops the flock.
+        elif fcntl is not None and was_exclusive and not any(modes):
+            fcntl.flock(fd, fcntl.LOCK_SH)
@@ -1,16 +1,36 @@
 from __future__ import annotations
 
-from primitive_db.constants import PROMPT_TEXT, WELCOME_TEXT
+import argparse
+import os
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from primitive_db.constants import (
+    DEFAULT_INDEX_KIND,
+    DEFAULT_SYNC_MODE,
+    DEFAULT_TABLE_FORMAT,
+    PROMPT_TEXT,
+    SYNC_ENV_VAR,
+    SYNC_MODES,
+    WELCOME_TEXT,
+)
 from primitive_db.core import DbCore
+from primitive_db.decorators import describe_error, set_auto_confirm, set_raise_errors
 from primitive_db.engine import DbEngine
 from primitive_db.parser import (
     ParsedCommand,
     parse_assignments,
     parse_col_types,
     parse_command,
+    parse_select,
     parse_where,
+    pop_option,
     split_set_tokens,
+    split_where,
 )
+from primitive_db.profile import profiling
+from primitive_db.wal import SyncPolicy
 
 
 def _read_input() -> str:
@@ -26,21 +46,79 @@ def print_help() -> None:
     print(
         "Команды:\n"
         "  help\n"
-        "  create_table <name> <col:type> <col:type> ...\n"
+        "  create_table <name> <col:type> <col:type> ..."
+        " [--format json|log|columnar|mmap|segmented]\n"
         "  drop_table <name>\n"
         "  list_tables\n"
         "  insert <table> <col=value> ...\n"
-        "  select <table> [where <col> <op> <value>]\n"
-        "  update <table> set <col=value>[,<col=value>...] [where <col> <op> <value>]\n"
-        "  delete <table> [where <col> <op> <value>]\n"
+        "  load <table> <file> [--format csv|jsonl]\n"
+        "  select <table> [where <cond>] [order by <col> [asc|desc]] [limit <n>] [offset <m>]"
+        " [--output table|csv|tsv|jsonl]\n"
+        "  select <col|func(col)>, ... from <table> [where <cond>] [group by <col>, ...] ...\n"
+        "    func: count (и count(*)), sum, avg, min, max\n"
+        "    после таблицы: join <table2> on <table.col> = <table2.col>\n"
+        "  update <table> set <col=value>[,<col=value>...] [where <cond>]\n"
+        "  delete <table> [where <cond>]\n"
+        "    <cond>: <col> <op> <value> | <col> in (<v>, ...) | <col> between <a> and <b>,\n"
+        "            объединяются через and / or и скобки\n"
+        "  create_index <table> <column> [hash|sorted]\n"
+        "  drop_index <table> <column>\n"
+        "  compact <table>\n"
+        "  analyze <table> — пересчитать статистику столбцов (для планировщика и count/min/max)\n"
+        "  checkpoint\n"
+        "  explain select ... — план запроса, просмотренные/возвращённые строки, время по фазам\n"
+        "  profile [on|off] — записывать разбивку времени каждой команды в таблицу query_stats\n"
+        "  begin | commit | rollback — транзакция: изменения копятся в памяти до commit\n"
         "  quit\n"
     )
 
 
-def main() -> None:
-    engine = DbEngine()
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="primitive_db", description="Primitive DB")
+    parser.add_argument(
+        "--script", metavar="FILE", help="выполнить команды из файла ('-' — из stdin) и выйти"
+    )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="подтверждать drop_table/delete без вопроса (без него в скрипте это ошибка)",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="выполнить весь скрипт одной транзакцией; DDL (create_table, drop_table, "
+        "create_index, drop_index, compact, checkpoint, analyze) в ней запрещён",
+    )
+    parser.add_argument("--sync", choices=SYNC_MODES, help=f"режим fsync (иначе ${SYNC_ENV_VAR})")
+    args = parser.parse_args(argv)
+    if args.batch and args.script is None:
+        parser.error("--batch работает только вместе с --script")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    try:
+        engine = DbEngine(SyncPolicy(args.sync or os.environ.get(SYNC_ENV_VAR, DEFAULT_SYNC_MODE)))
+    except ValueError as exc:
+        print(f"Ошибка: {exc}")
+        return 1
     core = DbCore(engine)
 
+    try:
+        if args.script is not None:
+            # No one to ask: without --yes destructive commands fail the script.
+            set_auto_confirm(args.yes)
+            return run_script(core, args.script, batch=args.batch)
+        if args.yes:
+            set_auto_confirm(True)
+        _interact(core)
+        return 0
+    finally:
+        engine.close()
+
+
+def _interact(core: DbCore) -> None:
     print(WELCOME_TEXT)
 
     while True:
@@ -52,6 +130,8 @@ def main() -> None:
         name = cmd.name.lower()
 
         if name in {"quit", "exit"}:
+            if core.engine.in_transaction:
+                print("Незавершённая транзакция отменена.")
             print("Пока!")
             return
 
@@ -65,16 +145,83 @@ def main() -> None:
             print(f"Ошибка: {exc}")
 
 
+@contextmanager
+def _script_lines(path: str) -> Iterator[Iterator[str]]:
+    if path == "-":
+        yield iter(sys.stdin)
+        return
+    with open(path, encoding="utf-8") as f:
+        yield iter(f)
+
+
+def run_script(core: DbCore, path: str, batch: bool = False) -> int:
+    """Run every command of a script file in this engine; return the exit status.
+
+    Blank lines and lines starting with `#` or `--` are skipped. The first failing
+    command stops the script (an open transaction is rolled back). With `batch`, the
+    whole script is one transaction: its tables are written once, at the end, or not at all.
+    """
+    engine = core.engine
+    set_raise_errors(True)
+    lineno = 0
+    try:
+        with _script_lines(path) as lines:
+            if batch:
+                engine.begin()
+            for raw in lines:
+                lineno += 1
+                line = raw.strip()
+                if not line or line.startswith(("#", "--")):
+                    continue
+                cmd = parse_command(line)
+                name = cmd.name.lower()
+                if name in {"quit", "exit"}:
+                    break
+                if name == "help":
+                    print_help()
+                    continue
+                dispatch(core, cmd)
+            if batch:
+                with engine.command():
+                    core.commit()
+    except (ValueError, FileNotFoundError, KeyError) as exc:
+        print(describe_error(exc) + (f" (строка {lineno})" if lineno else ""))
+        if engine.in_transaction:
+            engine.rollback()
+            print("Транзакция отменена.")
+        return 1
+    finally:
+        set_raise_errors(False)
+    if engine.in_transaction:
+        engine.rollback()
+        print("Незавершённая транзакция отменена.")
+    return 0
+
+
 def dispatch(core: DbCore, cmd: ParsedCommand) -> None:
+    name = cmd.name.lower()
+    if not core.engine.profiling or name in {"profile", "explain"}:
+        with core.engine.command():
+            _dispatch(core, cmd)
+        return
+    with profiling(name, cmd.text) as prof, core.engine.command():
+        _dispatch(core, cmd)
+    core.engine.record_profile(prof)
+
+
+def _dispatch(core: DbCore, cmd: ParsedCommand) -> None:
     name = cmd.name.lower()
     args = cmd.args
 
     if name == "create_table":
+        fmt, args = pop_option(args, "--format")
         if len(args) < 1:
-            raise ValueError("create_table <name> <col:type> ...")
+            raise ValueError(
+                "create_table <name> <col:type> ... [--format json|log|columnar|mmap|segmented]"
+            )
         table = args[0]
         schema = parse_col_types(args[1:])
-        core.create_table(table, schema)
+        core.create_table(table, schema, fmt or DEFAULT_TABLE_FORMAT)
         return
 
     if name == "drop_table":
@@ -97,25 +244,37 @@ def dispatch(core: DbCore, cmd: ParsedCommand) -> None:
         core.insert(table, assigns)
         return
 
+    if name == "load":
+        fmt, args = pop_option(args, "--format")
+        if len(args) != 2:
+            raise ValueError("load <table> <file> [--format csv|jsonl]")
+        core.load(args[0], args[1], fmt.lower() if fmt else None)
+        return
+
     if name == "select":
-        if len(args) < 1:
-            raise ValueError("select <table> [where ...]")
-        table = args[0]
-        where_clause = None
-        if len(args) > 1:
-            if args[1].lower() != "where":
-                raise ValueError("select: ожидается 'where'")
-            where_clause = parse_where(args[2:])
-        core.select(table, where_clause)
+        core.select(parse_select(cmd.text))
+        return
+
+    if name == "explain":
+        if not args or args[0].lower() != "select":
+            raise ValueError("explain select ...")
+        core.explain(parse_select(cmd.text.split(None, 1)[1]))
+        return
+
+    if name == "profile":
+        if len(args) > 1 or (args and args[0].lower() not in {"on", "off"}):
+            raise ValueError("profile [on|off]")
+        core.profile(args[0].lower() == "on" if args else None)
         return
 
     if name == "update":
         if len(args) < 2:
             raise ValueError("update <table> set ...")
         table = args[0]
-        set_part, where_tokens = split_set_tokens(args[1:])
+        set_part, _ = split_set_tokens(args[1:])
         updates = parse_assignments(set_part)
-        where_clause = parse_where(where_tokens) if where_tokens else None
+        where_tokens = split_where(cmd.text)
+        where_clause = parse_where(where_tokens) if where_tokens is not None else None
         core.update(table, updates, where_clause)
         return
 
@@ -127,8 +286,45 @@ def dispatch(core: DbCore, cmd: ParsedCommand) -> None:
         if len(args) > 1:
             if args[1].lower() != "where":
                 raise ValueError("delete: ожидается 'where'")
-            where_clause = parse_where(args[2:])
+            where_clause = parse_where(split_where(cmd.text) or [])
         core.delete(table, where_clause)
         return
 
+    if name == "create_index":
+        if len(args) not in {2, 3}:
+            raise ValueError("create_index <table> <column> [hash|sorted]")
+        kind = args[2].lower() if len(args) == 3 else DEFAULT_INDEX_KIND
+        core.create_index(args[0], args[1], kind)
+        return
+
+    if name == "drop_index":
+        if len(args) != 2:
+            raise ValueError("drop_index <table> <column>")
+        core.drop_index(args[0], args[1])
+        return
+
+    if name in {"begin", "commit", "rollback"}:
+        if args:
+            raise ValueError(f"{name} (без аргументов)")
+        {"begin": core.begin, "commit": core.commit, "rollback": core.rollback}[name]()
+        return
+
+    if name == "checkpoint":
+        if args:
+            raise ValueError("checkpoint (без аргументов)")
+        core.checkpoint()
+        return
+
+    if name == "analyze":
+        if len(args) != 1:
+            raise ValueError("analyze <table>")
+        core.analyze(args[0])
+        return
+
+    if name == "compact":
+        if len(args) != 1:
+            raise ValueError("compact <table>")
+        core.compact(args[0])
+        return
+
     raise ValueError("Неизвестная команда. help — список команд.")
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import mmap
+import operator
+import os
+from array import array
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import compress
+from multiprocessing import get_context
+from operator import itemgetter
+
+from primitive_db.columnar import Column, read_columns
+from primitive_db.constants import (
+    PARALLEL_SCAN_MIN_ROWS,
+    SCAN_PARTITION_MIN_ROWS,
+    SCAN_PARTITIONS_PER_WORKER,
+    SCAN_WORKERS_ENV_VAR,
+)
+from primitive_db.predicate import Expr, column_mask, expr_columns
+from primitive_db.rowfile import parse_header
+from primitive_db.utils import file_stamp
+
+# A row range of one table file for a worker: (path, file stamp, start, stop).
+FilePart = tuple[str, tuple[int, ...], int, int]
+
+
+def scan_worker_count() -> int:
+    """Worker processes from $PRIMITIVE_DB_SCAN_WORKERS (default 0; 0 or 1: off).
+
+    Opt-in: a pool pays process start-up and reads the file again, which only a big
+    scan of a table not already in memory wins back.
+    """
+    raw = os.environ.get(SCAN_WORKERS_ENV_VAR)
+    if raw is None:
+        return 0
+    try:
+        workers = int(raw)
+    except ValueError:
+        workers = -1
+    if workers < 0:
+        raise ValueError(
+            f"{SCAN_WORKERS_ENV_VAR}: ожидалось неотрицательное число процессов, а не {raw!r}."
+        )
+    return workers
+
+
+def _match_records(mm: mmap.mmap, expr: Expr, start: int, stop: int) -> Iterator[bool]:
+    """Match flags of the fixed-width records in [start, stop); dead records never match."""
+    layout, data_offset, _ = parse_header(mm)
+    lo, hi = data_offset + start * layout.size, data_offset + stop * layout.size
+    with memoryview(mm) as mv, mv[lo:hi] as region:
+        records = list(layout.struct.iter_unpack(region))
+    wanted = expr_columns(expr)
+    columns: dict[str, Column] = {}
+    for name, typ, _ in layout.columns:
+        if name in wanted:
+            idx = layout.value_index(name)
+            columns[name] = [layout.column_value(v, idx, typ) for v in records]
+    return map(operator.and_, map(itemgetter(0), records), column_mask(expr, columns))
+
+
+def _match_columns(mm: mmap.mmap, expr: Expr, start: int, stop: int) -> Iterator[bool]:
+    """Match flags of the columnar rows in [start, stop)."""
+    return column_mask(expr, read_columns(mm, expr_columns(expr), start, stop))
+
+
+# Segment files of segmented tables use the columnar encoding.
+_MATCHERS = {"mmap": _match_records, "segmented": _match_columns}
+
+
+def _scan_partition(
+    fmt: str, path: str, stamp: tuple[int, ...], start: int, stop: int, expr: Expr
+) -> array:
+    """Worker side: map the table file and test one row range (runs in a pool process)."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if file_stamp(path) != stamp:
+            raise ValueError("Таблица изменилась во время параллельного чтения.")
+        matches = _MATCHERS[fmt](mm, expr, start, stop)
+        return array("q", compress(range(start, stop), matches))
+
+
+class ParallelScanner:
+    """Evaluates a WHERE expression over row ranges of a table file in worker processes.
+
+    Workers map the file themselves and send back only the positions of matching
+    rows, so no row is pickled either way; the caller builds the matches from its own
+    copy. The pool starts on first use (spawned, so it is safe beside the server's
+    threads) and lives until `close`.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    def enabled(self, rows: int) -> bool:
+        return self.workers > 1 and rows >= PARALLEL_SCAN_MIN_ROWS
+
+    def partitions(self, rows: int) -> list[tuple[int, int]]:
+        """Row ranges to hand out: several per worker, so a slow one does not hold the rest."""
+        step = max(-(-rows // (self.workers * SCAN_PARTITIONS_PER_WORKER)), SCAN_PARTITION_MIN_ROWS)
+        return [(lo, min(lo + step, rows)) for lo in range(0, rows, step)]
+
+    def scan(
+        self, fmt: str, path: str, stamp: tuple[int, ...], rows: int, expr: Expr
+    ) -> Iterator[array]:
+        """Positions of the matching rows, one array per partition, in table order."""
+        return self.scan_files(
+            fmt, [(path, stamp, lo, hi) for lo, hi in self.partitions(rows)], expr
+        )
+
+    def scan_files(self, fmt: str, parts: list[FilePart], expr: Expr) -> Iterator[array]:
+        """Positions of the matching rows of each (path, stamp, start, stop) part, in order.
+
+        All parts are submitted at once; closing the iterator early (LIMIT) cancels
+        those not started yet. A worker that dies takes the pool with it: that is
+        reported as a ValueError and the next scan starts a fresh pool.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+        futures = [self._pool.submit(_scan_partition, fmt, *part, expr) for part in parts]
+        try:
+            for future in futures:
+                yield future.result()
+        except BrokenProcessPool:
+            self.close()  # The next scan starts a fresh pool.
+            raise ValueError("Процесс параллельного чтения завершился аварийно.") from None
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -4,13 +4,26 @@ import shlex
 from dataclasses import dataclass
 from typing import Any, Iterable
 
-from primitive_db.constants import SUPPORTED_TYPES
+from primitive_db.aggregate import Aggregate, SelectItem, item_label
+from primitive_db.constants import (
+    AGGREGATE_FUNCS,
+    DEFAULT_OUTPUT_FORMAT,
+    OUTPUT_FORMATS,
+    SUPPORTED_TYPES,
+)
+from primitive_db.predicate import OPERATORS
 
 
 @dataclass(frozen=True)
 class ParsedCommand:
     name: str
     args: list[str]
+    raw: str = ""
+
+    @property
+    def text(self) -> str:
+        """Original command line (rebuilt from args if the command was made by hand)."""
+        return self.raw or shlex.join([self.name, *self.args])
 
 
 @dataclass(frozen=True)
@@ -20,7 +33,69 @@ class WhereClause:
     value_raw: str
 
 
-OPS = {"=", "!=", "<", "<=", ">", ">="}
+@dataclass(frozen=True)
+class InClause:
+    column: str
+    values_raw: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class BetweenClause:
+    column: str
+    low_raw: str
+    high_raw: str
+
+
+@dataclass(frozen=True)
+class WhereGroup:
+    """`kind` is "and" or "or"."""
+
+    kind: str
+    parts: tuple[WhereExpr, ...]
+
+
+WhereExpr = WhereClause | InClause | BetweenClause | WhereGroup
+
+
+@dataclass(frozen=True)
+class JoinClause:
+    """`join <table> on <left> = <right>`; columns may be written `table.column`."""
+
+    table: str
+    left: str
+    right: str
+
+
+@dataclass(frozen=True)
+class SelectQuery:
+    """`items` is empty for `select <table>` (every column)."""
+
+    table: str
+    where: WhereExpr | None = None
+    limit: int | None = None
+    offset: int = 0
+    output: str = DEFAULT_OUTPUT_FORMAT
+    items: tuple[SelectItem, ...] = ()
+    group_by: tuple[str, ...] = ()
+    order_by: str | None = None
+    descending: bool = False
+    join: JoinClause | None = None
+
+
+@dataclass(frozen=True)
+class Token:
+    """Lexeme of a where expression; `kind` is word, str (quoted), op or punct."""
+
+    kind: str
+    text: str
+
+    def is_word(self, *words: str) -> bool:
+        return self.kind == "word" and self.text.lower() in words
+
+
+OPS = set(OPERATORS)
+_OP_CHARS = frozenset("=!<>")
+_PUNCT = frozenset("(),")
 
 
 def parse_command(raw: str) -> ParsedCommand:
@@ -28,7 +103,17 @@ def parse_command(raw: str) -> ParsedCommand:
     if not raw:
         return ParsedCommand(name="", args=[])
     parts = shlex.split(raw)
-    return ParsedCommand(name=parts[0], args=parts[1:])
+    return ParsedCommand(name=parts[0], args=parts[1:], raw=raw)
+
+
+def pop_option(args: list[str], name: str) -> tuple[str | None, list[str]]:
+    """Extract `--name value` from args; return (value, remaining args)."""
+    if name not in args:
+        return None, args
+    pos = args.index(name)
+    if pos + 1 >= len(args):
+        raise ValueError(f"Ожидалось значение после {name}")
+    return args[pos + 1], args[:pos] + args[pos + 2 :]
 
 
 def parse_col_types(items: Iterable[str]) -> dict[str, str]:
@@ -64,37 +149,286 @@ def parse_assignments(tokens: list[str]) -> dict[str, str]:
 
 
 def split_set_tokens(args: list[str]) -> tuple[list[str], list[str]]:
-    """Split update args into set part and optional where part."""
+    """Split update args into set part and optional where part.
+
+    The set part ends at the `where` keyword (see `split_where`), so a value or a
+    column that is itself `where` (`set note=where`) stays in the assignments.
+    """
     if not args or args[0].lower() != "set":
         raise ValueError("Ожидалось: update <table> set ...")
 
-    joined = " ".join(args[1:])
-    before_where, sep, after_where = joined.partition(" where ")
-    set_part = [x.strip() for x in before_where.split(",") if x.strip()]
-    where_part = shlex.split(after_where) if sep else []
+    rest = args[1:]
+    set_args, where_part = rest, []
+    for pos, arg in enumerate(rest):
+        if (
+            arg.lower() == "where"
+            and (pos == 0 or not rest[pos - 1].endswith("="))
+            and (pos + 1 == len(rest) or not rest[pos + 1].startswith("="))
+        ):
+            set_args, where_part = rest[:pos], rest[pos + 1 :]
+            break
+    set_part = [x.strip() for x in " ".join(set_args).split(",") if x.strip()]
     return set_part, where_part
 
 
-def parse_where(tokens: list[str]) -> WhereClause:
-    if len(tokens) < 3:
+def tokenize(text: str) -> list[Token]:
+    """Split a where expression; quotes keep their content as one `str` token."""
+    tokens: list[Token] = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch.isspace():
+            i += 1
+        elif ch in "\"'":
+            buf = []
+            i += 1
+            while i < n and text[i] != ch:
+                if text[i] == "\\" and ch == '"' and i + 1 < n:
+                    i += 1
+                buf.append(text[i])
+                i += 1
+            if i >= n:
+                raise ValueError("Незакрытая кавычка в where.")
+            tokens.append(Token("str", "".join(buf)))
+            i += 1
+        elif ch in _PUNCT:
+            tokens.append(Token("punct", ch))
+            i += 1
+        elif ch in _OP_CHARS:
+            op = text[i : i + 2] if text[i : i + 2] in OPS else ch
+            if op not in OPS:
+                raise ValueError(f"Неверный оператор where: {op}")
+            tokens.append(Token("op", op))
+            i += len(op)
+        else:
+            start = i
+            while i < n and not (
+                text[i].isspace() or text[i] in _PUNCT or text[i] in _OP_CHARS or text[i] in "\"'"
+            ):
+                i += 1
+            tokens.append(Token("word", text[start:i]))
+    return tokens
+
+
+def split_where(text: str) -> list[Token] | None:
+    """Tokens after the `where` keyword, or None if there is none.
+
+    Only an unquoted `where` with no operator on either side is the keyword: right
+    after `=` it is a value (`set note=where where id=1`), right before one a column.
+    """
+    tokens = tokenize(text)
+    for pos, tok in enumerate(tokens):
+        if (
+            tok.is_word("where")
+            and (pos == 0 or tokens[pos - 1].kind != "op")
+            and (pos + 1 == len(tokens) or tokens[pos + 1].kind != "op")
+        ):
+            return tokens[pos + 1 :]
+    return None
+
+
+class _WhereParser:
+    """Recursive descent: or_expr := and_expr (OR and_expr)*; and_expr := atom (AND atom)*."""
+
+    def __init__(self, tokens: list[Token], pos: int = 0) -> None:
+        self.tokens = tokens
+        self.pos = pos
+
+    def peek(self) -> Token | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Token:
+        tok = self.peek()
+        if tok is None:
+            raise ValueError("Неожиданный конец условия where.")
+        self.pos += 1
+        return tok
+
+    def expect_punct(self, ch: str) -> None:
+        tok = self.take()
+        if tok.kind != "punct" or tok.text != ch:
+            raise ValueError(f"Ожидалось '{ch}' в where, получено: {tok.text}")
+
+    def value(self) -> str:
+        tok = self.take()
+        if tok.kind not in {"word", "str"}:
+            raise ValueError(f"Ожидалось значение в where, получено: {tok.text}")
+        return tok.text
+
+    def name(self, what: str) -> str:
+        tok = self.take()
+        if tok.kind != "word":
+            raise ValueError(f"Ожидался {what}, получено: {tok.text}")
+        return tok.text
+
+    def names(self) -> tuple[str, ...]:
+        """`col[, col...]`"""
+        cols = [self.name("столбец")]
+        while (tok := self.peek()) is not None and tok.text == ",":
+            self.pos += 1
+            cols.append(self.name("столбец"))
+        return tuple(cols)
+
+    def select_item(self) -> SelectItem:
+        """`col`, `func(col)` or `count(*)`."""
+        word = self.name("столбец или агрегат")
+        if (tok := self.peek()) is None or tok.text != "(":
+            return word
+        func = word.lower()
+        if func not in AGGREGATE_FUNCS:
+            raise ValueError(f"Неизвестный агрегат: {word}")
+        self.pos += 1
+        column = self.name("столбец")
+        self.expect_punct(")")
+        if column == "*":
+            if func != "count":
+                raise ValueError(f"{func}(*) не поддерживается, только count(*)")
+            return Aggregate(func)
+        return Aggregate(func, column)
+
+    def parse(self) -> WhereExpr:
+        expr = self.or_expr()
+        extra = self.peek()
+        if extra is not None:
+            raise ValueError(f"Лишний текст в where: {extra.text}")
+        return expr
+
+    def or_expr(self) -> WhereExpr:
+        parts = [self.and_expr()]
+        while (tok := self.peek()) is not None and tok.is_word("or"):
+            self.pos += 1
+            parts.append(self.and_expr())
+        return parts[0] if len(parts) == 1 else WhereGroup("or", tuple(parts))
+
+    def and_expr(self) -> WhereExpr:
+        parts = [self.atom()]
+        while (tok := self.peek()) is not None and tok.is_word("and"):
+            self.pos += 1
+            parts.append(self.atom())
+        return parts[0] if len(parts) == 1 else WhereGroup("and", tuple(parts))
+
+    def atom(self) -> WhereExpr:
+        tok = self.take()
+        if tok.kind == "punct" and tok.text == "(":
+            expr = self.or_expr()
+            self.expect_punct(")")
+            return expr
+        if tok.kind != "word":
+            raise ValueError(f"Ожидался столбец в where, получено: {tok.text}")
+        column = tok.text
+        nxt = self.take()
+        if nxt.kind == "op":
+            return WhereClause(column=column, op=nxt.text, value_raw=self.value())
+        if nxt.is_word("in"):
+            self.expect_punct("(")
+            values = [self.value()]
+            while (p := self.take()).kind == "punct" and p.text == ",":
+                values.append(self.value())
+            if p.text != ")":
+                raise ValueError(f"Ожидалось ')' в where, получено: {p.text}")
+            return InClause(column=column, values_raw=tuple(values))
+        if nxt.is_word("between"):
+            low = self.value()
+            if not self.take().is_word("and"):
+                raise ValueError("Ожидалось: <col> between <a> and <b>")
+            return BetweenClause(column=column, low_raw=low, high_raw=self.value())
+        raise ValueError(f"Неверный оператор where: {nxt.text}")
+
+
+def parse_where(tokens: list[Token]) -> WhereExpr:
+    """Parse AND/OR/parentheses, `<col> <op> <value>`, `IN (...)` and `BETWEEN a AND b`."""
+    if not tokens:
         raise ValueError("Ожидалось: where <col> <op> <value>")
-    column, op, value_raw = tokens[0], tokens[1], tokens[2]
-    if op not in OPS:
-        raise ValueError(f"Неверный оператор where: {op}")
-    return WhereClause(column=column, op=op, value_raw=value_raw)
+    return _WhereParser(tokens).parse()
+
+
+def _count(tok: Token, keyword: str) -> int:
+    try:
+        value = int(tok.text)
+    except ValueError:
+        value = -1
+    if tok.kind != "word" or value < 0:
+        raise ValueError(f"{keyword}: ожидалось неотрицательное целое, получено: {tok.text}")
+    return value
+
+
+def parse_select(text: str) -> SelectQuery:
+    """Parse `select <table> [where <cond>] [order by <col> [asc|desc]] [limit <n>]
+    [offset <m>] [--output <fmt>]`.
+
+    A select list puts the table after `from`, and allows aggregates and `group by`:
+    `select <col|func(col)>, ... from <table> [where <cond>] [group by <col>, ...] ...`;
+    such a query may be ordered by any of its items, e.g. `order by count(*) desc`.
+    Either form may join a second table after the first: `join <table> on <a.x> = <b.y>`;
+    the joined columns are then named `<table>.<column>`.
+    """
+    tokens = tokenize(text)[1:]
+    output = DEFAULT_OUTPUT_FORMAT
+    for pos, tok in enumerate(tokens):
+        if tok.is_word("--output"):
+            if pos + 1 >= len(tokens):
+                raise ValueError("Ожидалось значение после --output")
+            output = tokens[pos + 1].text.lower()
+            if output not in OUTPUT_FORMATS:
+                raise ValueError(f"--output: ожидалось {'|'.join(OUTPUT_FORMATS)}")
+            del tokens[pos : pos + 2]
+            break
+    if not tokens or tokens[0].kind != "word":
+        raise ValueError("select <table> [where ...] [limit <n>] [offset <m>]")
+
+    p = _WhereParser(tokens)
+    items: list[SelectItem] = []
+    if len(tokens) > 1 and (tokens[1].text in {"(", ","} or tokens[1].is_word("from")):
+        items.append(p.select_item())
+        while (tok := p.take()).text == ",":
+            items.append(p.select_item())
+        if not tok.is_word("from"):
+            raise ValueError(f"select: ожидалось 'from', получено: {tok.text}")
+    table = p.name("имя таблицы")
+    join: JoinClause | None = None
+    if (tok := p.peek()) is not None and tok.is_word("join"):
+        p.pos += 1
+        other = p.name("имя таблицы")
+        if not p.take().is_word("on"):
+            raise ValueError("Ожидалось: join <table> on <col> = <col>")
+        left = p.name("столбец")
+        if p.take().text != "=":
+            raise ValueError("join: в условии on поддерживается только '='")
+        join = JoinClause(other, left, p.name("столбец"))
+    where: WhereExpr | None = None
+    limit: int | None = None
+    offset = 0
+    group_by: tuple[str, ...] = ()
+    order_by: str | None = None
+    descending = False
+    if (tok := p.peek()) is not None and tok.is_word("where"):
+        p.pos += 1
+        where = p.or_expr()
+    while (tok := p.peek()) is not None:
+        p.pos += 1
+        if tok.is_word("group") and items and not group_by:
+            if not p.take().is_word("by"):
+                raise ValueError("Ожидалось: group by <col>, ...")
+            group_by = p.names()
+        elif tok.is_word("order") and order_by is None:
+            if not p.take().is_word("by"):
+                raise ValueError("Ожидалось: order by <col> [asc|desc]")
+            order_by = item_label(p.select_item())
+            if (way := p.peek()) is not None and way.is_word("asc", "desc"):
+                p.pos += 1
+                descending = way.is_word("desc")
+        elif tok.is_word("limit") and limit is None:
+            limit = _count(p.take(), "limit")
+        elif tok.is_word("offset") and not offset:
+            offset = _count(p.take(), "offset")
+        else:
+            raise ValueError(f"select: лишний текст: {tok.text}")
+    return SelectQuery(
+        table, where, limit, offset, output, tuple(items), group_by, order_by, descending, join
+    )
 
 
 def compare(left: Any, op: str, right: Any) -> bool:
-    if op == "=":
-        return left == right
-    if op == "!=":
-        return left != right
-    if op == "<":
-        return left < right
-    if op == "<=":
-        return left <= right
-    if op == ">":
-        return left > right
-    if op == ">=":
-        return left >= right
-    raise ValueError(f"Неверный оператор: {op}")
+    if op not in OPERATORS:
+        raise ValueError(f"Неверный оператор: {op}")
+    return OPERATORS[op](left, right)
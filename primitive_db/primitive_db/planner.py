@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from primitive_db.constants import INDEX_SCAN_FRACTION
+from primitive_db.indexes import Index
+from primitive_db.predicate import And, Cmp, Expr, Or, expr_columns
+
+
+@dataclass(frozen=True)
+class Plan:
+    """How a WHERE expression will be answered.
+
+    access: "all" (no filter), "scan", "pk" (primary-key map) or "index".
+    lookup: the conjunct answered by the access path; its ids are fetched directly.
+    residual: whatever is left, evaluated over the fetched (or scanned) rows.
+    """
+
+    access: str
+    lookup: Expr | None = None
+    residual: Expr | None = None
+    estimate: int | None = None
+    detail: str = ""
+
+    def describe(self) -> str:
+        """One line for `explain`: `index age:sorted, ~12 строк, фильтр: name`."""
+        parts = [f"{self.access} {self.detail}" if self.access == "index" else self.access]
+        if self.estimate is not None:
+            parts.append(f"~{self.estimate} строк")
+        if self.residual is not None:
+            parts.append(f"фильтр: {', '.join(sorted(expr_columns(self.residual)))}")
+        return ", ".join(parts)
+
+
+def conjuncts(expr: Expr) -> list[Expr]:
+    if isinstance(expr, And):
+        return [c for part in expr.parts for c in conjuncts(part)]
+    return [expr]
+
+
+def conjoin(parts: list[Expr]) -> Expr | None:
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else And(tuple(parts))
+
+
+def _candidate(expr: Expr, indexes: dict[str, Index]) -> tuple[int, str] | None:
+    """(estimated rows, access description) if `expr` can be answered from pk/indexes alone."""
+    if isinstance(expr, Cmp):
+        if expr.column == "id" and expr.op in {"=", "in"}:
+            return (1 if expr.op == "=" else len(expr.value)), "pk"
+        index = indexes.get(expr.column)
+        if index is None or expr.op not in index.ops:
+            return None
+        estimate = index.estimate(expr.op, expr.value)
+        if estimate > index.size * INDEX_SCAN_FRACTION:
+            return None  # Fetching most of the table by id is slower than scanning it.
+        return estimate, f"{expr.column}:{index.kind}"
+    if isinstance(expr, Or):
+        total, details = 0, []
+        for part in expr.parts:
+            sub = _candidate(part, indexes)
+            if sub is None:
+                return None
+            total += sub[0]
+            details.append(sub[1])
+        return total, " | ".join(details)
+    return None
+
+
+def make_plan(expr: Expr | None, indexes: dict[str, Index]) -> Plan:
+    """Pick the most selective indexable conjunct; everything else becomes a residual filter.
+
+    Estimates come straight from the indexes (hash bucket sizes, bisect spans), so the
+    choice is made on exact row counts rather than guesses.
+    """
+    if expr is None:
+        return Plan("all")
+    parts = conjuncts(expr)
+    best: tuple[int, str, int] | None = None
+    for pos, part in enumerate(parts):
+        cand = _candidate(part, indexes)
+        if cand is not None and (best is None or cand[0] < best[0]):
+            best = (cand[0], cand[1], pos)
+    if best is None:
+        return Plan("scan", residual=expr)
+    estimate, detail, pos = best
+    return Plan(
+        "pk" if detail == "pk" else "index",
+        lookup=parts[pos],
+        residual=conjoin(parts[:pos] + parts[pos + 1 :]),
+        estimate=estimate,
+        detail=detail,
+    )
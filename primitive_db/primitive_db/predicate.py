@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import operator
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from functools import partial, reduce
+from itertools import compress, tee
+from typing import Any
+
+Row = dict[str, Any]
+
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+# `x <op> value` written as `<swapped op>(value, x)`, so the bound value goes first in partial.
+_SWAPPED: dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.gt,
+    "<=": operator.ge,
+    ">": operator.lt,
+    ">=": operator.le,
+}
+
+
+@dataclass(frozen=True)
+class Cmp:
+    """`column <op> value` with the value already cast to the column type.
+
+    For `op == "in"` the value is a frozenset of candidates.
+    """
+
+    column: str
+    op: str
+    value: Any
+
+
+@dataclass(frozen=True)
+class And:
+    parts: tuple[Expr, ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    parts: tuple[Expr, ...]
+
+
+Expr = Cmp | And | Or
+
+
+def expr_columns(expr: Expr) -> set[str]:
+    if isinstance(expr, Cmp):
+        return {expr.column}
+    return set().union(*(expr_columns(p) for p in expr.parts))
+
+
+def rename_columns(expr: Expr, rename: Callable[[str], str]) -> Expr:
+    if isinstance(expr, Cmp):
+        return Cmp(rename(expr.column), expr.op, expr.value)
+    return type(expr)(tuple(rename_columns(p, rename) for p in expr.parts))
+
+
+def compile_test(op: str, value: Any) -> Callable[[Any], bool]:
+    """Value test for one operator, as a C-level callable (no Python frame per call)."""
+    if op == "in":
+        return partial(operator.contains, value)
+    if op not in _SWAPPED:
+        raise ValueError(f"Неверный оператор: {op}")
+    return partial(_SWAPPED[op], value)
+
+
+def compile_expr(expr: Expr) -> Callable[[Row], bool]:
+    """Row predicate for an expression tree, built once per query."""
+    if isinstance(expr, Cmp):
+        get = operator.itemgetter(expr.column)
+        test = compile_test(expr.op, expr.value)
+        return lambda r: test(get(r))
+    parts = [compile_expr(p) for p in expr.parts]
+    if isinstance(expr, And):
+        return lambda r: all(p(r) for p in parts)
+    return lambda r: any(p(r) for p in parts)
+
+
+def _mask(expr: Expr, rows: Iterable[Row]) -> Iterator[bool]:
+    if isinstance(expr, Cmp):
+        return map(compile_test(expr.op, expr.value), map(operator.itemgetter(expr.column), rows))
+    masks = [
+        _mask(p, branch) for p, branch in zip(expr.parts, tee(rows, len(expr.parts)), strict=True)
+    ]
+    return map(all if isinstance(expr, And) else any, zip(*masks, strict=True))
+
+
+def column_mask(expr: Expr, columns: Mapping[str, Iterable[Any]]) -> Iterator[bool]:
+    """Whether each row matches `expr`, tested over whole columns (no row dicts)."""
+    if isinstance(expr, Cmp):
+        return map(compile_test(expr.op, expr.value), columns[expr.column])
+    masks = [column_mask(p, columns) for p in expr.parts]
+    return map(all if isinstance(expr, And) else any, zip(*masks, strict=True))
+
+
+def iter_filter(expr: Expr, rows: Iterable[Row]) -> Iterator[Row]:
+    """Lazily yield rows matching `expr`, evaluated column-at-a-time with map/compress.
+
+    The row stream is split with `tee` and consumed in lockstep, so only a row or two
+    is buffered; conjunctions are chained, so later parts only see the surviving rows.
+    """
+    if isinstance(expr, And):
+        return reduce(lambda acc, part: iter_filter(part, acc), expr.parts, iter(rows))
+    keep, probe = tee(rows)
+    return compress(keep, _mask(expr, probe))
+
+
+def filter_rows(expr: Expr, rows: Iterable[Row]) -> list[Row]:
+    """Rows matching `expr` as a list (see `iter_filter`)."""
+    return list(iter_filter(expr, rows))
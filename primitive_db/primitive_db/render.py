@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import csv
+import json
+import sys
+from collections.abc import Iterable
+from itertools import islice
+from typing import Any, TextIO
+
+from prettytable import PrettyTable
+
+from primitive_db.constants import DEFAULT_OUTPUT_FORMAT, OUTPUT_FORMATS, SELECT_PAGE_SIZE
+
+Row = dict[str, Any]
+
+
+def write_rows(
+    rows: Iterable[Row],
+    columns: list[str],
+    output: str = DEFAULT_OUTPUT_FORMAT,
+    out: TextIO | None = None,
+    page_size: int = SELECT_PAGE_SIZE,
+) -> int:
+    """Print rows as they arrive and return how many were printed.
+
+    `table` output is a PrettyTable per page of `page_size` rows; csv/tsv/jsonl are
+    written row by row. Only one page is ever held in memory.
+    """
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"Неизвестный формат вывода: {output}")
+    out = out or sys.stdout
+    if output == "table":
+        return _write_pages(rows, columns, out, page_size)
+    count = 0
+    if output == "jsonl":
+        for r in rows:
+            out.write(json.dumps({c: r.get(c) for c in columns}, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+    writer = csv.writer(out, delimiter="\t" if output == "tsv" else ",", lineterminator="\n")
+    writer.writerow(columns)
+    for r in rows:
+        writer.writerow([r.get(c) for c in columns])
+        count += 1
+    return count
+
+
+def _write_pages(rows: Iterable[Row], columns: list[str], out: TextIO, page_size: int) -> int:
+    it = iter(rows)
+    count = 0
+    while page := list(islice(it, page_size)):
+        t = PrettyTable()
+        t.field_names = columns
+        t.add_rows([[r.get(c) for c in columns] for r in page])
+        out.write(f"{t}\n")
+        out.flush()
+        count += len(page)
+    return count
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import struct
+from collections.abc import Iterable
+from typing import Any
+
+from primitive_db.constants import STR_MIN_WIDTH
+
+MAGIC = b"PDBROW2\n"
+_HEADER_LEN = struct.Struct("<I")
+_SORTED_RUN = struct.Struct("<q")
+# The length of the sorted run sits at a fixed place, so an append can update it in place.
+SORTED_RUN_OFFSET = len(MAGIC) + _HEADER_LEN.size
+
+Row = dict[str, Any]
+
+
+class RowLayout:
+    """Fixed-width little-endian record: a live flag followed by one field per column.
+
+    `str` columns take a uint32 byte length plus a zero-padded slot of `width` bytes,
+    so every record has the same size and row `i` lives at `data_offset + i * size`.
+    """
+
+    def __init__(self, columns: list[tuple[str, str, int]]) -> None:
+        self.columns = columns
+        fmt = ["<?"]
+        self._slots: list[tuple[str, str, int]] = []  # (name, type, value index in tuple)
+        offsets: dict[str, int] = {}
+        pos = 1
+        for name, typ, width in columns:
+            offsets[name] = struct.calcsize("".join(fmt))
+            if typ == "str":
+                fmt.append(f"I{width}s")
+                self._slots.append((name, typ, pos))
+                pos += 2
+            else:
+                fmt.append({"int": "q", "float": "d", "bool": "?"}[typ])
+                self._slots.append((name, typ, pos))
+                pos += 1
+        self.struct = struct.Struct("".join(fmt))
+        self.size = self.struct.size
+        self.field_offsets = offsets
+        self.id_struct = struct.Struct("<q")
+
+    @classmethod
+    def for_rows(cls, schema: dict[str, str], rows: Iterable[Row]) -> RowLayout:
+        """Layout with str slots wide enough for `rows` (with headroom to grow)."""
+        widths = {c: STR_MIN_WIDTH for c, t in schema.items() if t == "str"}
+        for r in rows:
+            for c in widths:
+                need = len(str(r[c]).encode("utf-8"))
+                if need > widths[c]:
+                    widths[c] = max(need, widths[c] * 2)
+        return cls([(c, t, widths.get(c, 0)) for c, t in schema.items()])
+
+    def fits(self, rows: Iterable[Row]) -> bool:
+        """Whether every str value present in `rows` fits its slot."""
+        str_cols = [(n, w) for n, t, w in self.columns if t == "str"]
+        return all(len(str(r[n]).encode("utf-8")) <= w for r in rows for n, w in str_cols if n in r)
+
+    def value_index(self, column: str) -> int:
+        for name, _, idx in self._slots:
+            if name == column:
+                return idx
+        raise KeyError(column)
+
+    def pack(self, row: Row, live: bool = True) -> bytes:
+        values: list[Any] = [live]
+        for name, typ, _ in self._slots:
+            if typ == "str":
+                raw = str(row[name]).encode("utf-8")
+                values.extend((len(raw), raw))
+            else:
+                values.append(row[name])
+        try:
+            return self.struct.pack(*values)
+        except struct.error as exc:
+            raise ValueError("Значение не помещается в поле фиксированной ширины.") from exc
+
+    def decode(self, values: tuple[Any, ...]) -> Row:
+        row: Row = {}
+        for name, typ, idx in self._slots:
+            if typ == "str":
+                row[name] = values[idx + 1][: values[idx]].decode("utf-8")
+            else:
+                row[name] = values[idx]
+        return row
+
+    def column_value(self, values: tuple[Any, ...], idx: int, typ: str) -> Any:
+        if typ == "str":
+            return values[idx + 1][: values[idx]].decode("utf-8")
+        return values[idx]
+
+    def header(self, sorted_run: int) -> bytes:
+        """File header for records whose first `sorted_run` are in id order."""
+        header = json.dumps({"columns": self.columns, "row_size": self.size}).encode("utf-8")
+        return MAGIC + _HEADER_LEN.pack(len(header)) + pack_sorted_run(sorted_run) + header
+
+
+def pack_sorted_run(count: int) -> bytes:
+    """Bytes to write at `SORTED_RUN_OFFSET`: the first `count` records are in id order."""
+    return _SORTED_RUN.pack(count)
+
+
+def parse_header(buf: Any) -> tuple[RowLayout, int, int]:
+    """Return the layout, the offset of the first record and the length of the sorted run."""
+    if bytes(buf[: len(MAGIC)]) != MAGIC:
+        raise ValueError("Файл таблицы повреждён (неверная сигнатура mmap).")
+    (header_len,) = _HEADER_LEN.unpack_from(buf, len(MAGIC))
+    (sorted_run,) = _SORTED_RUN.unpack_from(buf, SORTED_RUN_OFFSET)
+    start = SORTED_RUN_OFFSET + _SORTED_RUN.size
+    header = json.loads(bytes(buf[start : start + header_len]))
+    layout = RowLayout([(n, t, int(w)) for n, t, w in header["columns"]])
+    return layout, start + header_len, sorted_run
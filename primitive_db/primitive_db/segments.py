@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from primitive_db.columnar import Column
+from primitive_db.predicate import And, Expr, Or
+
+# Whether a segment whose column spans [lo, hi] can hold a value `<op> value`.
+_ZONE_TESTS: dict[str, Callable[[Any, Any, Any], bool]] = {
+    "=": lambda lo, hi, v: lo <= v <= hi,
+    "!=": lambda lo, hi, v: not lo == hi == v,
+    "<": lambda lo, hi, v: lo < v,
+    "<=": lambda lo, hi, v: lo <= v,
+    ">": lambda lo, hi, v: hi > v,
+    ">=": lambda lo, hi, v: hi >= v,
+    "in": lambda lo, hi, v: any(lo <= x <= hi for x in v),
+}
+
+
+@dataclass
+class Segment:
+    """One segment file of a segmented table: its rows' id range and zone map.
+
+    The zone map holds [min, max] of every column over the segment's rows.
+    """
+
+    file: str
+    rows: int
+    first_id: int
+    last_id: int
+    zones: dict[str, list[Any]]
+
+    @classmethod
+    def of(cls, file: str, columns: dict[str, Column]) -> Segment:
+        ids = columns["id"]
+        zones = {name: [min(col), max(col)] for name, col in columns.items()}
+        return cls(file, len(ids), ids[0], ids[-1], zones)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "file": self.file,
+            "rows": self.rows,
+            "ids": [self.first_id, self.last_id],
+            "zones": self.zones,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> Segment:
+        first, last = data["ids"]
+        return cls(data["file"], data["rows"], first, last, data["zones"])
+
+
+def may_match(expr: Expr, zones: dict[str, list[Any]]) -> bool:
+    """False only if the zone map proves that no row of the segment matches `expr`."""
+    if isinstance(expr, And):
+        return all(may_match(p, zones) for p in expr.parts)
+    if isinstance(expr, Or):
+        return any(may_match(p, zones) for p in expr.parts)
+    zone = zones.get(expr.column)
+    if zone is None:
+        return True
+    try:
+        return _ZONE_TESTS[expr.op](zone[0], zone[1], expr.value)
+    except TypeError:
+        return True
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import os
+import signal
+from contextlib import redirect_stdout, suppress
+
+from primitive_db.constants import DEFAULT_SYNC_MODE, SERVER_HOST, SERVER_PORT, SYNC_ENV_VAR
+from primitive_db.core import DbCore
+from primitive_db.decorators import (
+    describe_error,
+    set_auto_confirm,
+    set_raise_errors,
+    set_show_time,
+)
+from primitive_db.engine import DbEngine
+from primitive_db.main import dispatch, print_help
+from primitive_db.parser import parse_command
+from primitive_db.wal import SyncPolicy
+
+
+def frame(status: str, body: str) -> bytes:
+    """One response: `<status> <byte length>\\n` followed by the body (UTF-8)."""
+    data = body.encode("utf-8")
+    return f"{status} {len(data)}\n".encode("ascii") + data
+
+
+class DbServer:
+    """Serves the CLI command grammar over TCP from one long-lived engine.
+
+    A request is one command line; the response is whatever the command printed, framed
+    by `frame()` with status `ok`, or `error` with the message if the command was
+    rejected or failed. Requests on a connection are answered in order, so clients may
+    pipeline.
+    Tables, indexes and meta stay cached in the engine between requests. Commands run one
+    at a time; while a connection has a transaction open, other connections wait for it.
+    """
+
+    def __init__(self, engine: DbEngine) -> None:
+        self.engine = engine
+        self._core = DbCore(engine)
+        self._turn = asyncio.Condition()
+        self._tx_owner: object | None = None
+
+    def execute(self, line: str) -> tuple[str, str]:
+        """Run one command: ("ok", its output) or ("error", why it failed).
+
+        Errors are raised rather than printed (as in scripts), so a failed command is
+        never framed as `ok`; timing lines are left out of the output.
+        """
+        out = io.StringIO()
+        set_raise_errors(True)
+        set_show_time(False)
+        try:
+            with redirect_stdout(out):
+                cmd = parse_command(line)
+                if cmd.name.lower() == "help":
+                    print_help()
+                elif cmd.name:
+                    dispatch(self._core, cmd)
+        except ValueError as exc:
+            return "error", str(exc)
+        except (FileNotFoundError, KeyError) as exc:
+            return "error", describe_error(exc)
+        finally:
+            set_raise_errors(False)
+            set_show_time(True)
+        return "ok", out.getvalue()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        me = object()
+        try:
+            while line := await reader.readline():
+                text = line.decode("utf-8").strip()
+                if text.lower() in {"quit", "exit"}:
+                    break
+                async with self._turn:
+                    await self._turn.wait_for(lambda: self._tx_owner in (None, me))
+                    status, body = self.execute(text)
+                    self._tx_owner = me if self.engine.in_transaction else None
+                    self._turn.notify_all()
+                writer.write(frame(status, body))
+                await writer.drain()
+        except (ConnectionError, UnicodeDecodeError, ValueError):
+            pass  # Broken connection or an oversized line: drop the client.
+        finally:
+            async with self._turn:
+                if self._tx_owner is me:
+                    self.engine.rollback()  # A client that went away cannot commit.
+                    self._tx_owner = None
+                    self._turn.notify_all()
+            writer.close()
+
+    async def serve(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+        """Run until SIGTERM (or Ctrl+C); the caller closes the engine afterwards."""
+        server = await asyncio.start_server(self.handle, host, port)
+        with suppress(NotImplementedError):  # No signal handlers on Windows.
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+        async with server:
+            with suppress(asyncio.CancelledError):
+                await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Primitive DB server")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+    try:
+        engine = DbEngine(SyncPolicy(os.environ.get(SYNC_ENV_VAR, DEFAULT_SYNC_MODE)))
+    except ValueError as exc:
+        print(f"Ошибка: {exc}")
+        return
+    set_auto_confirm(True)  # Nobody to ask: the client has already decided.
+    print(f"Primitive DB: {args.host}:{args.port}")
+    try:
+        asyncio.run(DbServer(engine).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import base64
+import math
+import zlib
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from primitive_db.constants import HISTOGRAM_BUCKETS, HLL_PRECISION
+from primitive_db.predicate import And, Cmp, Expr, Or
+
+Row = dict[str, Any]
+
+# Share of rows a comparison is assumed to match when nothing better is known.
+_DEFAULT_RANGE = 1 / 3
+_MASK32 = 0xFFFFFFFF
+_MASK64 = (1 << 64) - 1
+
+
+def _hashes(values: list[Any]) -> Iterator[int]:
+    """32-bit hashes that are the same in every process (unlike `hash()` of a str).
+
+    A column holds one type, so the first value picks the function: ints (and bools) go
+    through a splitmix64-style mixer, everything else through CRC-32 of its text and a
+    multiplicative step. Both spread consecutive values evenly over the registers.
+    """
+    if not values:
+        return iter(())
+    if isinstance(values[0], int):
+        return (_mix64(v) for v in values)
+    text = values if isinstance(values[0], str) else map(repr, values)
+    return ((h * 0x9E3779B1) & _MASK32 for h in map(zlib.crc32, map(str.encode, text)))
+
+
+def _mix64(value: int) -> int:
+    z = ((value & _MASK64) * 0xBF58476D1CE4E5B9) & _MASK64
+    z ^= z >> 31
+    return ((z * 0x94D049BB133111EB) & _MASK64) >> 32
+
+
+class Sketch:
+    """HyperLogLog distinct-count sketch: 2**HLL_PRECISION one-byte registers.
+
+    Values can be added but not removed, so after deletes the count is an upper bound
+    until `analyze` rebuilds it. Typical error is about 1.04 / sqrt(registers).
+    """
+
+    def __init__(self, registers: bytearray | None = None) -> None:
+        self.registers = bytearray(1 << HLL_PRECISION) if registers is None else registers
+        self._count: int | None = None
+
+    def add_many(self, values: list[Any]) -> None:
+        """Add non-null values (all of the column's type)."""
+        regs = self.registers
+        shift = 32 - HLL_PRECISION
+        low = (1 << shift) - 1
+        for h in _hashes(values):
+            slot = h >> shift
+            rank = shift + 1 - (h & low).bit_length()
+            if rank > regs[slot]:
+                regs[slot] = rank
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            m = len(self.registers)
+            estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0**-r for r in self.registers)
+            zeros = self.registers.count(0)
+            if estimate <= 2.5 * m and zeros:
+                estimate = m * math.log(m / zeros)  # Linear counting for small sets.
+            self._count = round(estimate)
+        return self._count
+
+    def to_json(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode("ascii")
+
+    @classmethod
+    def from_json(cls, data: str) -> Sketch:
+        return cls(bytearray(base64.b64decode(data)))
+
+
+@dataclass
+class Histogram:
+    """Equi-depth histogram: bucket i holds `counts[i]` values in [bounds[i], bounds[i+1]].
+
+    Built with equal counts by `analyze`; later writes adjust the counts (and stretch the
+    outer bounds), so the depths drift until the next `analyze`.
+    """
+
+    bounds: list[Any]
+    counts: list[int]
+
+    @classmethod
+    def build(cls, ordered: list[Any], buckets: int = HISTOGRAM_BUCKETS) -> Histogram | None:
+        n = len(ordered)
+        if not n:
+            return None
+        k = min(buckets, n)
+        cuts = [i * n // k for i in range(k + 1)]
+        bounds = [ordered[c] for c in cuts[:-1]] + [ordered[-1]]
+        return cls(bounds, [hi - lo for lo, hi in zip(cuts, cuts[1:], strict=False)])
+
+    def _bucket(self, value: Any) -> int:
+        return min(max(bisect_right(self.bounds, value) - 1, 0), len(self.counts) - 1)
+
+    def add_many(self, ordered: list[Any]) -> None:
+        """Count sorted non-null values into their buckets, stretching the outer bounds."""
+        self.bounds[0] = min(self.bounds[0], ordered[0])
+        self.bounds[-1] = max(self.bounds[-1], ordered[-1])
+        cuts = [0, *(bisect_left(ordered, b) for b in self.bounds[1:-1]), len(ordered)]
+        for i, (lo, hi) in enumerate(zip(cuts, cuts[1:], strict=False)):
+            self.counts[i] += hi - lo
+
+    def remove(self, value: Any) -> None:
+        i = self._bucket(value)
+        self.counts[i] = max(self.counts[i] - 1, 0)
+
+    def below(self, value: Any) -> float:
+        """Estimated share of values < `value` (uniform spread inside a bucket)."""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        acc = 0.0
+        for lo, hi, n in zip(self.bounds, self.bounds[1:], self.counts, strict=False):
+            if value > hi:
+                acc += n
+            elif value > lo:
+                acc += n * _position(lo, hi, value)
+            else:
+                break
+        return acc / total
+
+
+def _position(lo: Any, hi: Any, value: Any) -> float:
+    """Where `value` falls between `lo` and `hi` (0..1); halfway for strings."""
+    if isinstance(value, int | float) and hi != lo:
+        return (value - lo) / (hi - lo)
+    return 0.5
+
+
+@dataclass
+class ColumnStats:
+    """Null count, min/max, distinct sketch and histogram of one column.
+
+    min/max stay exact while values are only added; removing the current min or max
+    leaves them as estimates (`exact_bounds` False) until `analyze`. The `id` column
+    keeps no sketch: its values are unique, so the row count is its distinct count.
+    """
+
+    nulls: int = 0
+    min: Any = None
+    max: Any = None
+    exact_bounds: bool = True
+    sketch: Sketch = field(default_factory=Sketch)
+    histogram: Histogram | None = None
+
+    def add_many(self, values: list[Any], unique: bool = False) -> None:
+        present = sorted(v for v in values if v is not None)
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        if self.min is None or present[0] < self.min:
+            self.min = present[0]
+        if self.max is None or present[-1] > self.max:
+            self.max = present[-1]
+        if not unique:
+            self.sketch.add_many(present)
+        if self.histogram is None:
+            self.histogram = Histogram.build(present)
+        else:
+            self.histogram.add_many(present)
+
+    def remove(self, value: Any) -> None:
+        if value is None:
+            self.nulls = max(self.nulls - 1, 0)
+            return
+        if value == self.min or value == self.max:
+            self.exact_bounds = False
+        if self.histogram is not None:
+            self.histogram.remove(value)
+
+    def selectivity(self, op: str, value: Any, distinct: int) -> float:
+        """Estimated share of non-null values for which `column <op> value` holds."""
+        if op == "in":
+            return min(sum(self.selectivity("=", v, distinct) for v in value), 1.0)
+        if self.min is None:
+            return 0.0
+        try:
+            outside = value < self.min or value > self.max
+        except TypeError:
+            return _DEFAULT_RANGE
+        equal = 0.0 if outside else 1 / max(distinct, 1)
+        if op == "=":
+            return equal
+        if op == "!=":
+            return 1 - equal
+        if self.histogram is not None:
+            below = self.histogram.below(value)
+        elif self.min != self.max and isinstance(value, int | float):
+            below = min(max(_position(self.min, self.max, value), 0.0), 1.0)
+        else:
+            below = _DEFAULT_RANGE
+        share = {"<": below, "<=": below + equal, ">": 1 - below - equal, ">=": 1 - below}[op]
+        return min(max(share, 0.0), 1.0)
+
+    def to_json(self) -> dict[str, Any]:
+        hist = self.histogram
+        return {
+            "nulls": self.nulls,
+            "min": self.min,
+            "max": self.max,
+            "exact_bounds": self.exact_bounds,
+            "hll": self.sketch.to_json(),
+            "histogram": None if hist is None else {"bounds": hist.bounds, "counts": hist.counts},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> ColumnStats:
+        hist = data.get("histogram")
+        return cls(
+            nulls=data["nulls"],
+            min=data["min"],
+            max=data["max"],
+            exact_bounds=data["exact_bounds"],
+            sketch=Sketch.from_json(data["hll"]),
+            histogram=None if hist is None else Histogram(hist["bounds"], hist["counts"]),
+        )
+
+
+@dataclass
+class TableStats:
+    """Row count and per-column statistics of a table, kept up to date by writes."""
+
+    rows: int = 0
+    columns: dict[str, ColumnStats] = field(default_factory=dict)
+
+    @classmethod
+    def empty(cls, schema: dict[str, str]) -> TableStats:
+        return cls(0, {c: ColumnStats() for c in schema})
+
+    @classmethod
+    def build(cls, schema: dict[str, str], rows: Iterable[Row]) -> TableStats:
+        """Statistics from scratch (`analyze`)."""
+        stats = cls.empty(schema)
+        stats.insert(list(rows))
+        return stats
+
+    def insert(self, rows: list[Row]) -> None:
+        self.rows += len(rows)
+        for name, col in self.columns.items():
+            col.add_many([r[name] for r in rows], unique=name == "id")
+
+    def distinct(self, column: str) -> int:
+        """Estimated number of distinct values in `column`."""
+        return self.rows if column == "id" else self.columns[column].sketch.count()
+
+    def remove(self, values: dict[str, list[Any]]) -> None:
+        """Forget deleted rows, given as column -> their values."""
+        for name, gone in values.items():
+            col = self.columns.get(name)
+            if col is not None:
+                for v in gone:
+                    col.remove(v)
+        self.rows = max(self.rows - len(next(iter(values.values()), [])), 0)
+        if not self.rows:
+            self.clear()
+
+    def replace(self, values: dict[str, list[Any]], updates: Row) -> None:
+        """Account for an update: `values` are the changed columns' old values."""
+        for name, old in values.items():
+            col = self.columns[name]
+            for v in old:
+                col.remove(v)
+            col.add_many([updates[name]] * len(old), unique=name == "id")
+
+    def clear(self) -> None:
+        self.rows = 0
+        self.columns = {c: ColumnStats() for c in self.columns}
+
+    def selectivity(self, expr: Expr) -> float:
+        """Estimated share of rows matching `expr` (columns treated as independent)."""
+        if isinstance(expr, Cmp):
+            col = self.columns.get(expr.column)
+            if col is None or not self.rows:
+                return 1.0
+            present = (self.rows - col.nulls) / self.rows
+            return present * col.selectivity(expr.op, expr.value, self.distinct(expr.column))
+        shares = [self.selectivity(p) for p in expr.parts]
+        if isinstance(expr, And):
+            return math.prod(shares)
+        assert isinstance(expr, Or)
+        return 1 - math.prod(1 - s for s in shares)
+
+    def to_json(self, stamp: tuple[int, ...]) -> dict[str, Any]:
+        return {
+            "stamp": list(stamp),
+            "rows": self.rows,
+            "columns": {name: col.to_json() for name, col in self.columns.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> TableStats:
+        columns = {name: ColumnStats.from_json(c) for name, c in data["columns"].items()}
+        return cls(data["rows"], columns)
@@ -0,0 +1,1184 @@
+from __future__ import annotations
+
+import contextlib
+import mmap
+import os
+import shutil
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from itertools import chain, compress, groupby, pairwise
+from operator import itemgetter
+from typing import Any
+
+from primitive_db import profile
+from primitive_db.cache import TableCache
+from primitive_db.columnar import Column, decode_table, encode_table, new_column
+from primitive_db.compact import CompactTable
+from primitive_db.constants import (
+    COLUMNAR_SUFFIX,
+    LOG_COMPACT_MIN_BYTES,
+    SEGMENT_MANIFEST,
+    SEGMENT_ROWS,
+)
+from primitive_db.locks import FileLocks
+from primitive_db.parallel import ParallelScanner
+from primitive_db.predicate import Expr, column_mask
+from primitive_db.rowfile import SORTED_RUN_OFFSET, RowLayout, pack_sorted_run, parse_header
+from primitive_db.segments import Segment, may_match
+from primitive_db.utils import (
+    columnar_path,
+    file_stamp,
+    lock_path,
+    read_json,
+    replace_bytes,
+    rows_path,
+    segment_manifest_path,
+    segments_dir,
+    table_log_path,
+    table_path,
+    write_json,
+)
+from primitive_db.wal import SyncPolicy, WriteAheadLog
+
+Row = dict[str, Any]
+
+
+class TableStorage:
+    """On-disk table format. Default mutations are read-modify-write of the whole table."""
+
+    name = ""
+
+    def __init__(self) -> None:
+        self._positions: dict[str, tuple[list[Row], dict[int, int]]] = {}
+
+    def read(self, table: str) -> list[Row]:
+        raise NotImplementedError
+
+    def positions(self, table: str) -> dict[int, int]:
+        """Primary-key map id -> position in `read(table)`, extended as rows are appended."""
+        rows = self.read(table)
+        cached = self._positions.get(table)
+        if cached is None or cached[0] is not rows or len(cached[1]) > len(rows):
+            cached = (rows, {})
+            self._positions[table] = cached
+        pos = cached[1]
+        for i in range(len(pos), len(rows)):
+            pos[rows[i]["id"]] = i
+        return pos
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        """Rows in table order, produced lazily where the format allows it."""
+        return iter(self.read(table))
+
+    def row_estimate(self, table: str) -> int:
+        """Number of rows, for planning; may count not yet compacted deletions."""
+        return len(self.positions(table))
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        """Rows with the given ids, in table order, without scanning the table."""
+        pos = self.positions(table)
+        rows = self.read(table)
+        return map(rows.__getitem__, sorted(pos[i] for i in ids if i in pos))
+
+    def iter_scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> Iterator[Row]:
+        """Full scan: rows whose `column` value satisfies `pred`."""
+        rows = self.read(table)
+        return compress(rows, map(pred, map(itemgetter(column), rows)))
+
+    def iter_parallel(
+        self, table: str, where: Expr, scanner: ParallelScanner
+    ) -> Iterator[Row] | None:
+        """Rows matching `where`, tested by `scanner`'s worker processes.
+
+        None when the format cannot be split that way, when the rows to test are too
+        few, or when they are already decoded in this process (a worker would only read
+        them again). The storage counts the rows it examines (`profile`).
+        """
+        return None
+
+    def iter_filtered(self, table: str, where: Expr) -> Iterator[Row] | None:
+        """Rows matching `where`, if the format can skip parts of the table or test whole columns.
+
+        None means a plain scan; the storage counts the rows it examines (`profile`).
+        """
+        return None
+
+    def fetch(self, table: str, ids: Iterable[int]) -> list[Row]:
+        return list(self.iter_fetch(table, ids))
+
+    def scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> list[Row]:
+        return list(self.iter_scan(table, column, pred))
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        """Flat tuple of ints that changes whenever the table's files change."""
+        raise NotImplementedError
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        raise NotImplementedError
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        self.write(table, [*self.read(table), *new_rows])
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        """Copy-on-write: the rows `read` returned are left as they were."""
+        pos = self.positions(table)
+        rows = list(self.read(table))
+        for rid in ids:
+            if (i := pos.get(rid)) is not None:
+                rows[i] = rows[i] | updates
+        self.write(table, rows)
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        """Delete rows by id; `None` deletes every row."""
+        if ids is None:
+            self.write(table, [])
+            return
+        wanted = set(ids)
+        self.write(table, [r for r in self.read(table) if r["id"] not in wanted])
+
+    def compact(self, table: str) -> None:
+        """Fold any pending changes into the main file (no-op for most formats)."""
+
+    def checkpoint(self, table: str) -> bool:
+        """Fold a pending write-ahead log into the table files; True if anything was written."""
+        return False
+
+    def close(self) -> None:
+        """Release open files and flush anything buffered."""
+
+    def drop(self, table: str) -> None:
+        self._positions.pop(table, None)
+        path = table_path(table)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class JsonTableStorage(TableStorage):
+    """Whole table as one JSON list of row dicts, read through a shared `TableCache`.
+
+    In memory a table is a `CompactTable` (one column per field): row dicts are built
+    only for the rows handed out, and scans test the columns. Written tables go
+    straight into the cache, so a read after a write does not parse the file again.
+    Every change replaces the whole file, fsync'ed unless the `SyncPolicy` is `off`.
+    """
+
+    name = "json"
+
+    def __init__(
+        self,
+        cache: TableCache,
+        schema_of: Callable[[str], dict[str, str]],
+        policy: SyncPolicy | None = None,
+    ) -> None:
+        super().__init__()
+        self._cache = cache
+        self._schema_of = schema_of
+        self._policy = policy or SyncPolicy()
+
+    def _table(self, table: str) -> CompactTable:
+        return self._cache.read(table_path(table), self._schema_of(table))
+
+    def _save(self, table: str, data: CompactTable, rows: list[Row] | None = None) -> None:
+        """Write `data` (whose rows are `rows`, if the caller has them as dicts already)."""
+        path = table_path(table)
+        try:
+            rows = list(data.rows()) if rows is None else rows
+            write_json(path, rows, indent=None, sync=self._policy.syncs_files)
+        except BaseException:
+            self._cache.invalidate(path)
+            raise
+        self._cache.put(path, data)
+
+    def read(self, table: str) -> list[Row]:
+        return list(self._table(table).rows())
+
+    def positions(self, table: str) -> dict[int, int]:
+        return self._table(table).positions()
+
+    def row_estimate(self, table: str) -> int:
+        return len(self._table(table))
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        return self._table(table).rows()
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        data = self._table(table)
+        return data.take(data.find(ids))
+
+    def iter_scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> Iterator[Row]:
+        data = self._table(table)
+        return data.take(compress(range(len(data)), map(pred, data.columns[column])))
+
+    def iter_filtered(self, table: str, where: Expr) -> Iterator[Row] | None:
+        data = self._table(table)
+        profile.count("examined", len(data))
+        return data.take(data.matches(where))
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return file_stamp(table_path(table))
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        self._save(table, CompactTable.from_rows(self._schema_of(table), rows), rows)
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        self._save(table, self._table(table).appended(new_rows))
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        data = self._table(table)
+        self._save(table, data.updated(data.find(ids), updates))
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        if ids is None:
+            self.write(table, [])
+            return
+        data = self._table(table)
+        self._save(table, data.without(data.find(ids)))
+
+    def drop(self, table: str) -> None:
+        self._cache.invalidate(table_path(table))
+        super().drop(table)
+
+
+class MemoryTableStorage(TableStorage):
+    """Tables held only in memory: the private copies staged by an open transaction."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._tables: dict[str, list[Row]] = {}
+        self._versions: dict[str, int] = {}
+
+    def __contains__(self, table: str) -> bool:
+        return table in self._tables
+
+    def tables(self) -> list[str]:
+        return list(self._tables)
+
+    def read(self, table: str) -> list[Row]:
+        return self._tables[table]
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return (self._versions.get(table, 0),)
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        self._tables[table] = rows
+        self._versions[table] = self._versions.get(table, 0) + 1
+
+    # The staged copies are private to the transaction, so they change in place.
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        self._tables[table].extend(new_rows)
+        self._versions[table] += 1
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        for r in self.fetch(table, ids):
+            r.update(updates)
+        self._versions[table] += 1
+
+    def drop(self, table: str) -> None:
+        self._positions.pop(table, None)
+        self._tables.pop(table, None)
+
+
+@dataclass
+class _LogState:
+    snapshot_stamp: tuple[int, ...]
+    offset: int
+    rows: dict[int, Row] = field(default_factory=dict)
+    # Rank of each id in table (insertion) order, which is not id order once several
+    # writers take ids from their own blocks. Deleted ids keep theirs: ids are not reused.
+    order: dict[int, int] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, snapshot_stamp: tuple[int, ...], rows: list[Row]) -> _LogState:
+        by_id = {r["id"]: r for r in rows}
+        return cls(snapshot_stamp, 0, by_id, {rid: i for i, rid in enumerate(by_id)})
+
+
+def _apply_record(state: _LogState, record: dict[str, Any]) -> None:
+    rows, order = state.rows, state.order
+    op = record.get("op")
+    if op == "insert":
+        for row in record["rows"]:
+            rows[row["id"]] = row
+            order.setdefault(row["id"], len(order))
+    elif op == "update":
+        for rid in record["ids"]:
+            row = rows.get(rid)
+            if row is not None:
+                row.update(record["set"])
+    elif op == "delete":
+        for rid in record["ids"]:
+            rows.pop(rid, None)
+    elif op == "truncate":
+        rows.clear()
+        order.clear()
+    else:
+        raise ValueError(f"Журнал таблицы повреждён: неизвестная операция {op!r}")
+
+
+class LogTableStorage(TableStorage):
+    """Snapshot JSON list plus a write-ahead log of insert/update/delete records.
+
+    Mutations only append to the table's `WriteAheadLog` (fsync'ed per its `SyncPolicy`);
+    a checkpoint folds the log into a new snapshot. Records are idempotent (inserts are
+    keyed by id, ids are never reused), so replaying a log over a snapshot that already
+    contains it yields the same state. This keeps checkpoints safe: the snapshot is
+    swapped in atomically before the log is emptied.
+    """
+
+    name = "log"
+
+    def __init__(
+        self, compact_min_bytes: int = LOG_COMPACT_MIN_BYTES, policy: SyncPolicy | None = None
+    ) -> None:
+        super().__init__()
+        self._compact_min_bytes = compact_min_bytes
+        self._policy = policy or SyncPolicy()
+        self._states: dict[str, _LogState] = {}
+        self._logs: dict[str, WriteAheadLog] = {}
+
+    def _log(self, table: str) -> WriteAheadLog:
+        log = self._logs.get(table)
+        if log is None:
+            log = self._logs[table] = WriteAheadLog(table_log_path(table), self._policy)
+        return log
+
+    def _load_state(self, table: str) -> _LogState:
+        """Snapshot plus log tail, read without locks.
+
+        A checkpoint by another process swaps the snapshot and empties the log; if that
+        happens while we read, the tail belongs to the new snapshot, so we start over.
+        """
+        snap = table_path(table)
+        log = self._log(table)
+        while True:
+            stamp = file_stamp(snap)
+            state = self._states.get(table)
+            log_size = log.size()
+            if state is None or state.snapshot_stamp != stamp or log_size < state.offset:
+                profile.count("cache_miss")
+                with profile.phase("load"):
+                    data = read_json(snap) if os.path.exists(snap) else []
+                if not isinstance(data, list):
+                    raise ValueError("Файл таблицы повреждён (ожидался список записей).")
+                state = _LogState.of(stamp, data)
+            else:
+                profile.count("cache_hit")
+            if log_size <= state.offset:
+                break
+            try:
+                with profile.phase("load"):
+                    records, offset = log.read_from(state.offset)
+            except ValueError:
+                if file_stamp(snap) == stamp:
+                    raise
+                continue
+            if file_stamp(snap) != stamp:
+                continue
+            for record in records:
+                _apply_record(state, record)
+            state.offset = offset
+            break
+        self._states[table] = state
+        return state
+
+    def _append(self, table: str, record: dict[str, Any]) -> None:
+        start, log_size = self._log(table).append(record)
+
+        state = self._states.get(table)
+        if state is not None and state.offset == start:
+            # Our cached state was current: apply the record directly instead of re-reading.
+            _apply_record(state, record)
+            state.offset = log_size
+
+        if log_size > max(self._compact_min_bytes, file_stamp(table_path(table))[1]):
+            self.compact(table)
+
+    def read(self, table: str) -> list[Row]:
+        return list(self._load_state(table).rows.values())
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        return iter(self._load_state(table).rows.values())
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        state = self._load_state(table)
+        rows, rank = state.rows, state.order.__getitem__
+        return map(rows.__getitem__, sorted((i for i in ids if i in rows), key=rank))
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return file_stamp(table_path(table)) + file_stamp(table_log_path(table))
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        write_json(table_path(table), rows, indent=None, sync=self._policy.syncs_files)
+        self._log(table).reset()
+        self._states[table] = _LogState.of(file_stamp(table_path(table)), rows)
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        self._append(table, {"op": "insert", "rows": new_rows})
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        if ids:
+            self._append(table, {"op": "update", "ids": ids, "set": updates})
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        if ids is None:
+            self._append(table, {"op": "truncate"})
+        elif ids:
+            self._append(table, {"op": "delete", "ids": ids})
+
+    def compact(self, table: str) -> None:
+        self.write(table, self.read(table))
+
+    def checkpoint(self, table: str) -> bool:
+        if not self._log(table).size():
+            return False
+        self.compact(table)
+        return True
+
+    def close(self) -> None:
+        for log in self._logs.values():
+            log.close()
+        self._logs.clear()
+
+    def drop(self, table: str) -> None:
+        super().drop(table)
+        log = self._logs.pop(table, None)
+        if log is not None:
+            log.close()
+        path = table_log_path(table)
+        if os.path.exists(path):
+            os.remove(path)
+        self._states.pop(table, None)
+
+
+@dataclass
+class _ColumnarState:
+    stamp: tuple[int, int]
+    columns: dict[str, Column]
+    positions: dict[int, int] | None = None
+
+
+class ColumnarTableStorage(TableStorage):
+    """Binary file with one typed array per column (see `primitive_db.columnar`).
+
+    Columns stay in memory as arrays; row dicts are built only when asked for (never
+    cached), and scans test the column vectors before materialising matching rows.
+    Every change replaces the whole file, fsync'ed unless the `SyncPolicy` is `off`.
+    """
+
+    name = "columnar"
+
+    def __init__(
+        self, schema_of: Callable[[str], dict[str, str]], policy: SyncPolicy | None = None
+    ) -> None:
+        super().__init__()
+        self._schema_of = schema_of
+        self._policy = policy or SyncPolicy()
+        self._states: dict[str, _ColumnarState] = {}
+
+    def _load(self, table: str) -> _ColumnarState:
+        path = columnar_path(table)
+        stamp = file_stamp(path)
+        state = self._states.get(table)
+        if state is None or state.stamp != stamp:
+            if not any(stamp):
+                raise FileNotFoundError(path)
+            profile.count("cache_miss")
+            with profile.phase("load"), open(path, "rb") as f:
+                _, columns = decode_table(f.read())
+            state = _ColumnarState(stamp=stamp, columns=columns)
+            self._states[table] = state
+        else:
+            profile.count("cache_hit")
+        return state
+
+    def _save(self, table: str, columns: dict[str, Column]) -> None:
+        path = columnar_path(table)
+        replace_bytes(path, encode_table(self._schema_of(table), columns), self._policy.syncs_files)
+        self._states[table] = _ColumnarState(stamp=file_stamp(path), columns=columns)
+
+    @staticmethod
+    def _row_at(columns: dict[str, Column], pos: int) -> Row:
+        return {name: col[pos] for name, col in columns.items()}
+
+    def read(self, table: str) -> list[Row]:
+        columns = self._load(table).columns
+        names = list(columns)
+        return [dict(zip(names, vals, strict=True)) for vals in zip(*columns.values(), strict=True)]
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return file_stamp(columnar_path(table))
+
+    def row_estimate(self, table: str) -> int:
+        return len(self._load(table).columns["id"])
+
+    def positions(self, table: str) -> dict[int, int]:
+        state = self._load(table)
+        if state.positions is None:
+            state.positions = {rid: i for i, rid in enumerate(state.columns["id"])}
+        return state.positions
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        columns = self._load(table).columns
+        return (self._row_at(columns, p) for p in range(len(columns["id"])))
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        pos = self.positions(table)
+        columns = self._load(table).columns
+        return (self._row_at(columns, p) for p in sorted(pos[i] for i in ids if i in pos))
+
+    def iter_scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> Iterator[Row]:
+        columns = self._load(table).columns
+        col = columns[column]
+        return (self._row_at(columns, p) for p in compress(range(len(col)), map(pred, col)))
+
+    def iter_filtered(self, table: str, where: Expr) -> Iterator[Row] | None:
+        columns = self._load(table).columns
+        count = len(columns["id"])
+        profile.count("examined", count)
+        found = compress(range(count), column_mask(where, columns))
+        return (self._row_at(columns, p) for p in found)
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        schema = self._schema_of(table)
+        self._save(table, {c: new_column(t, [r[c] for r in rows]) for c, t in schema.items()})
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        schema = self._schema_of(table)
+        old = self._load(table).columns
+        columns = {c: new_column(t, old[c]) for c, t in schema.items()}
+        for c, t in schema.items():
+            columns[c].extend(new_column(t, [r[c] for r in new_rows]))
+        self._save(table, columns)
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        """Copy-on-write: the cached columns stay as they are until `_save` has written."""
+        pos = self.positions(table)
+        columns = dict(self._load(table).columns)
+        try:
+            for c, value in updates.items():
+                col = columns[c] = columns[c][:]
+                for rid in ids:
+                    col[pos[rid]] = value
+        except OverflowError as exc:
+            raise ValueError("Значение int не помещается в 64 бита.") from exc
+        self._save(table, columns)
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        schema = self._schema_of(table)
+        if ids is None:
+            self._save(table, {c: new_column(t) for c, t in schema.items()})
+            return
+        drop = {self.positions(table)[rid] for rid in ids}
+        columns = self._load(table).columns
+        self._save(
+            table,
+            {
+                c: new_column(t, [v for i, v in enumerate(columns[c]) if i not in drop])
+                for c, t in schema.items()
+            },
+        )
+
+    def drop(self, table: str) -> None:
+        self._states.pop(table, None)
+        path = columnar_path(table)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class _MappedFile:
+    """Read-only mapping of a fixed-width row file plus its parsed header.
+
+    The first `sorted` records are in id order and are binary-searched; the records
+    after them (the tail) are found through an id -> slot map, built on first use.
+    A mapping of the same file that has only grown (same inode, same sorted run) takes
+    over `previous`'s map and indexes just the new records.
+    """
+
+    def __init__(self, path: str, previous: _MappedFile | None = None) -> None:
+        self.stamp = file_stamp(path)
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.layout, self.data_offset, sorted_run = parse_header(self.mm)
+        self.count = (len(self.mm) - self.data_offset) // self.layout.size
+        # A crash may leave the count ahead of the records it describes.
+        self.sorted = min(sorted_run, self.count)
+        self._tail: dict[int, int] = {}
+        self._tail_end = self.sorted
+        if (
+            previous is not None
+            and previous.stamp[2] == self.stamp[2]
+            and previous.sorted == self.sorted
+            and previous.count <= self.count
+        ):
+            self._tail, self._tail_end = previous._tail, previous._tail_end
+
+    def offset(self, pos: int) -> int:
+        return self.data_offset + pos * self.layout.size
+
+    def id_at(self, pos: int) -> int:
+        off = self.offset(pos) + self.layout.field_offsets["id"]
+        return self.layout.id_struct.unpack_from(self.mm, off)[0]
+
+    def find(self, rid: int) -> int | None:
+        """Slot of the live record with id `rid`: the sorted run first, then the tail."""
+        lo, hi = 0, self.sorted
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.id_at(mid) < rid:
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo if lo < self.sorted and self.id_at(lo) == rid else self._tail_slot(rid)
+        if pos is not None and self.mm[self.offset(pos)]:
+            return pos
+        return None
+
+    def _tail_slot(self, rid: int) -> int | None:
+        for pos in range(self._tail_end, self.count):
+            self._tail[self.id_at(pos)] = pos
+        self._tail_end = self.count
+        return self._tail.get(rid)
+
+    def record(self, pos: int) -> tuple[Any, ...]:
+        return self.layout.struct.unpack_from(self.mm, self.offset(pos))
+
+    def records(self) -> Iterator[tuple[Any, ...]]:
+        """Live records in file order, decoded one at a time from the mapping."""
+        if not self.count:
+            return
+        end = self.offset(self.count)
+        with memoryview(self.mm) as mv, mv[self.data_offset : end] as region:
+            for values in self.layout.struct.iter_unpack(region):
+                if values[0]:
+                    yield values
+
+    def close(self) -> None:
+        # A scan may still hold a view of the mapping; it is unmapped once released.
+        with contextlib.suppress(BufferError):
+            self.mm.close()
+
+
+class MmapTableStorage(TableStorage):
+    """Fixed-width binary rows (see `primitive_db.rowfile`) read through `mmap`.
+
+    Nothing is loaded up front: lookups by id binary-search the mapping, scans decode
+    records one by one and build dicts only for matches. Inserts are appended: rows
+    with higher ids than the last record extend the sorted run that lookups
+    binary-search, others (several writers share out id blocks) go to the tail,
+    found through a map of its ids. Updates overwrite records in place, deletes clear
+    the live flag, and `compact` drops dead records and sorts the tail into the run.
+    Only a string longer than its column slot triggers a rewrite with a wider layout.
+    Because records change in place, reads hold the table's shared lock, so they wait
+    for a writer in another process instead of seeing a torn record.
+
+    In-place changes are fsync'ed unless the `SyncPolicy` is `off`; there is no log to
+    group them in, so `group` syncs each one like `always`. Appends start right after
+    the last whole record, so one cut short by a crash is overwritten by the next.
+    """
+
+    name = "mmap"
+
+    def __init__(
+        self,
+        schema_of: Callable[[str], dict[str, str]],
+        locks: FileLocks | None = None,
+        policy: SyncPolicy | None = None,
+    ) -> None:
+        super().__init__()
+        self._schema_of = schema_of
+        self._locks = locks or FileLocks()
+        self._policy = policy or SyncPolicy()
+        self._files: dict[str, _MappedFile] = {}
+
+    def _open(self, table: str) -> _MappedFile:
+        path = rows_path(table)
+        mapped = self._files.get(table)
+        if mapped is not None and mapped.stamp == file_stamp(path):
+            profile.count("cache_hit")
+            return mapped
+        if mapped is not None:
+            mapped.close()
+            del self._files[table]
+        profile.count("cache_miss")
+        with profile.phase("load"):
+            mapped = _MappedFile(path, mapped)
+        self._files[table] = mapped
+        return mapped
+
+    def _sync(self, fd: int) -> None:
+        if self._policy.syncs_files:
+            os.fsync(fd)
+
+    def _touched(self, table: str) -> None:
+        """Record that our own in-place write changed the file (same size, same mapping)."""
+        mapped = self._files.get(table)
+        if mapped is not None:
+            mapped.stamp = file_stamp(rows_path(table))
+
+    def _reading(self, table: str, scan: Callable[[_MappedFile], Iterable[Row]]) -> Iterator[Row]:
+        """Run `scan` over the current mapping while holding the table's shared lock."""
+        with self._locks.shared(lock_path(table)):
+            yield from scan(self._open(table))
+
+    def read(self, table: str) -> list[Row]:
+        return list(self.iter_rows(table))
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return file_stamp(rows_path(table))
+
+    def row_estimate(self, table: str) -> int:
+        return self._open(table).count
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        return self._reading(table, lambda mapped: map(mapped.layout.decode, mapped.records()))
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        wanted = list(ids)
+
+        def fetch(mapped: _MappedFile) -> Iterator[Row]:
+            found = sorted(p for p in map(mapped.find, wanted) if p is not None)
+            return (mapped.layout.decode(mapped.record(p)) for p in found)
+
+        return self._reading(table, fetch)
+
+    def iter_scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> Iterator[Row]:
+        typ = self._schema_of(table)[column]
+
+        def scan(mapped: _MappedFile) -> Iterator[Row]:
+            layout = mapped.layout
+            idx = layout.value_index(column)
+            return (
+                layout.decode(v) for v in mapped.records() if pred(layout.column_value(v, idx, typ))
+            )
+
+        return self._reading(table, scan)
+
+    def iter_parallel(
+        self, table: str, where: Expr, scanner: ParallelScanner
+    ) -> Iterator[Row] | None:
+        if not scanner.enabled(self.row_estimate(table)):
+            return None
+
+        def scan(mapped: _MappedFile) -> Iterator[Row]:
+            profile.count("examined", mapped.count)
+            decode, record = mapped.layout.decode, mapped.record
+            found = scanner.scan(self.name, rows_path(table), mapped.stamp, mapped.count, where)
+            return (decode(record(p)) for p in chain.from_iterable(found))
+
+        return self._reading(table, scan)
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        rows = sorted(rows, key=lambda r: r["id"])
+        layout = RowLayout.for_rows(self._schema_of(table), rows)
+        path = rows_path(table)
+        mapped = self._files.pop(table, None)
+        if mapped is not None:
+            mapped.close()
+        data = layout.header(len(rows)) + b"".join(layout.pack(r) for r in rows)
+        replace_bytes(path, data, self._policy.syncs_files)
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        mapped = self._open(table)
+        if not mapped.layout.fits(new_rows):
+            self.write(table, self.read(table) + new_rows)
+            return
+        new_rows = sorted(new_rows, key=lambda r: r["id"])
+        count = mapped.count
+        in_order = mapped.sorted == count and (
+            not count or mapped.id_at(count - 1) < new_rows[0]["id"]
+        )
+        sorted_run = count + len(new_rows) if in_order else mapped.sorted
+        with open(rows_path(table), "r+b") as f:
+            f.seek(mapped.offset(count))  # Past it: at most a torn record, overwritten.
+            f.write(b"".join(mapped.layout.pack(r) for r in new_rows))
+            f.truncate()
+            f.flush()
+            # Written every time: after a crash the stored run may outlast the records.
+            os.pwrite(f.fileno(), pack_sorted_run(sorted_run), SORTED_RUN_OFFSET)
+            self._sync(f.fileno())
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        mapped = self._open(table)
+        layout = mapped.layout
+        if not layout.fits([updates]):
+            rows = self.read(table)
+            wanted = set(ids)
+            for r in rows:
+                if r["id"] in wanted:
+                    r.update(updates)
+            self.write(table, rows)
+            return
+        with open(rows_path(table), "r+b") as f:
+            for rid in ids:
+                pos = mapped.find(rid)
+                if pos is not None:
+                    row = layout.decode(mapped.record(pos)) | updates
+                    os.pwrite(f.fileno(), layout.pack(row), mapped.offset(pos))
+            self._sync(f.fileno())
+        self._touched(table)
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        if ids is None:
+            self.write(table, [])
+            return
+        mapped = self._open(table)
+        with open(rows_path(table), "r+b") as f:
+            for rid in ids:
+                pos = mapped.find(rid)
+                if pos is not None:
+                    os.pwrite(f.fileno(), b"\x00", mapped.offset(pos))
+            self._sync(f.fileno())
+        self._touched(table)
+
+    def compact(self, table: str) -> None:
+        self.write(table, self.read(table))
+
+    def close(self) -> None:
+        for mapped in self._files.values():
+            mapped.close()
+        self._files.clear()
+
+    def drop(self, table: str) -> None:
+        mapped = self._files.pop(table, None)
+        if mapped is not None:
+            mapped.close()
+        path = rows_path(table)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@dataclass
+class _SegmentedState:
+    stamp: tuple[int, int, int]
+    next_file: int
+    segments: list[Segment]
+
+
+class SegmentedTableStorage(TableStorage):
+    """Directory of segment files of up to SEGMENT_ROWS rows each, plus a manifest.
+
+    Segments use the columnar encoding and hold consecutive id ranges; the manifest
+    lists them with their ids and zone maps (per-column min/max). A write re-encodes
+    only the segments it touches and then atomically replaces the manifest, so one
+    changed row costs one segment rather than the table, and a scan skips every
+    segment whose zone map rules out the WHERE expression. Segment files never change:
+    a rewritten segment gets a new file, and the old one is removed once the new
+    manifest is in place. Since removal follows a write, reads hold the table's shared
+    lock (as with `mmap`) so another process cannot delete a segment being read.
+    Segment files and the manifest are fsync'ed unless the `SyncPolicy` is `off`.
+    """
+
+    name = "segmented"
+
+    def __init__(
+        self,
+        schema_of: Callable[[str], dict[str, str]],
+        locks: FileLocks | None = None,
+        policy: SyncPolicy | None = None,
+    ) -> None:
+        super().__init__()
+        self._schema_of = schema_of
+        self._locks = locks or FileLocks()
+        self._policy = policy or SyncPolicy()
+        self._states: dict[str, _SegmentedState] = {}
+        # Decoded segments by (table, file name); a file never changes once written.
+        self._columns: dict[tuple[str, str], dict[str, Column]] = {}
+
+    def _load(self, table: str) -> _SegmentedState:
+        path = segment_manifest_path(table)
+        stamp = file_stamp(path)
+        state = self._states.get(table)
+        if state is None or state.stamp != stamp:
+            if not any(stamp):
+                raise FileNotFoundError(path)
+            with profile.phase("load"):
+                data = read_json(path)
+            segments = [Segment.from_json(s) for s in data["segments"]]
+            state = _SegmentedState(stamp, data["next_file"], segments)
+            self._states[table] = state
+            live = {s.file for s in segments}
+            for key in [k for k in self._columns if k[0] == table and k[1] not in live]:
+                del self._columns[key]
+        return state
+
+    def _segment(self, table: str, seg: Segment) -> dict[str, Column]:
+        columns = self._columns.get((table, seg.file))
+        if columns is not None:
+            profile.count("cache_hit")
+            return columns
+        profile.count("cache_miss")
+        with profile.phase("load"), open(os.path.join(segments_dir(table), seg.file), "rb") as f:
+            _, columns = decode_table(f.read())
+        self._columns[(table, seg.file)] = columns
+        return columns
+
+    def _reading(
+        self, table: str, scan: Callable[[_SegmentedState], Iterable[Row]]
+    ) -> Iterator[Row]:
+        with self._locks.shared(lock_path(table)):
+            yield from scan(self._load(table))
+
+    @staticmethod
+    def _row_at(columns: dict[str, Column], pos: int) -> Row:
+        return {name: col[pos] for name, col in columns.items()}
+
+    @staticmethod
+    def _rows(columns: dict[str, Column]) -> Iterator[Row]:
+        names = list(columns)
+        return (dict(zip(names, vals, strict=True)) for vals in zip(*columns.values(), strict=True))
+
+    def _kept(self, table: str, state: _SegmentedState, where: Expr) -> list[Segment]:
+        """Segments the zone maps cannot rule out (noted in the profile)."""
+        kept = [s for s in state.segments if may_match(where, s.zones)]
+        profile.note(f"{table}: сегментов {len(kept)} из {len(state.segments)}")
+        profile.count("examined", sum(s.rows for s in kept))
+        return kept
+
+    def read(self, table: str) -> list[Row]:
+        return list(self.iter_rows(table))
+
+    def stamp(self, table: str) -> tuple[int, ...]:
+        return file_stamp(segment_manifest_path(table))
+
+    def row_estimate(self, table: str) -> int:
+        return sum(s.rows for s in self._load(table).segments)
+
+    def iter_rows(self, table: str) -> Iterator[Row]:
+        def scan(state: _SegmentedState) -> Iterator[Row]:
+            for seg in state.segments:
+                yield from self._rows(self._segment(table, seg))
+
+        return self._reading(table, scan)
+
+    def iter_fetch(self, table: str, ids: Iterable[int]) -> Iterator[Row]:
+        wanted = sorted(ids)
+
+        def fetch(state: _SegmentedState) -> Iterator[Row]:
+            firsts = [s.first_id for s in state.segments]
+            for i, rids in groupby(wanted, key=lambda rid: bisect_right(firsts, rid) - 1):
+                if i < 0:
+                    continue
+                columns = self._segment(table, state.segments[i])
+                id_col = columns["id"]
+                for rid in rids:
+                    pos = bisect_left(id_col, rid)
+                    if pos < len(id_col) and id_col[pos] == rid:
+                        yield self._row_at(columns, pos)
+
+        return self._reading(table, fetch)
+
+    def iter_scan(self, table: str, column: str, pred: Callable[[Any], bool]) -> Iterator[Row]:
+        def scan(state: _SegmentedState) -> Iterator[Row]:
+            for seg in state.segments:
+                columns = self._segment(table, seg)
+                for pos in compress(range(seg.rows), map(pred, columns[column])):
+                    yield self._row_at(columns, pos)
+
+        return self._reading(table, scan)
+
+    def iter_filtered(self, table: str, where: Expr) -> Iterator[Row] | None:
+        def scan(state: _SegmentedState) -> Iterator[Row]:
+            for seg in self._kept(table, state, where):
+                columns = self._segment(table, seg)
+                for pos in compress(range(seg.rows), column_mask(where, columns)):
+                    yield self._row_at(columns, pos)
+
+        return self._reading(table, scan)
+
+    def iter_parallel(
+        self, table: str, where: Expr, scanner: ParallelScanner
+    ) -> Iterator[Row] | None:
+        segments = self._load(table).segments
+        cold = [
+            s
+            for s in segments
+            if (table, s.file) not in self._columns and may_match(where, s.zones)
+        ]
+        if not scanner.enabled(sum(s.rows for s in cold)):
+            return None  # Decoded segments are tested here faster than a worker reads them.
+
+        def scan(state: _SegmentedState) -> Iterator[Row]:
+            kept = self._kept(table, state, where)
+            paths = [os.path.join(segments_dir(table), s.file) for s in kept]
+            parts = [(p, file_stamp(p), 0, s.rows) for p, s in zip(paths, kept, strict=True)]
+            found = scanner.scan_files(self.name, parts, where)
+            for seg, positions in zip(kept, found, strict=True):
+                if positions:  # Segments without matches are never decoded here.
+                    columns = self._segment(table, seg)
+                    yield from (self._row_at(columns, p) for p in positions)
+
+        return self._reading(table, scan)
+
+    def _current(self, table: str) -> _SegmentedState:
+        """The table's state, or an empty one while it has no manifest yet (create)."""
+        if any(file_stamp(segment_manifest_path(table))):
+            return self._load(table)
+        return _SegmentedState((0, 0, 0), 1, [])
+
+    def _chunks(self, columns: dict[str, Column]) -> list[dict[str, Column]]:
+        n = len(columns["id"])
+        return [
+            {c: col[lo : lo + SEGMENT_ROWS] for c, col in columns.items()}
+            for lo in range(0, n, SEGMENT_ROWS)
+        ]
+
+    def _written(
+        self, table: str, state: _SegmentedState, parts: list[dict[str, Column]]
+    ) -> list[Segment]:
+        """Write each non-empty part as a new segment file."""
+        schema = self._schema_of(table)
+        made = []
+        for columns in parts:
+            if not len(columns["id"]):
+                continue
+            name = f"{state.next_file:08d}{COLUMNAR_SUFFIX}"
+            state.next_file += 1
+            data = encode_table(schema, columns)
+            replace_bytes(os.path.join(segments_dir(table), name), data, self._policy.syncs_files)
+            self._columns[(table, name)] = columns
+            made.append(Segment.of(name, columns))
+        return made
+
+    def _publish(self, table: str, state: _SegmentedState, segments: list[Segment]) -> None:
+        """Switch the manifest to `segments`, then remove the files it no longer lists."""
+        path = segment_manifest_path(table)
+        manifest = {"next_file": state.next_file, "segments": [s.to_json() for s in segments]}
+        write_json(path, manifest, indent=None, sync=self._policy.syncs_files)
+        self._states[table] = _SegmentedState(file_stamp(path), state.next_file, segments)
+        for name in {s.file for s in state.segments} - {s.file for s in segments}:
+            self._columns.pop((table, name), None)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(segments_dir(table), name))
+
+    def _rewrite(
+        self,
+        table: str,
+        state: _SegmentedState,
+        changes: dict[int, list[dict[str, Column]]],
+        tail: list[dict[str, Column]] | None = None,
+    ) -> None:
+        """Replace segment i with the parts in `changes[i]` and append `tail` after the last."""
+        segments: list[Segment] = []
+        for i, seg in enumerate(state.segments):
+            segments.extend(self._written(table, state, changes[i]) if i in changes else [seg])
+        segments.extend(self._written(table, state, tail or []))
+        self._publish(table, state, segments)
+
+    def _by_segment(
+        self, table: str, state: _SegmentedState, ids: Iterable[int]
+    ) -> dict[int, list[int]]:
+        """Positions of the rows with `ids`, grouped by segment index (unknown ids dropped)."""
+        firsts = [s.first_id for s in state.segments]
+        found: dict[int, list[int]] = {}
+        for rid in ids:
+            i = bisect_right(firsts, rid) - 1
+            if i < 0 or rid > state.segments[i].last_id:
+                continue
+            id_col = self._segment(table, state.segments[i])["id"]
+            pos = bisect_left(id_col, rid)
+            if pos < len(id_col) and id_col[pos] == rid:
+                found.setdefault(i, []).append(pos)
+        return found
+
+    def write(self, table: str, rows: list[Row]) -> None:
+        schema = self._schema_of(table)
+        rows = sorted(rows, key=itemgetter("id"))
+        os.makedirs(segments_dir(table), exist_ok=True)
+        state = self._current(table)
+        columns = {c: new_column(t, [r[c] for r in rows]) for c, t in schema.items()}
+        segments = self._written(table, state, self._chunks(columns))
+        self._publish(table, state, segments)
+        # Files left by a write that failed before its manifest was published.
+        live = {s.file for s in segments} | {SEGMENT_MANIFEST}
+        for name in os.listdir(segments_dir(table)):
+            if name not in live and name.endswith(COLUMNAR_SUFFIX):
+                os.remove(os.path.join(segments_dir(table), name))
+
+    def insert(self, table: str, new_rows: list[Row]) -> None:
+        """Append past the last id: fill the last segment, then start new ones.
+
+        A row inside a segment's id range (an id another process reserved earlier)
+        is merged into that segment instead.
+        """
+        schema = self._schema_of(table)
+        state = self._load(table)
+        segments = state.segments
+        new_rows = sorted(new_rows, key=itemgetter("id"))
+        groups: dict[int, list[Row]] = {}
+        tail: list[Row] = []
+        last_id = segments[-1].last_id if segments else None
+        firsts = [s.first_id for s in segments]
+        for row in new_rows:
+            if last_id is None or row["id"] > last_id:
+                tail.append(row)
+            else:
+                i = max(bisect_right(firsts, row["id"]) - 1, 0)
+                groups.setdefault(i, []).append(row)
+        if tail and segments and segments[-1].rows < SEGMENT_ROWS:
+            room = SEGMENT_ROWS - segments[-1].rows
+            groups.setdefault(len(segments) - 1, []).extend(tail[:room])
+            tail = tail[room:]
+        changes = {}
+        for i, rows in groups.items():
+            old = self._segment(table, segments[i])
+            merged = {c: new_column(t, old[c]) for c, t in schema.items()}
+            for c, t in schema.items():
+                merged[c].extend(new_column(t, [r[c] for r in rows]))
+            ids = merged["id"]
+            if any(a > b for a, b in pairwise(ids)):
+                order = sorted(range(len(ids)), key=ids.__getitem__)
+                merged = {
+                    c: new_column(t, map(merged[c].__getitem__, order)) for c, t in schema.items()
+                }
+            changes[i] = self._chunks(merged)
+        appended = {c: new_column(t, [r[c] for r in tail]) for c, t in schema.items()}
+        self._rewrite(table, state, changes, self._chunks(appended))
+
+    def update(self, table: str, ids: list[int], updates: Row) -> None:
+        schema = self._schema_of(table)
+        state = self._load(table)
+        changes = {}
+        for i, positions in self._by_segment(table, state, ids).items():
+            old = self._segment(table, state.segments[i])
+            columns = dict(old)
+            for c, value in updates.items():
+                col = columns[c] = new_column(schema[c], old[c])
+                try:
+                    for pos in positions:
+                        col[pos] = value
+                except OverflowError as exc:
+                    raise ValueError("Значение int не помещается в 64 бита.") from exc
+            changes[i] = [columns]
+        self._rewrite(table, state, changes)
+
+    def delete(self, table: str, ids: list[int] | None) -> None:
+        if ids is None:
+            self.write(table, [])
+            return
+        schema = self._schema_of(table)
+        state = self._load(table)
+        changes = {}
+        for i, positions in self._by_segment(table, state, ids).items():
+            old = self._segment(table, state.segments[i])
+            keep = [True] * state.segments[i].rows
+            for pos in positions:
+                keep[pos] = False
+            changes[i] = [{c: new_column(t, compress(old[c], keep)) for c, t in schema.items()}]
+        self._rewrite(table, state, changes)
+
+    def compact(self, table: str) -> None:
+        """Repack into full segments (after deletes) and drop stray files."""
+        self.write(table, self.read(table))
+
+    def close(self) -> None:
+        self._states.clear()
+        self._columns.clear()
+
+    def drop(self, table: str) -> None:
+        self._states.pop(table, None)
+        for key in [k for k in self._columns if k[0] == table]:
+            del self._columns[key]
+        shutil.rmtree(segments_dir(table), ignore_errors=True)
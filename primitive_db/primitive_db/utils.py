@@ -1,11 +1,28 @@
 from __future__ import annotations
 
+import contextlib
 import json
 import os
 from pathlib import Path
 from typing import Any
 
-from primitive_db.constants import DATA_DIR, FALSE_VALUES, META_FILE, SUPPORTED_TYPES, TRUE_VALUES
+from primitive_db.constants import (
+    COLUMNAR_SUFFIX,
+    COMMIT_INTENT_FILE,
+    DATA_DIR,
+    FALSE_VALUES,
+    INDEX_SUFFIX,
+    LOCK_SUFFIX,
+    LOG_SUFFIX,
+    META_FILE,
+    ROWS_SUFFIX,
+    SEGMENT_MANIFEST,
+    SEGMENTS_SUFFIX,
+    SUPPORTED_TYPES,
+    TRUE_VALUES,
+)
+
+_BOOL_WORDS: dict[str, bool] = dict.fromkeys(TRUE_VALUES, True) | dict.fromkeys(FALSE_VALUES, False)
 
 
 def ensure_storage() -> None:
@@ -20,15 +37,97 @@ def read_json(path: str) -> Any:
         return json.load(f)
 
 
-def write_json(path: str, data: Any) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def write_json(path: str, data: Any, indent: int | None = 2, sync: bool = True) -> None:
+    """Crash-safe JSON write (see `replace_bytes`).
+
+    `indent=None` writes compact JSON through the C encoder (much faster for big data).
+    """
+    replace_bytes(path, json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8"), sync)
+
+
+def replace_bytes(path: str, data: bytes, sync: bool = True) -> None:
+    """Write to a temp file next to `path`, fsync it and atomically rename it over `path`.
+
+    A crash leaves either the old or the new file, never a truncated one. With
+    `sync=False` (`--sync off`) both fsyncs are skipped: a process crash still leaves
+    one of the two, but after a power loss the rename may have lost the new data.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if sync:
+        fsync_dir(path)
+
+
+def fsync_dir(path: str) -> None:
+    """Make a rename/creation of `path` durable (no-op where directories cannot be opened)."""
+    with contextlib.suppress(OSError):
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def remove_durably(path: str, sync: bool = True) -> None:
+    """Delete `path` and make the deletion durable (see `fsync_dir`) unless `sync` is off."""
+    os.remove(path)
+    if sync:
+        fsync_dir(path)
+
+
+def file_stamp(path: str) -> tuple[int, int, int]:
+    """(mtime_ns, size, inode), or zeros if missing.
+
+    Every atomic replace creates a new inode, so equal stamps mean the same file version.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0, 0)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
 
 
 def table_path(table_name: str) -> str:
     return str(Path(DATA_DIR) / f"{table_name}.json")
 
 
+def table_log_path(table_name: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}{LOG_SUFFIX}")
+
+
+def columnar_path(table_name: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}{COLUMNAR_SUFFIX}")
+
+
+def rows_path(table_name: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}{ROWS_SUFFIX}")
+
+
+def segments_dir(table_name: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}{SEGMENTS_SUFFIX}")
+
+
+def segment_manifest_path(table_name: str) -> str:
+    return str(Path(segments_dir(table_name)) / SEGMENT_MANIFEST)
+
+
+def index_path(table_name: str, column: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}.{column}{INDEX_SUFFIX}")
+
+
+def lock_path(table_name: str) -> str:
+    return str(Path(DATA_DIR) / f"{table_name}{LOCK_SUFFIX}")
+
+
+def commit_intent_path() -> str:
+    return str(Path(DATA_DIR) / COMMIT_INTENT_FILE)
+
+
 def cast_value(type_name: str, raw: str) -> Any:
     """Cast string value to the declared type."""
     if type_name not in SUPPORTED_TYPES:
@@ -52,20 +151,35 @@ def cast_value(type_name: str, raw: str) -> Any:
         raise ValueError(f"Невалидное значение для {type_name}: {raw}") from exc
 
 
-def get_table_cache():
-    """Closure-based cache for reading table data (mtime-based)."""
-    cache: dict[str, tuple[float, list[dict[str, Any]]]] = {}
+def cast_column(type_name: str, values: list[Any]) -> list[Any]:
+    """Cast a whole column with the `cast_value` rules.
 
-    def read_table_cached(path: str) -> list[dict[str, Any]]:
-        if not os.path.exists(path):
-            return []
-        mtime = os.path.getmtime(path)
-        if path in cache and cache[path][0] == mtime:
-            return cache[path][1]
-        data = read_json(path)
-        if not isinstance(data, list):
-            raise ValueError("Файл таблицы повреждён (ожидался список записей).")
-        cache[path] = (mtime, data)
-        return data
-
-    return read_table_cached
+    All-string int/float columns go through the builtin constructor in one `map`;
+    values that are already of the column type (e.g. numbers from JSON) are kept.
+    """
+    if type_name not in SUPPORTED_TYPES:
+        raise ValueError(f"Неподдерживаемый тип: {type_name}")
+    py_type = SUPPORTED_TYPES[type_name]
+    kinds = set(map(type, values))
+    if kinds <= {py_type}:
+        return values
+    if kinds == {str} and type_name in {"int", "float"}:
+        try:
+            return list(map(py_type, values))
+        except ValueError:
+            pass  # Fall through to report the offending value.
+    if kinds == {str} and type_name == "bool":
+        result = list(map(_BOOL_WORDS.get, map(str.lower, map(str.strip, values))))
+        if None not in result:
+            return result
+    return [_cast_loaded(type_name, py_type, v) for v in values]
+
+
+def _cast_loaded(type_name: str, py_type: type, value: Any) -> Any:
+    if isinstance(value, str):
+        return cast_value(type_name, value)
+    if type(value) is py_type:
+        return value
+    if type_name == "float" and type(value) is int:
+        return float(value)
+    raise ValueError(f"Невалидное значение для {type_name}: {value!r}")
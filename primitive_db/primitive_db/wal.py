@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from primitive_db.constants import DEFAULT_SYNC_MODE, SYNC_MODES, WAL_GROUP_COMMITS, WAL_GROUP_MS
+
+
+@dataclass(frozen=True)
+class SyncPolicy:
+    """When appended commits are fsync'ed.
+
+    always: after every commit. group: once `commits` commits are pending, or
+    `interval_ms` after the first pending one (group commit). off: left to the OS.
+    """
+
+    mode: str = DEFAULT_SYNC_MODE
+    interval_ms: int = WAL_GROUP_MS
+    commits: int = WAL_GROUP_COMMITS
+
+    def __post_init__(self) -> None:
+        if self.mode not in SYNC_MODES:
+            raise ValueError(f"Неизвестный режим fsync: {self.mode} ({'|'.join(SYNC_MODES)})")
+
+    @property
+    def syncs_files(self) -> bool:
+        """Whether writes outside a log (file replaces, in-place changes) are fsync'ed.
+
+        They have no log to group commits in, so `group` syncs each one like `always`.
+        """
+        return self.mode != "off"
+
+
+def _trim_torn_tail(fd: int, end: int) -> None:
+    """Cut an unterminated last record (left by a crash mid-append) off the log."""
+    pos = end
+    while pos > 0:
+        step = min(4096, pos)
+        chunk = os.pread(fd, step, pos - step)
+        nl = chunk.rfind(b"\n")
+        if nl != -1:
+            os.ftruncate(fd, pos - step + nl + 1)
+            return
+        pos -= step
+    os.ftruncate(fd, 0)
+
+
+class WriteAheadLog:
+    """Append-only JSONL file where every line is one committed record.
+
+    A commit is written with a single `write`; a line cut short by a crash is trimmed
+    before the next append and never replayed. Durability follows the `SyncPolicy`:
+    with `group`, consecutive commits share one fsync, issued by whichever comes first
+    of the commit-count limit or a timer.
+    """
+
+    def __init__(self, path: str, policy: SyncPolicy | None = None) -> None:
+        self.path = path
+        self.policy = policy or SyncPolicy()
+        self._fd: int | None = None
+        self._pending = 0
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def append(self, record: dict[str, Any]) -> tuple[int, int]:
+        """Commit one record; return the (start, end) offsets it was written at."""
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            fd = self._open()
+            end = os.fstat(fd).st_size
+            if end and os.pread(fd, 1, end - 1) != b"\n":
+                _trim_torn_tail(fd, end)
+            data = memoryview(line)
+            while data:
+                data = data[os.write(fd, data) :]
+            end = os.lseek(fd, 0, os.SEEK_END)
+            self._pending += 1
+            self._after_commit()
+        return end - len(line), end
+
+    def _after_commit(self) -> None:
+        mode = self.policy.mode
+        if mode == "always" or (mode == "group" and self._pending >= self.policy.commits):
+            self._sync_locked()
+        elif mode == "group" and self._timer is None:
+            self._timer = threading.Timer(self.policy.interval_ms / 1000, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _sync_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending and self._fd is not None:
+            os.fsync(self._fd)
+        self._pending = 0
+
+    def sync(self) -> None:
+        """Force pending commits to disk."""
+        with self._lock:
+            self._sync_locked()
+
+    def size(self) -> int:
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def read_from(self, offset: int) -> tuple[list[dict[str, Any]], int]:
+        """Complete records after `offset`, and the offset just past them."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+        except FileNotFoundError:
+            return [], offset
+        complete = tail[: tail.rfind(b"\n") + 1]
+        records = [json.loads(line) for line in complete.splitlines() if line.strip()]
+        return records, offset + len(complete)
+
+    def reset(self) -> None:
+        """Empty the log once its records have been checkpointed into the table files."""
+        with self._lock:
+            self._sync_locked()
+            os.ftruncate(self._open(), 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
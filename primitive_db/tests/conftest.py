@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from primitive_db.core import DbCore
+from primitive_db.decorators import set_auto_confirm, set_raise_errors
+from primitive_db.engine import DbEngine
+from primitive_db.main import dispatch
+from primitive_db.parser import parse_command
+
+
+@pytest.fixture(autouse=True)
+def db_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Every test gets its own empty database (data/ and db_meta.json are cwd-relative)."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def engine() -> Iterator[DbEngine]:
+    eng = DbEngine(scan_workers=0)
+    yield eng
+    eng.close()
+
+
+@pytest.fixture
+def run(engine: DbEngine) -> Iterator:
+    """Run CLI command lines against `engine`: confirmations say yes, errors raise."""
+    core = DbCore(engine)
+    set_auto_confirm(True)
+    set_raise_errors(True)
+
+    def run_lines(*lines: str) -> None:
+        for line in lines:
+            dispatch(core, parse_command(line))
+
+    yield run_lines
+    set_raise_errors(False)
+    set_auto_confirm(None)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.aggregate import Aggregate, check_items, hash_aggregate
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+
+ROWS = [{"id": i, "g": f"g{i % 3}", "k": i % 10, "x": i / 4} for i in range(1, 101)]
+ITEMS = (
+    "g",
+    Aggregate("count"),
+    Aggregate("sum", "k"),
+    Aggregate("avg", "x"),
+    Aggregate("min", "k"),
+    Aggregate("max", "x"),
+)
+
+
+def expected(rows, group: str | None = "g") -> list[dict]:
+    keys = sorted({r[group] for r in rows}) if group else [None]
+    out = []
+    for key in keys:
+        part = [r for r in rows if group is None or r[group] == key]
+        ks, xs = [r["k"] for r in part], [r["x"] for r in part]
+        row = {} if group is None else {"g": key}
+        row |= {"count(*)": len(part), "sum(k)": sum(ks) if ks else None}
+        row |= {"avg(x)": sum(xs) / len(xs) if xs else None}
+        row |= {"min(k)": min(ks, default=None), "max(x)": max(xs, default=None)}
+        out.append(row)
+    return out
+
+
+def by_group(rows: list[dict]) -> list[dict]:
+    return sorted(rows, key=lambda r: r.get("g") or "")
+
+
+def test_hash_aggregate():
+    assert by_group(hash_aggregate(ROWS, ITEMS, ("g",))) == expected(ROWS)
+    assert hash_aggregate([], ITEMS[1:], ()) == expected([], None)
+    assert hash_aggregate([], ITEMS, ("g",)) == []
+
+
+@pytest.mark.parametrize(
+    ("items", "group_by", "message"),
+    [
+        (("g", Aggregate("count")), (), "должен быть в group by"),
+        ((Aggregate("sum", "g"),), (), "не числовой"),
+        ((Aggregate("min", "nope"),), (), "Неизвестный столбец"),
+        ((Aggregate("count"),), ("nope",), "Неизвестный столбец"),
+    ],
+)
+def test_check_items(items, group_by, message):
+    schema = {"id": "int", "g": "str", "k": "int", "x": "float"}
+    with pytest.raises(ValueError, match=message):
+        check_items(schema, items, group_by)
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, engine: DbEngine) -> DbEngine:
+    engine.create_table("t", {"g": "str", "k": "int", "x": "float"}, request.param)
+    engine.insert_rows("t", ROWS)
+    return engine
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+def test_aggregate_every_format(table):
+    assert by_group(table.aggregate("t", None, ITEMS, ("g",))) == expected(ROWS)
+    matching = [r for r in ROWS if r["k"] < 4]
+    result = table.aggregate("t", where(table, "k < 4"), ITEMS[1:], ())
+    assert result == expected(matching, None)
+
+
+def test_answered_from_indexes(table):
+    table.create_index("t", "k", "sorted")
+    table.create_index("t", "g", "hash")
+    cases = [
+        # Whole-table count/min/max come from the column statistics first.
+        ("статистике", None, (Aggregate("count"), Aggregate("min", "k")), ()),
+        ("индексам", None, ("g", Aggregate("count")), ("g",)),
+        ("индексам", "k >= 7", (Aggregate("count"),), ()),
+    ]
+    for source, text, items, group_by in cases:
+        expr = where(table, text) if text else None
+        with profile.profiling("select") as prof:
+            rows = table.aggregate("t", expr, items, group_by)
+        assert prof.plans == [f"t: агрегаты по {source}"]
+        assert prof.counts["examined"] == 0
+        scanned = [r for r in table.read_rows("t") if expr is None or r["k"] >= 7]
+        assert by_group(rows) == by_group(hash_aggregate(scanned, items, group_by))
+
+
+def test_stale_indexes_are_not_trusted(table):
+    table.create_index("t", "k", "sorted")
+    table.flush_indexes()
+    other = DbEngine(scan_workers=0)
+    try:
+        other.insert_rows("t", [{"id": 101, "g": "g9", "k": 99, "x": 0.5}])
+    finally:
+        other.close()
+    items = (Aggregate("count"), Aggregate("max", "k"))
+    assert table.aggregate("t", None, items) == [{"count(*)": 101, "max(k)": 99}]
+
+
+def test_group_by_command(run, capsys):
+    run("create_table t g:str k:int")
+    run("insert t g=a k=1", "insert t g=b k=2", "insert t g=a k=3")
+    capsys.readouterr()
+    run("select g, count(*), sum(k) from t group by g order by g desc --output jsonl")
+    lines = [json.loads(s) for s in capsys.readouterr().out.splitlines() if s.startswith("{")]
+    assert lines == [
+        {"g": "b", "count(*)": 1, "sum(k)": 2},
+        {"g": "a", "count(*)": 2, "sum(k)": 4},
+    ]
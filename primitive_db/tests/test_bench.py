@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+from primitive_db.constants import TABLE_FORMATS
+
+_spec = importlib.util.spec_from_file_location(
+    "bench", Path(__file__).resolve().parent.parent / "benchmarks" / "bench.py"
+)
+bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench)
+
+OPERATIONS = {"load", "insert", "point_select", "range_select", "update", "delete"}
+
+
+@pytest.mark.parametrize(("text", "rows"), [("1000", 1000), ("10k", 10_000), ("1.5M", 1_500_000)])
+def test_parse_size(text, rows):
+    assert bench.parse_size(text) == rows
+
+
+@pytest.mark.parametrize("text", ["0", "-5", "many"])
+def test_bad_size(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        bench.parse_size(text)
+
+
+def test_summarize():
+    stats = bench.summarize([0.002, 0.001, 0.003, 0.004], rows=8)
+    assert stats == {
+        "count": 4,
+        "seconds": 0.01,
+        "per_second": 800.0,
+        "p50_ms": 3.0,
+        "p99_ms": 4.0,
+    }
+
+
+def test_compare_reports_only_slowdowns():
+    def report(p50: float) -> dict:
+        ops = {"insert": {"p50_ms": p50}, "delete": {"p50_ms": 1.0}}
+        return {"results": [{"format": "json", "rows": 10, "operations": ops}]}
+
+    assert bench.compare(report(1.1), report(1.0), 0.2) == []
+    assert bench.compare(report(2.0), report(1.0), 0.2) == [
+        "json/10 insert: p50 1.000 -> 2.000 ms (x2.00)"
+    ]
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+def test_run_case(fmt):
+    case = bench.run_case(fmt, 40, ops=5, seed=1, index=fmt == "json")
+    assert (case["format"], case["rows"]) == (fmt, 40)
+    assert case["operations"].keys() == OPERATIONS
+    assert case["operations"]["load"]["per_second"]
+    assert case["operations"]["delete"]["count"] == 5
+
+
+def test_main_writes_a_report(tmp_path, capsys):
+    out = tmp_path / "report.json"
+    assert bench.main(["--rows", "30", "--formats", "json", "--ops", "2", "--out", str(out)]) == 0
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert [(c["format"], c["rows"]) for c in report["results"]] == [("json", 30)]
+    assert "json/30" in capsys.readouterr().out
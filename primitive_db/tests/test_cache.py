@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from primitive_db import storage
+from primitive_db.cache import TableCache, cache_budget
+from primitive_db.constants import CACHE_ENV_VAR, TABLE_CACHE_BYTES
+from primitive_db.engine import DbEngine
+from primitive_db.utils import write_json
+
+SCHEMA = {"id": "int", "k": "int"}
+
+
+def table_file(name: str, count: int) -> str:
+    write_json(name, [{"id": i, "k": i} for i in range(1, count + 1)], indent=None)
+    return name
+
+
+@pytest.mark.parametrize(("raw", "budget"), [(None, TABLE_CACHE_BYTES), ("0", 0), ("1.5", 3 << 19)])
+def test_cache_budget(monkeypatch, raw, budget):
+    if raw is not None:
+        monkeypatch.setenv(CACHE_ENV_VAR, raw)
+    assert cache_budget() == budget
+
+
+@pytest.mark.parametrize("raw", ["-1", "lots"])
+def test_bad_cache_budget(monkeypatch, raw):
+    monkeypatch.setenv(CACHE_ENV_VAR, raw)
+    with pytest.raises(ValueError, match=CACHE_ENV_VAR):
+        cache_budget()
+
+
+def test_least_recently_used_goes_first():
+    paths = [table_file(f"t{i}.json", 50) for i in range(3)]
+    size = os.path.getsize(paths[0])
+    cache = TableCache(budget=2 * size)
+    cache.read(paths[0], SCHEMA)
+    cache.read(paths[1], SCHEMA)
+    cache.read(paths[0], SCHEMA)  # Now t1 is the oldest.
+    cache.read(paths[2], SCHEMA)
+    cache.read(paths[0], SCHEMA)
+    cache.read(paths[1], SCHEMA)
+    assert cache.stats() == {
+        "entries": 2,
+        "bytes": 2 * size,
+        "budget": 2 * size,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 2,
+    }
+
+
+def test_changed_file_is_reread():
+    path = table_file("t.json", 3)
+    cache = TableCache()
+    assert len(cache.read(path, SCHEMA)) == 3
+    table_file(path, 3)  # Same size and, possibly, the same mtime tick.
+    table_file(path, 4)
+    assert len(cache.read(path, SCHEMA)) == 4
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_oversized_table_is_not_kept():
+    path = table_file("t.json", 100)
+    cache = TableCache(budget=os.path.getsize(path) - 1)
+    cache.read(path, SCHEMA)
+    cache.read(path, SCHEMA)
+    assert cache.stats()["entries"] == 0
+    assert cache.misses == 2
+
+
+def test_corrupt_table_file():
+    write_json("t.json", {"not": "a list"})
+    with pytest.raises(ValueError, match="повреждён"):
+        TableCache().read("t.json", SCHEMA)
+
+
+def test_tiny_budget_still_reads_correctly():
+    engine = DbEngine(cache_bytes=1, scan_workers=0)
+    try:
+        for t in ("a", "b"):
+            engine.create_table(t, {"k": "int"})
+            engine.insert_rows(t, [{"id": i, "k": i} for i in range(1, 21)])
+        engine.update_rows("a", engine.read_rows("a")[:5], {"k": 0})
+        assert [r["k"] for r in engine.read_rows("a")][:6] == [0, 0, 0, 0, 0, 6]
+        assert len(engine.read_rows("b")) == 20
+        assert engine.table_cache.stats()["entries"] == 0
+    finally:
+        engine.close()
+
+
+def test_failed_write_leaves_the_cached_table(engine, monkeypatch):
+    engine.create_table("t", {"k": "int"})
+    engine.insert_rows("t", [{"id": 1, "k": 1}])
+    before = engine.read_rows("t")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage, "write_json", fail)
+    with pytest.raises(OSError):
+        engine.insert_rows("t", [{"id": 2, "k": 2}])
+    with pytest.raises(OSError):
+        engine.update_rows("t", before, {"k": 5})
+    assert engine.read_rows("t") == before
+    assert engine.table_cache.hits
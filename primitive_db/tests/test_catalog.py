@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db.catalog import MetaCatalog
+from primitive_db.constants import META_FILE
+from primitive_db.utils import ensure_storage, file_stamp, read_json
+
+INFO = {"schema": {"id": "int", "k": "int"}, "next_id": 1}
+
+
+@pytest.fixture
+def catalog() -> MetaCatalog:
+    ensure_storage()
+    cat = MetaCatalog(id_block=10)
+    cat.add_table("t", dict(INFO))
+    return cat
+
+
+def test_ids_come_from_one_reserved_block(catalog):
+    first = catalog.next_id("t")
+    stamp = file_stamp(META_FILE)
+    assert [catalog.next_id("t") for _ in range(9)] == list(range(first + 1, first + 10))
+    assert file_stamp(META_FILE) == stamp  # No meta write inside a block.
+    assert read_json(META_FILE)["tables"]["t"]["next_id"] == first + 10
+    assert catalog.next_id("t") == first + 10  # Next block.
+
+
+def test_catalogs_get_disjoint_blocks(catalog):
+    other = MetaCatalog(id_block=10)
+    mine = [catalog.next_id("t") for _ in range(3)]
+    theirs = [other.next_id("t") for _ in range(3)]
+    assert not set(mine) & set(theirs)
+
+
+def test_unused_ids_are_released(catalog):
+    catalog.next_id("t")
+    catalog.release_ids()
+    assert read_json(META_FILE)["tables"]["t"]["next_id"] == 2
+
+
+def test_release_keeps_ids_once_someone_reserved_after_us(catalog):
+    catalog.next_id("t")
+    MetaCatalog(id_block=10).next_id("t")
+    catalog.release_ids()
+    assert read_json(META_FILE)["tables"]["t"]["next_id"] == 21
+
+
+def test_pinned_reads_meta_once_and_sees_outside_changes(catalog):
+    other = MetaCatalog()
+    other.add_table("u", dict(INFO))
+    with catalog.pinned():
+        assert "u" in catalog.tables
+        other.drop_table("u")
+        assert "u" in catalog.tables  # Served from memory until the block ends.
+    assert "u" not in catalog.tables
+
+
+def test_duplicate_and_missing_tables(catalog):
+    with pytest.raises(ValueError, match="уже существует"):
+        catalog.add_table("t", dict(INFO))
+    with pytest.raises(ValueError, match="не найдена"):
+        catalog.schema("missing")
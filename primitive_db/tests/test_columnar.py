@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db import storage
+from primitive_db.columnar import decode_table, encode_table, new_column
+from primitive_db.engine import DbEngine
+
+SCHEMA = {"id": "int", "n": "int", "x": "float", "b": "bool", "s": "str"}
+ROWS = [
+    {"id": 1, "n": -(2**63), "x": 0.5, "b": True, "s": "ёж"},
+    {"id": 2, "n": 2**63 - 1, "x": -1e300, "b": False, "s": ""},
+]
+
+
+def test_encode_decode_round_trip():
+    columns = {c: new_column(t, [r[c] for r in ROWS]) for c, t in SCHEMA.items()}
+    count, decoded = decode_table(encode_table(SCHEMA, columns))
+    assert count == len(ROWS)
+    assert {c: list(col) for c, col in decoded.items()} == {c: [r[c] for r in ROWS] for c in SCHEMA}
+
+
+@pytest.fixture
+def table(engine):
+    engine.create_table("t", {c: t for c, t in SCHEMA.items() if c != "id"}, "columnar")
+    engine.insert_rows("t", [dict(r) for r in ROWS])
+    return engine
+
+
+def test_rows_survive_a_new_engine(table):
+    other = DbEngine(scan_workers=0)
+    try:
+        assert other.read_rows("t") == ROWS
+    finally:
+        other.close()
+
+
+def test_failed_write_leaves_cached_columns_alone(table, monkeypatch):
+    def disk_full(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(storage, "replace_bytes", disk_full)
+    with pytest.raises(OSError):
+        table.update_rows("t", table.read_rows("t"), {"n": 7, "s": "new"})
+    assert table.read_rows("t") == ROWS
+
+
+def test_int_overflow_is_rejected_without_changes(table):
+    with pytest.raises(ValueError, match="64 бита"):
+        table.update_rows("t", table.read_rows("t")[:1], {"n": 2**63})
+    assert table.read_rows("t") == ROWS
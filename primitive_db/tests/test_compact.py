@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from array import array
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.compact import CompactTable
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+from primitive_db.predicate import Cmp
+from primitive_db.utils import table_path, write_json
+
+SCHEMA = {"id": "int", "k": "int", "x": "float", "s": "str", "ok": "bool"}
+ROWS = [{"id": i, "k": i * 10, "x": i / 2, "s": f"s{i}", "ok": i % 2 == 0} for i in (3, 1, 2)]
+
+
+@pytest.fixture
+def compact() -> CompactTable:
+    return CompactTable.from_rows(SCHEMA, ROWS)
+
+
+def test_numbers_are_typed_arrays(compact):
+    assert isinstance(compact.columns["k"], array) and compact.columns["k"].typecode == "q"
+    assert compact.columns["x"].typecode == "d"
+    assert compact.columns["s"] == ["s3", "s1", "s2"]
+    assert list(compact.rows()) == ROWS
+    assert len(compact) == 3
+
+
+def test_lookups(compact):
+    assert compact.row(1) == ROWS[1]
+    assert compact.find([2, 3, 99]) == [0, 2]  # Table order; unknown ids skipped.
+    assert list(compact.take([2])) == [ROWS[2]]
+    assert list(compact.matches(Cmp("k", ">=", 20))) == [0, 2]
+
+
+def test_changes_return_new_tables(compact):
+    grown = compact.appended([{"id": 4, "k": 40, "x": 2.0, "s": "s4", "ok": True}])
+    changed = grown.updated([0, 3], {"k": -1})
+    smaller = changed.without([1])
+    assert [r["k"] for r in smaller.rows()] == [-1, 20, -1]
+    assert smaller.positions() == {3: 0, 2: 1, 4: 2}
+    assert list(compact.rows()) == ROWS  # Shared tables never change.
+    assert changed.columns["s"] is grown.columns["s"]  # Untouched columns are shared.
+
+
+def test_values_an_array_cannot_hold_fall_back_to_lists(compact):
+    huge = 1 << 70
+    assert compact.updated([0], {"k": huge}).columns["k"] == [huge, 10, 20]
+    row = {"id": 5, "k": huge, "x": 0.0, "s": "", "ok": False}
+    assert list(compact.appended([row]).columns["k"]) == [30, 10, 20, huge]
+    hand_edited = CompactTable.from_rows(SCHEMA, [{**ROWS[0], "k": "7"}])
+    assert hand_edited.columns["k"] == ["7"]
+
+
+def test_json_tables_are_cached_as_columns(engine: DbEngine):
+    engine.create_table("t", {"k": "int", "s": "str"})
+    write_json(table_path("t"), [{"id": i, "k": i % 10, "s": f"s{i}"} for i in range(1, 101)])
+    with profile.profiling("select") as prof:
+        where = engine.resolve_where("t", parse_where(tokenize("k = 3 and s != s13")))
+        rows = list(engine.iter_rows("t", where))
+    assert [r["id"] for r in rows] == [3, 23, 33, 43, 53, 63, 73, 83, 93]
+    assert prof.counts["cache_miss"] == 1
+    cached = engine.table_cache.read(table_path("t"), engine.get_schema("t"))
+    assert isinstance(cached, CompactTable)
+    assert isinstance(cached.columns["k"], array)
+
+
+@pytest.mark.parametrize("fmt", ["json", "columnar"])
+def test_writes_leave_earlier_reads_alone(engine: DbEngine, fmt):
+    engine.create_table("t", {"k": "int"}, fmt)
+    engine.insert_rows("t", [{"id": i, "k": i} for i in range(1, 6)])
+    before = engine.read_rows("t")
+    where = engine.resolve_where("t", parse_where(tokenize("k >= 4")))
+    engine.update_rows("t", list(engine.iter_rows("t", where)), {"k": 0})
+    engine.delete_rows("t", before[:1])
+    assert [r["k"] for r in before] == [1, 2, 3, 4, 5]
+    assert engine.read_rows("t") == [
+        {"id": 2, "k": 2},
+        {"id": 3, "k": 3},
+        {"id": 4, "k": 0},
+        {"id": 5, "k": 0},
+    ]
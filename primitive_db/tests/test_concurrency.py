@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+import pytest
+
+from primitive_db.aggregate import Aggregate
+from primitive_db.engine import DbEngine
+
+WRITERS = 3
+INSERTS = 40
+
+
+def _insert_many(path: str, writer: int) -> None:
+    os.chdir(path)
+    engine = DbEngine(scan_workers=0)
+    try:
+        for i in range(INSERTS):
+            with engine.command():
+                (rid,) = engine.catalog.reserve_ids("t", 1)
+                engine.insert_rows("t", [{"id": rid, "k": writer * 1000 + i}])
+    finally:
+        engine.close()
+
+
+def _run_writers(target, path: str) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=target, args=(path, w)) for w in range(WRITERS)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+
+
+@pytest.mark.parametrize("fmt", ["json", "log", "columnar", "mmap", "segmented"])
+def test_concurrent_writers_keep_indexes_and_counts(db_dir, fmt: str):
+    engine = DbEngine(scan_workers=0)
+    engine.create_table("t", {"k": "int"}, fmt)
+    engine.create_index("t", "k", "sorted")
+    engine.close()
+
+    _run_writers(_insert_many, str(db_dir))
+
+    engine = DbEngine(scan_workers=0)
+    try:
+        with engine.command():
+            rows = engine.read_rows("t")
+            assert len(rows) == WRITERS * INSERTS
+            assert len({r["id"] for r in rows}) == len(rows)
+            index = engine.table_indexes("t")["k"]
+            assert index.size == len(rows)
+            (count,) = engine.aggregate("t", None, (Aggregate("count"),))
+            assert count["count(*)"] == len(rows)
+    finally:
+        engine.close()
+
+
+def test_writer_sees_rows_of_other_processes(engine):
+    engine.create_table("t", {"k": "int"})
+    engine.insert_rows("t", [{"id": 1, "k": 1}])
+    other = DbEngine(scan_workers=0)
+    try:
+        other.insert_rows("t", [{"id": 2, "k": 2}])
+    finally:
+        other.close()
+    engine.insert_rows("t", [{"id": 3, "k": 3}])
+    assert [r["id"] for r in engine.read_rows("t")] == [1, 2, 3]
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.indexes import HashIndex, SortedIndex, load_index
+from primitive_db.parser import parse_where, tokenize
+
+ENTRIES = [(5, 1), (3, 2), (5, 3), (9, 4), (1, 5)]
+
+
+@pytest.mark.parametrize(
+    ("op", "value", "expected"),
+    [
+        ("=", 5, {1, 3}),
+        ("!=", 5, {2, 4, 5}),
+        ("in", frozenset({1, 9}), {4, 5}),
+        ("<", 5, {2, 5}),
+        ("<=", 5, {1, 2, 3, 5}),
+        (">", 5, {4}),
+        (">=", 3, {1, 2, 3, 4}),
+    ],
+)
+def test_sorted_index_lookup(op, value, expected):
+    index = SortedIndex.from_entries("k", ENTRIES)
+    assert index.lookup(op, value) == expected
+    assert index.estimate(op, value) == len(expected)
+    if op in HashIndex.ops:
+        hashed = HashIndex.from_entries("k", ENTRIES)
+        assert hashed.lookup(op, value) == expected
+        assert hashed.estimate(op, value) == len(expected)
+
+
+@pytest.mark.parametrize("kind", [HashIndex, SortedIndex])
+def test_add_and_remove(kind):
+    index = kind.from_entries("k", ENTRIES)
+    index.remove(5, 1)
+    index.remove(5, 99)  # Unknown entries are ignored.
+    index.add(7, 6)
+    assert index.size == 5
+    assert sorted(index.entries()) == [(1, 5), (3, 2), (5, 3), (7, 6), (9, 4)]
+    assert index.bounds() == (1, 9)
+
+
+def test_sorted_index_orders_ids():
+    index = SortedIndex.from_entries("k", ENTRIES)
+    assert list(index.ordered_ids()) == [5, 2, 1, 3, 4]
+    assert list(index.ordered_ids(descending=True)) == [4, 3, 1, 2, 5]
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, engine):
+    engine.create_table("t", {"k": "int", "tag": "str"}, request.param)
+    engine.create_index("t", "k", "sorted")
+    engine.create_index("t", "tag", "hash")
+    engine.insert_rows("t", [{"id": i, "k": i % 50, "tag": f"g{i % 7}"} for i in range(1, 301)])
+    return engine
+
+
+def scan_ids(engine: DbEngine, predicate) -> set[int]:
+    return {r["id"] for r in engine.read_rows("t") if predicate(r)}
+
+
+def test_writes_keep_indexes_in_step(table):
+    table.update_rows("t", table.read_rows("t")[:40], {"k": 1000})
+    table.delete_rows("t", table.read_rows("t")[-30:])
+    table.insert_rows("t", [{"id": 301, "k": 1000, "tag": "g0"}])
+
+    indexes = table.table_indexes("t")
+    assert indexes["k"].lookup("=", 1000) == scan_ids(table, lambda r: r["k"] == 1000)
+    assert indexes["tag"].lookup("=", "g0") == scan_ids(table, lambda r: r["tag"] == "g0")
+    assert indexes["k"].size == indexes["tag"].size == len(table.read_rows("t"))
+
+
+def test_planner_uses_the_matching_index(table):
+    plan = table.plan_query("t", where(table, "k < 3 and tag = g1"))
+    assert (plan.access, plan.detail) == ("index", "k:sorted")
+    assert plan.estimate == 18
+
+    assert table.plan_query("t", where(table, "tag = g1")).detail == "tag:hash"
+    # A hash index cannot answer a range; most of the table is cheaper to scan.
+    assert table.plan_query("t", where(table, "tag > g1")).access == "scan"
+    assert table.plan_query("t", where(table, "k >= 0")).access == "scan"
+
+    rows = list(table.iter_rows("t", where(table, "k < 3 and tag = g1")))
+    assert {r["id"] for r in rows} == scan_ids(table, lambda r: r["k"] < 3 and r["tag"] == "g1")
+
+
+def test_index_files_are_reused_only_while_current(table):
+    stamp = table._storage("t").stamp("t")
+    table.flush_indexes()
+    assert load_index("t", "k", "sorted", stamp) is not None
+    assert load_index("t", "k", "hash", stamp) is None
+
+    other = DbEngine(scan_workers=0)
+    try:
+        other.insert_rows("t", [{"id": 302, "k": 7, "tag": "x"}])
+        assert load_index("t", "k", "sorted", other._storage("t").stamp("t")) is None
+        # The stale file is rebuilt from the table rather than trusted.
+        assert 302 in table.table_indexes("t")["k"].lookup("=", 7)
+    finally:
+        other.close()
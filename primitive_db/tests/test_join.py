@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.join import hash_join, index_join
+from primitive_db.parser import parse_where, tokenize
+
+USERS = [{"id": i, "name": f"u{i}", "city": i % 4} for i in range(1, 41)]
+ORDERS = [{"id": i, "user": i % 50 + 1, "total": i * 10} for i in range(1, 301)]
+
+
+def test_hash_join_pairs_in_probe_order():
+    build = [{"k": 1, "b": "x"}, {"k": 2, "b": "y"}, {"k": 1, "b": "z"}]
+    probe = [{"k": 2, "p": 1}, {"k": 3, "p": 2}, {"k": 1, "p": 3}]
+    assert [(b["b"], p["p"]) for b, p in hash_join(build, probe, "k", "k")] == [
+        ("y", 1),
+        ("x", 3),
+        ("z", 3),
+    ]
+
+
+def test_index_join_looks_up_once_per_batch():
+    calls = []
+
+    def matches(values):
+        calls.append(values)
+        return {v: [{"v": v}] for v in values if v % 2}
+
+    outer = [{"k": k} for k in range(1, 8)]
+    pairs = list(index_join(outer, "k", matches, batch_size=3))
+    assert [o["k"] for o, _ in pairs] == [1, 3, 5, 7]
+    assert calls == [{1, 2, 3}, {4, 5, 6}, {7}]
+
+
+def joined(rows) -> list[tuple]:
+    return sorted((r["users.id"], r["orders.id"]) for r in rows)
+
+
+def expected(user_check=lambda u: True, order_check=lambda o: True) -> list[tuple]:
+    return sorted(
+        (u["id"], o["id"])
+        for u in USERS
+        for o in ORDERS
+        if u["id"] == o["user"] and user_check(u) and order_check(o)
+    )
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def tables(request, engine: DbEngine) -> DbEngine:
+    engine.create_table("users", {"name": "str", "city": "int"}, request.param)
+    engine.create_table("orders", {"user": "int", "total": "int"}, request.param)
+    engine.insert_rows("users", USERS)
+    engine.insert_rows("orders", ORDERS)
+    return engine
+
+
+def test_join_on_id_uses_lookups(tables):
+    where = parse_where(tokenize("orders.total < 100"))
+    with profile.profiling("select") as prof:
+        rows = list(tables.iter_join("users", "orders", ("orders.user", "users.id"), where))
+    assert joined(rows) == expected(order_check=lambda o: o["total"] < 100)
+    assert "join: index nested loop orders -> users.id" in prof.plans
+    assert rows[0].keys() == {
+        "users.id",
+        "users.name",
+        "users.city",
+        "orders.id",
+        "orders.user",
+        "orders.total",
+    }
+
+
+def test_hash_join_without_an_index(tables):
+    with profile.profiling("select") as prof:
+        rows = list(tables.iter_join("users", "orders", ("orders.user", "users.id")))
+    assert joined(rows) == expected()
+    assert "join: hash, построение по users" in prof.plans
+
+
+def test_hash_join_on_plain_columns(tables):
+    with profile.profiling("select") as prof:
+        rows = list(tables.iter_join("orders", "users", ("orders.user", "users.city")))
+    assert sorted((r["users.id"], r["orders.id"]) for r in rows) == sorted(
+        (u["id"], o["id"]) for u in USERS for o in ORDERS if u["city"] == o["user"]
+    )
+    assert "join: hash, построение по users" in prof.plans
+
+
+def test_indexed_join_column(tables):
+    tables.create_index("orders", "user", "hash")
+    where = parse_where(tokenize("users.city = 1 and orders.total > 1000"))
+    with profile.profiling("select") as prof:
+        rows = list(tables.iter_join("users", "orders", ("users.id", "orders.user"), where))
+    assert joined(rows) == expected(lambda u: u["city"] == 1, lambda o: o["total"] > 1000)
+    assert "join: index nested loop users -> orders.user" in prof.plans
+
+
+def test_residual_condition(tables):
+    where = parse_where(tokenize("users.city = 2 or orders.total < 50"))
+    rows = list(tables.iter_join("users", "orders", ("users.id", "orders.user"), where))
+    assert joined(rows) == sorted(
+        (u["id"], o["id"])
+        for u in USERS
+        for o in ORDERS
+        if u["id"] == o["user"] and (u["city"] == 2 or o["total"] < 50)
+    )
+
+
+@pytest.mark.parametrize(
+    ("on", "message"),
+    [
+        (("users.id", "users.city"), "связывать столбцы двух таблиц"),
+        (("users.name", "orders.user"), "типы столбцов"),
+    ],
+)
+def test_bad_join_condition(tables, on, message):
+    with pytest.raises(ValueError, match=message):
+        list(tables.iter_join("users", "orders", on))
+
+
+def test_join_command(run, capsys):
+    run("create_table a k:int", "create_table b k:int v:str")
+    run("insert a k=1", "insert a k=2", "insert b k=2 v=x", "insert b k=2 v=y")
+    capsys.readouterr()
+    run("select a join b on a.k = b.k order by b.v desc --output jsonl")
+    lines = [json.loads(s) for s in capsys.readouterr().out.splitlines() if s.startswith("{")]
+    assert [(r["a.id"], r["b.v"]) for r in lines] == [(2, "y"), (2, "x")]
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.loader import detect_format, iter_records
+
+CSV = 'name,age,ok\nIvan,30,true\n"Anna, Maria",25,false\n'
+JSONL = (
+    '{"name": "Ivan", "age": 30, "ok": true}\n\n{"name": "Anna, Maria", "age": "25", "ok": false}\n'
+)
+LOADED = [
+    {"id": 1, "name": "Ivan", "age": 30, "ok": True},
+    {"id": 2, "name": "Anna, Maria", "age": 25, "ok": False},
+]
+
+
+def write(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    ("path", "fmt", "expected"),
+    [("a.csv", None, "csv"), ("a.JSON", None, "jsonl"), ("a.txt", "jsonl", "jsonl")],
+)
+def test_detect_format(path, fmt, expected):
+    assert detect_format(path, fmt) == expected
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match="Формат файла"):
+        detect_format("a.txt", None)
+
+
+@pytest.mark.parametrize(
+    ("name", "text", "message"),
+    [
+        ("bad.csv", "a,b\n1\n", "Строка 2: число полей"),
+        ("bad.jsonl", '{"a": 1}\n{oops\n', "Строка 2: невалидный JSON"),
+        ("bad.jsonl", "[1, 2]\n", "Строка 1: ожидался объект"),
+    ],
+)
+def test_malformed_files(tmp_path, name, text, message):
+    path = write(tmp_path, name, text)
+    with pytest.raises(ValueError, match=message):
+        list(iter_records(path, detect_format(path, None)))
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, engine: DbEngine) -> DbEngine:
+    engine.create_table("t", {"name": "str", "age": "int", "ok": "bool"}, request.param)
+    return engine
+
+
+@pytest.mark.parametrize(("name", "text"), [("p.csv", CSV), ("p.jsonl", JSONL)])
+def test_load(table, tmp_path, name, text):
+    path = write(tmp_path, name, text)
+    assert table.load_rows("t", iter_records(path, detect_format(path, None))) == 2
+    assert table.read_rows("t") == LOADED
+    table.insert_rows("t", [{"id": table.catalog.next_id("t"), "name": "x", "age": 1, "ok": True}])
+    assert [r["id"] for r in table.read_rows("t")] == [1, 2, 3]
+
+
+@pytest.mark.parametrize(
+    ("records", "message"),
+    [
+        ([{"name": "a", "age": "x", "ok": "true"}], "Невалидное значение для int"),
+        ([{"name": "a", "age": "1"}], "Не задано значение для столбца: ok"),
+        ([{"name": "a", "age": "1", "ok": "true", "extra": "1"}], "Лишние столбцы"),
+    ],
+)
+def test_invalid_record_loads_nothing(table, records, message):
+    good = [{"name": "b", "age": "2", "ok": "false"}] * 3
+    with pytest.raises(ValueError, match=message):
+        table.load_rows("t", good + records)
+    assert table.read_rows("t") == []
+
+
+def test_load_command(run, tmp_path, capsys):
+    run("create_table t name:str age:int ok:bool")
+    run(f"load t {write(tmp_path, 'p.txt', CSV)} --format csv")
+    assert "Загружено строк: 2" in capsys.readouterr().out
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine, order_rows
+from primitive_db.parser import parse_where, tokenize
+
+ROWS = [{"id": i, "k": (i * 37) % 1000, "g": i % 5} for i in range(1, 1001)]
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [None, 0, 7])
+def test_order_rows_matches_sorted(descending, limit):
+    """Ties keep their input order, as with sorted()."""
+    wanted = sorted(ROWS, key=lambda r: r["g"], reverse=descending)[:limit]
+    assert list(order_rows(iter(ROWS), "g", descending, limit)) == wanted
+
+
+@pytest.fixture(params=[None, "sorted", "hash"])
+def table(request, engine: DbEngine):
+    for fmt in TABLE_FORMATS:
+        engine.create_table(f"t_{fmt}", {"k": "int", "g": "int"}, fmt)
+        engine.insert_rows(f"t_{fmt}", ROWS)
+        if request.param:
+            engine.create_index(f"t_{fmt}", "k", request.param)
+    return engine
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+@pytest.mark.parametrize(
+    ("text", "check", "descending", "limit"),
+    [
+        (None, None, False, None),
+        (None, None, True, 5),
+        ("g = 2", lambda r: r["g"] == 2, False, 4),
+        ("k < 100", lambda r: r["k"] < 100, True, None),
+    ],
+)
+def test_ordered_rows_agree_with_python(table, fmt, text, check, descending, limit):
+    name = f"t_{fmt}"
+    expr = table.resolve_where(name, parse_where(tokenize(text))) if text else None
+    matching = [r for r in ROWS if check is None or check(r)]
+    wanted = sorted(matching, key=lambda r: r["k"], reverse=descending)[:limit]
+    assert list(table.iter_ordered(name, expr, "k", descending, limit)) == wanted
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+def test_limit_stops_the_index_walk(engine, fmt):
+    engine.create_table("t", {"k": "int", "g": "int"}, fmt)
+    engine.insert_rows("t", ROWS)
+    engine.create_index("t", "k", "sorted")
+    with profile.profiling("select") as prof:
+        rows = list(engine.iter_ordered("t", None, "k", True, 3))
+    assert [r["k"] for r in rows] == [999, 998, 997]
+    assert prof.plans == ["t: обход sorted-индекса k"]
+    assert prof.counts["examined"] == 3
+
+
+def test_more_selective_index_wins(engine):
+    engine.create_table("t", {"k": "int", "g": "int"})
+    engine.insert_rows("t", ROWS)
+    engine.create_index("t", "k", "sorted")
+    engine.create_index("t", "g", "hash")
+    with profile.profiling("select") as prof:
+        rows = list(engine.iter_ordered("t", where(engine, "g = 1 and id < 30"), "k", False, 2))
+    assert (
+        rows == sorted((r for r in ROWS if r["g"] == 1 and r["id"] < 30), key=lambda r: r["k"])[:2]
+    )
+    assert not any("обход" in p for p in prof.plans)
+
+
+def test_order_by_command(run, capsys):
+    run("create_table t k:int")
+    run(*(f"insert t k={k}" for k in (3, 1, 2)))
+    with pytest.raises(ValueError, match="Неизвестный столбец"):
+        run("select t order by nope")
+    capsys.readouterr()
+    run("select t order by k desc limit 2 --output jsonl")
+    lines = [json.loads(s)["k"] for s in capsys.readouterr().out.splitlines() if s.startswith("{")]
+    assert lines == [3, 2]
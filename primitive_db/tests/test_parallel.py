@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db import parallel, profile
+from primitive_db.constants import SCAN_WORKERS_ENV_VAR, TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.parallel import ParallelScanner, scan_worker_count
+from primitive_db.parser import parse_where, tokenize
+
+ROWS = 3000
+# Formats whose files the worker processes can read; the others always scan here.
+POOLED = {"mmap", "segmented"}
+
+
+@pytest.mark.parametrize(("raw", "workers"), [(None, 0), ("0", 0), ("4", 4)])
+def test_scan_worker_count(monkeypatch, raw, workers):
+    if raw is not None:
+        monkeypatch.setenv(SCAN_WORKERS_ENV_VAR, raw)
+    assert scan_worker_count() == workers
+
+
+@pytest.mark.parametrize("raw", ["-1", "many"])
+def test_bad_scan_worker_count(monkeypatch, raw):
+    monkeypatch.setenv(SCAN_WORKERS_ENV_VAR, raw)
+    with pytest.raises(ValueError, match=SCAN_WORKERS_ENV_VAR):
+        scan_worker_count()
+
+
+def test_partitions_cover_the_table(monkeypatch):
+    monkeypatch.setattr(parallel, "SCAN_PARTITION_MIN_ROWS", 10)
+    parts = ParallelScanner(2).partitions(95)
+    assert parts[0][0] == 0 and parts[-1][1] == 95
+    assert all(a[1] == b[0] for a, b in zip(parts, parts[1:], strict=False))
+    assert len(parts) == 8  # Four per worker.
+    assert not ParallelScanner(1).enabled(10**9)
+
+
+@pytest.fixture
+def small_tables(monkeypatch):
+    """Pool thresholds low enough for a few thousand rows to be split up."""
+    monkeypatch.setattr(parallel, "PARALLEL_SCAN_MIN_ROWS", 1000)
+    monkeypatch.setattr(parallel, "SCAN_PARTITION_MIN_ROWS", 500)
+
+
+@pytest.fixture
+def pooled(small_tables):
+    eng = DbEngine(scan_workers=2)
+    yield eng
+    eng.close()
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+@pytest.mark.parametrize("text", ["k < 10 and s = s3", "k = 5 or s = s1", "s != s2"])
+def test_parallel_scan_equals_serial(engine, small_tables, fmt, text):
+    engine.create_table("t", {"k": "int", "s": "str"}, fmt)
+    engine.insert_rows("t", [{"id": i, "k": i % 97, "s": f"s{i % 5}"} for i in range(1, ROWS + 1)])
+    serial = list(engine.iter_rows("t", where(engine, text)))
+    pooled = DbEngine(scan_workers=2)  # Nothing decoded in it yet.
+    try:
+        with profile.profiling("select") as prof:
+            rows = list(pooled.iter_rows("t", where(pooled, text)))
+    finally:
+        pooled.close()
+    assert rows == serial
+    assert any("процессов: 2" in p for p in prof.plans) == (fmt in POOLED)
+    assert prof.counts["examined"] == ROWS
+
+
+@pytest.mark.parametrize("fmt", sorted(POOLED))
+def test_limit_stays_serial(pooled, fmt):
+    pooled.create_table("t", {"k": "int"}, fmt)
+    pooled.insert_rows("t", [{"id": i, "k": i} for i in range(1, ROWS + 1)])
+    with profile.profiling("select") as prof:
+        rows = list(pooled.iter_rows("t", where(pooled, "k > 10 and k < 20"), top=3))
+    assert [r["k"] for r in rows][:3] == [11, 12, 13]
+    assert not any("процессов" in p for p in prof.plans)
+
+
+def test_decoded_segments_are_scanned_here(pooled):
+    pooled.create_table("t", {"k": "int"}, "segmented")
+    pooled.insert_rows("t", [{"id": i, "k": i} for i in range(1, ROWS + 1)])
+    expr = where(pooled, "k >= 0 and k != 7")
+    list(pooled.iter_rows("t", expr, top=1))  # Decodes the segments in this process.
+    with profile.profiling("select") as prof:
+        assert len(list(pooled.iter_rows("t", expr))) == ROWS - 1
+    assert not any("процессов" in p for p in prof.plans)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db.parser import (
+    BetweenClause,
+    InClause,
+    WhereClause,
+    WhereGroup,
+    parse_where,
+    split_set_tokens,
+    split_where,
+    tokenize,
+)
+
+
+def where(text: str):
+    return parse_where(tokenize(text))
+
+
+def test_comparison():
+    assert where("age >= 18") == WhereClause("age", ">=", "18")
+
+
+def test_in_list():
+    assert where("name in (Ivan, 'Anna Maria')") == InClause("name", ("Ivan", "Anna Maria"))
+
+
+def test_between():
+    assert where("age between 18 and 30") == BetweenClause("age", "18", "30")
+
+
+def test_and_binds_tighter_than_or():
+    assert where("a = 1 or b = 2 and c = 3") == WhereGroup(
+        "or",
+        (
+            WhereClause("a", "=", "1"),
+            WhereGroup("and", (WhereClause("b", "=", "2"), WhereClause("c", "=", "3"))),
+        ),
+    )
+
+
+def test_parentheses_and_between_inside_and():
+    assert where("(a between 1 and 2 or b in (x)) and c != 3") == WhereGroup(
+        "and",
+        (
+            WhereGroup("or", (BetweenClause("a", "1", "2"), InClause("b", ("x",)))),
+            WhereClause("c", "!=", "3"),
+        ),
+    )
+
+
+def test_quoted_keywords_are_values():
+    assert where('note = "where and or"') == WhereClause("note", "=", "where and or")
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "a =", "a ~ 1", "(a = 1", "a in (1, 2", "a between 1 or 2", "a = 1 b = 2", 'a = "x'],
+)
+def test_malformed(text: str):
+    with pytest.raises(ValueError):
+        where(text)
+
+
+def test_split_where_skips_where_as_a_value():
+    tokens = split_where("update t set note=where where id=1")
+    assert tokens is not None
+    assert parse_where(tokens) == WhereClause("id", "=", "1")
+
+
+def test_split_where_skips_column_named_where():
+    tokens = split_where("update t set where = 5 where note = where")
+    assert tokens is not None
+    assert parse_where(tokens) == WhereClause("note", "=", "where")
+
+
+def test_split_where_without_condition():
+    assert split_where("update t set note=where") is None
+    assert split_where('update t set note="a where b"') is None
+
+
+def test_split_set_tokens():
+    assert split_set_tokens(["set", "note=where", "where", "id=1"]) == (["note=where"], ["id=1"])
+    assert split_set_tokens(["set", "a=1,", "b=a where b", "where", "id", "=", "2"]) == (
+        ["a=1", "b=a where b"],
+        ["id", "=", "2"],
+    )
+    assert split_set_tokens(["set", "where", "=", "3"]) == (["where = 3"], [])
+
+
+def test_update_sets_value_where(run, engine):
+    run(
+        "create_table t note:str",
+        "insert t note=a",
+        "insert t note=b",
+        "update t set note=where where id = 1",
+    )
+    assert [r["note"] for r in engine.read_rows("t")] == ["where", "b"]
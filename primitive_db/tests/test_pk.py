@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, engine):
+    engine.create_table("t", {"k": "int"}, request.param)
+    engine.insert_rows("t", [{"id": i, "k": i * 10} for i in range(1, 501)])
+    return engine
+
+
+def test_plan_uses_the_primary_key(table):
+    plan = table.plan_query("t", where(table, "id = 150"))
+    assert (plan.access, plan.estimate) == ("pk", 1)
+    plan = table.plan_query("t", where(table, "id in (3, 7, 9999) and k > 0"))
+    assert (plan.access, plan.estimate) == ("pk", 3)
+    assert table.plan_query("t", where(table, "k = 1500")).access == "scan"
+
+
+def test_id_lookup_examines_only_matching_rows(table):
+    with profile.profiling("select") as prof:
+        rows = list(table.iter_rows("t", where(table, "id = 150")))
+    assert rows == [{"id": 150, "k": 1500}]
+    assert prof.counts["examined"] == 1
+
+    with profile.profiling("select") as prof:
+        rows = list(table.iter_rows("t", where(table, "id in (3, 7, 9999) and k > 30")))
+    assert rows == [{"id": 7, "k": 70}]
+    assert prof.counts["examined"] == 2
+
+
+def test_update_and_delete_by_id(table):
+    table.update_rows("t", list(table.iter_rows("t", where(table, "id = 5"))), {"k": -1})
+    table.delete_rows("t", list(table.iter_rows("t", where(table, "id = 6"))))
+    assert list(table.iter_rows("t", where(table, "id in (4, 5, 6)"))) == [
+        {"id": 4, "k": 40},
+        {"id": 5, "k": -1},
+    ]
+    assert len(table.read_rows("t")) == 499
+
+
+def test_map_follows_appends(table):
+    positions = table._storage("t").positions("t")
+    assert len(positions) == 500
+    table.insert_rows("t", [{"id": 501, "k": 0}])
+    assert set(table._storage("t").positions("t")) == set(range(1, 502))
+    assert list(table.iter_rows("t", where(table, "id = 501"))) == [{"id": 501, "k": 0}]
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import operator
+
+import pytest
+
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+from primitive_db.predicate import (
+    And,
+    Cmp,
+    Or,
+    column_mask,
+    compile_expr,
+    compile_test,
+    filter_rows,
+    iter_filter,
+)
+
+ROWS = [{"id": i, "k": i % 10, "s": f"v{i % 3}"} for i in range(1, 61)]
+
+EXPRS = [
+    Cmp("k", "<", 3),
+    Cmp("k", ">=", 7),
+    Cmp("s", "!=", "v1"),
+    Cmp("k", "in", frozenset({1, 4})),
+    And((Cmp("k", ">", 2), Cmp("k", "<=", 5), Cmp("s", "=", "v0"))),
+    Or((Cmp("k", "=", 0), And((Cmp("s", "=", "v2"), Cmp("id", ">", 50))))),
+]
+
+
+def naive(expr, row) -> bool:
+    if isinstance(expr, Cmp):
+        if expr.op == "in":
+            return row[expr.column] in expr.value
+        ops = {"=": operator.eq, "!=": operator.ne, "<": operator.lt}
+        ops |= {"<=": operator.le, ">": operator.gt, ">=": operator.ge}
+        return ops[expr.op](row[expr.column], expr.value)
+    results = [naive(p, row) for p in expr.parts]
+    return all(results) if isinstance(expr, And) else any(results)
+
+
+@pytest.mark.parametrize(("op", "value", "hits"), [("<", 5, [4]), (">=", 5, [5, 6]), ("=", 5, [5])])
+def test_compiled_test_keeps_operand_order(op, value, hits):
+    test = compile_test(op, value)
+    assert [x for x in (4, 5, 6) if test(x)] == hits
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError, match="Неверный оператор"):
+        compile_test("~", 1)
+
+
+@pytest.mark.parametrize("expr", EXPRS)
+def test_every_evaluator_agrees(expr):
+    expected = [r for r in ROWS if naive(expr, r)]
+    assert expected  # Each case should select something.
+    assert [r for r in ROWS if compile_expr(expr)(r)] == expected
+    assert filter_rows(expr, ROWS) == expected
+    assert list(iter_filter(expr, iter(ROWS))) == expected
+    columns = {c: [r[c] for r in ROWS] for c in ROWS[0]}
+    assert [r for r, keep in zip(ROWS, column_mask(expr, columns), strict=True) if keep] == expected
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+@pytest.mark.parametrize(
+    ("text", "check"),
+    [
+        ("k between 3 and 5", lambda r: 3 <= r["k"] <= 5),
+        ("s in (v0, v2) and k != 0", lambda r: r["s"] in ("v0", "v2") and r["k"] != 0),
+        ("k = 9 or s = v1 and id < 10", lambda r: r["k"] == 9 or (r["s"] == "v1" and r["id"] < 10)),
+    ],
+)
+def test_storage_scans_match_python(engine: DbEngine, fmt, text, check):
+    engine.create_table("t", {"k": "int", "s": "str"}, fmt)
+    engine.insert_rows("t", ROWS)
+    expr = engine.resolve_where("t", parse_where(tokenize(text)))
+    assert list(engine.iter_rows("t", expr)) == [r for r in ROWS if check(r)]
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.constants import PROFILE_TABLE, TABLE_FORMATS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """perf_counter advancing one second per call."""
+    ticks = itertools.count()
+    monkeypatch.setattr(profile, "perf_counter", lambda: float(next(ticks)))
+
+
+def test_nested_phases_are_not_counted_twice(clock):
+    with profile.profiling("select") as prof:  # t=0
+        with profile.phase("filter"):  # 1
+            with profile.phase("load"):  # 2
+                pass  # 3
+        # filter ends at 4
+    assert prof.phases["load"] == 1
+    assert prof.phases["filter"] == 2  # 3 seconds less the 1 spent loading.
+    assert prof.total == 5
+    assert prof.breakdown() == "load 1000.00, filter 2000.00 ms; кэш 0/0"
+
+
+def test_helpers_do_nothing_when_off():
+    profile.count("examined")
+    profile.note("plan")
+    profile.touch("t")
+    rows = [{"id": 1}]
+    assert list(profile.counted(profile.timed(rows, "filter"), "examined")) == rows
+    assert profile.active() is None
+
+
+def test_counters_and_stats_row():
+    with profile.profiling("select", "select t") as prof:
+        profile.touch("t")
+        profile.touch("u")
+        profile.note("t: all")
+        list(profile.counted(range(3), "examined"))
+        profile.count("cache_hit", 2)
+    row = prof.stats_row()
+    assert row["target"] == "t"
+    assert (row["examined"], row["cache_hits"], row["plan"]) == (3, 2, "t: all")
+    assert row.keys() == profile.STATS_SCHEMA.keys()
+
+
+@pytest.mark.parametrize("fmt", TABLE_FORMATS)
+def test_explain(run, capsys, fmt):
+    run(f"create_table t k:int --format {fmt}")
+    run(*(f"insert t k={i}" for i in range(10)))
+    capsys.readouterr()
+    run("explain select t where id = 3")
+    out = capsys.readouterr().out
+    assert "План: t: pk, ~1 строк" in out
+    assert "Просмотрено строк: 1, возвращено: 1" in out
+    run("explain select t where k >= 4 limit 2")
+    assert "возвращено: 2" in capsys.readouterr().out
+
+
+def stats(engine) -> list[dict]:
+    return engine.read_rows(PROFILE_TABLE) if PROFILE_TABLE in engine.list_tables() else []
+
+
+def test_profile_records_each_command(run, engine, capsys):
+    run("create_table t k:int", "insert t k=1")
+    assert stats(engine) == []
+    run("profile on", "insert t k=2", "select t where k = 2", f"select {PROFILE_TABLE}")
+    rows = stats(engine)
+    assert [(r["command"], r["target"]) for r in rows] == [("insert", "t"), ("select", "t")]
+    assert rows[1]["query"] == "select t where k = 2"
+    assert (rows[1]["examined"], rows[1]["returned"]) == (2, 1)
+    run("profile off", "select t")
+    assert len(stats(engine)) == 2
+
+
+def test_stats_survive_a_rollback(run, engine):
+    run("create_table t k:int", "profile on", "begin", "insert t k=1", "rollback")
+    assert engine.read_rows("t") == []
+    assert [r["command"] for r in stats(engine)] == ["begin", "insert", "rollback"]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from primitive_db.decorators import set_auto_confirm
+from primitive_db.engine import DbEngine
+from primitive_db.main import main
+
+
+@pytest.fixture(autouse=True)
+def reset_confirm():
+    yield
+    set_auto_confirm(None)  # main() sets it for the whole process.
+
+
+def script(tmp_path, text: str) -> str:
+    path = tmp_path / "job.sql"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def rows(table: str) -> list[dict] | None:
+    """The table's rows as another process would see them (None if there is no table)."""
+    engine = DbEngine(scan_workers=0)
+    try:
+        return engine.read_rows(table) if table in engine.list_tables() else None
+    finally:
+        engine.close()
+
+
+SETUP = "create_table t k:int\n# comment\n-- comment too\n\ninsert t k=1\ninsert t k=2\n"
+
+
+def test_script_runs_every_command(tmp_path, capsys):
+    assert main(["--script", script(tmp_path, SETUP + "update t set k=5 where id = 2\n")]) == 0
+    assert rows("t") == [{"id": 1, "k": 1}, {"id": 2, "k": 5}]
+
+
+@pytest.mark.parametrize("command", ["delete t where k = 1", "drop_table t"])
+def test_destructive_command_without_yes_fails(tmp_path, capsys, command):
+    assert main(["--script", script(tmp_path, f"{SETUP}{command}\ninsert t k=3\n")]) == 1
+    assert "--yes" in capsys.readouterr().out
+    assert rows("t") == [{"id": 1, "k": 1}, {"id": 2, "k": 2}]  # Stopped there.
+
+
+def test_destructive_command_with_yes(tmp_path, capsys):
+    assert main(["--script", script(tmp_path, SETUP + "delete t where k = 1\n"), "--yes"]) == 0
+    assert rows("t") == [{"id": 2, "k": 2}]
+
+
+def test_first_error_stops_the_script(tmp_path, capsys):
+    assert main(["--script", script(tmp_path, SETUP + "insert t k=x\ninsert t k=3\n")]) == 1
+    assert "(строка 7)" in capsys.readouterr().out
+    assert [r["k"] for r in rows("t")] == [1, 2]
+
+
+def test_batch_writes_all_or_nothing(tmp_path, capsys):
+    assert main(["--script", script(tmp_path, "create_table t k:int\n")]) == 0
+    ok = script(tmp_path, "insert t k=1\ninsert t k=2\n")
+    assert main(["--script", ok, "--batch"]) == 0
+    bad = script(tmp_path, "insert t k=3\ninsert t k=x\n")
+    assert main(["--script", bad, "--batch"]) == 1
+    assert [r["k"] for r in rows("t")] == [1, 2]
+
+
+def test_batch_rejects_ddl(tmp_path, capsys):
+    assert main(["--script", script(tmp_path, "create_table t k:int\n"), "--batch"]) == 1
+    assert rows("t") is None
+
+
+def test_script_from_stdin(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO("create_table t k:int\ninsert t k=7\n"))
+    assert main(["--script", "-"]) == 0
+    assert rows("t") == [{"id": 1, "k": 7}]
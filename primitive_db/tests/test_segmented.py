@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from primitive_db import profile, storage
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+from primitive_db.predicate import And, Cmp, Or
+from primitive_db.segments import may_match
+from primitive_db.utils import read_json, segment_manifest_path, segments_dir
+
+ZONES = {"k": [10, 20], "s": ["b", "d"]}
+
+
+@pytest.mark.parametrize(
+    ("expr", "possible"),
+    [
+        (Cmp("k", "=", 15), True),
+        (Cmp("k", "=", 25), False),
+        (Cmp("k", "<", 10), False),
+        (Cmp("k", ">=", 20), True),
+        (Cmp("k", "in", frozenset({1, 30})), False),
+        (Cmp("s", ">", "d"), False),
+        (Cmp("k", "!=", 15), True),
+        (Cmp("other", "=", 1), True),
+        (Cmp("k", "=", "text"), True),  # Incomparable values never rule a segment out.
+        (And((Cmp("k", ">", 12), Cmp("s", "=", "z"))), False),
+        (Or((Cmp("k", ">", 50), Cmp("s", "=", "c"))), True),
+    ],
+)
+def test_zone_maps(expr, possible):
+    assert may_match(expr, ZONES) is possible
+
+
+@pytest.fixture
+def table(monkeypatch, engine: DbEngine) -> DbEngine:
+    monkeypatch.setattr(storage, "SEGMENT_ROWS", 100)
+    engine.create_table("t", {"k": "int"}, "segmented")
+    engine.insert_rows("t", [{"id": i, "k": i} for i in range(1, 251)])
+    return engine
+
+
+def segments() -> list[dict]:
+    return read_json(segment_manifest_path("t"))["segments"]
+
+
+def files() -> set[str]:
+    return set(os.listdir(segments_dir("t"))) - {"manifest.json"}
+
+
+def where(engine: DbEngine, text: str):
+    return engine.resolve_where("t", parse_where(tokenize(text)))
+
+
+def test_rows_are_split_into_segments(table):
+    assert [(s["rows"], s["ids"], s["zones"]["k"]) for s in segments()] == [
+        (100, [1, 100], [1, 100]),
+        (100, [101, 200], [101, 200]),
+        (50, [201, 250], [201, 250]),
+    ]
+    table.insert_rows("t", [{"id": i, "k": i} for i in range(251, 361)])
+    assert [s["rows"] for s in segments()] == [100, 100, 100, 60]
+
+
+def test_writes_replace_only_the_segments_they_touch(table):
+    before = segments()
+    table.update_rows("t", list(table.iter_rows("t", where(table, "id = 150"))), {"k": -1})
+    after = segments()
+    assert [s["file"] == b["file"] for s, b in zip(after, before, strict=True)] == [
+        True,
+        False,
+        True,
+    ]
+    assert after[1]["zones"]["k"] == [-1, 200]
+    assert files() == {s["file"] for s in after}  # The replaced file is gone.
+
+    table.delete_rows("t", list(table.iter_rows("t", where(table, "id <= 100"))))
+    assert [s["ids"] for s in segments()] == [[101, 200], [201, 250]]
+    assert len(table.read_rows("t")) == 150
+
+
+def test_scans_skip_ruled_out_segments(table):
+    with profile.profiling("select") as prof:
+        rows = list(table.iter_rows("t", where(table, "k > 120 and k < 130")))
+    assert [r["k"] for r in rows] == list(range(121, 130))
+    assert "t: сегментов 1 из 3" in prof.plans
+    assert prof.counts["examined"] == 100
+
+
+def test_id_inside_an_earlier_segment_is_merged(table):
+    table.delete_rows("t", list(table.iter_rows("t", where(table, "id = 50"))))
+    table.insert_rows("t", [{"id": 50, "k": 5000}, {"id": 300, "k": 300}])
+    assert [r["id"] for r in table.read_rows("t")] == [*range(1, 251), 300]
+    assert segments()[0]["zones"]["k"] == [1, 5000]
+
+
+def test_compact_repacks_segments(table):
+    table.delete_rows(
+        "t", list(table.iter_rows("t", where(table, "k <= 80 or k between 101 and 180")))
+    )
+    assert [s["rows"] for s in segments()] == [20, 20, 50]
+    rows = table.read_rows("t")
+    table.compact_table("t")
+    assert [s["rows"] for s in segments()] == [90]
+    assert files() == {segments()[0]["file"]}
+
+    other = DbEngine(scan_workers=0)
+    try:
+        assert other.read_rows("t") == rows
+    finally:
+        other.close()
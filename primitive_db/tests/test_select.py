@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+from primitive_db import profile
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.render import write_rows
+
+ROWS = [{"id": 1, "name": "a,b"}, {"id": 2, "name": "c"}, {"id": 3, "name": None}]
+
+
+def rendered(output: str, page_size: int = 100) -> tuple[int, str]:
+    out = io.StringIO()
+    count = write_rows(iter(ROWS), ["id", "name"], output, out, page_size)
+    return count, out.getvalue()
+
+
+def test_csv_and_tsv():
+    assert rendered("csv") == (3, 'id,name\n1,"a,b"\n2,c\n3,\n')
+    assert rendered("tsv") == (3, "id\tname\n1\ta,b\n2\tc\n3\t\n")
+
+
+def test_jsonl():
+    count, text = rendered("jsonl")
+    assert count == 3
+    assert [json.loads(line) for line in text.splitlines()] == ROWS
+
+
+def test_table_is_printed_in_pages():
+    count, text = rendered("table", page_size=2)
+    assert count == 3
+    assert text.count("| id |") == 2
+
+
+def test_unknown_output():
+    with pytest.raises(ValueError, match="Неизвестный формат вывода"):
+        rendered("xml")
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, run):
+    run(f"create_table t k:int --format {request.param}")
+    run(*(f"insert t k={i}" for i in range(1, 201)))
+    return run
+
+
+def selected(capsys, run, line: str) -> list[int]:
+    capsys.readouterr()
+    run(line + " --output jsonl")
+    return [json.loads(s)["k"] for s in capsys.readouterr().out.splitlines() if s.startswith("{")]
+
+
+def test_limit_and_offset(table, capsys):
+    assert selected(capsys, table, "select t limit 3") == [1, 2, 3]
+    assert selected(capsys, table, "select t where k > 100 limit 2 offset 5") == [106, 107]
+    assert selected(capsys, table, "select t offset 198") == [199, 200]
+    assert selected(capsys, table, "select t limit 0") == []
+
+
+def test_limit_stops_the_scan(table, capsys):
+    with profile.profiling("select") as prof:
+        assert selected(capsys, table, "select t limit 3 offset 2") == [3, 4, 5]
+    assert prof.counts["examined"] == 5
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from primitive_db.client import Connection
+from primitive_db.decorators import set_auto_confirm
+from primitive_db.server import DbServer, frame
+
+
+@pytest.fixture
+def server(engine):
+    set_auto_confirm(True)
+    yield DbServer(engine)
+    set_auto_confirm(None)
+
+
+def test_frame():
+    assert frame("ok", "да\n") == b"ok 5\n\xd0\xb4\xd0\xb0\n"
+    assert frame("error", "") == b"error 0\n"
+
+
+def test_ok_reply_has_output_without_timing(server):
+    assert server.execute("create_table t k:int")[0] == "ok"
+    status, body = server.execute("insert t k=1")
+    assert status == "ok"
+    assert body
+    assert "[time]" not in body
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "insert t k=oops",  # Bad value.
+        "select missing",  # Unknown table.
+        "frobnicate t",  # Unknown command.
+        "select t where k =",  # Malformed condition.
+    ],
+)
+def test_failures_are_framed_as_errors(server, line):
+    server.execute("create_table t k:int")
+    status, body = server.execute(line)
+    assert status == "error"
+    assert body
+
+
+def test_failed_command_changes_nothing(server, engine):
+    server.execute("create_table t k:int")
+    server.execute("insert t k=1")
+    assert server.execute("insert t k=oops")[0] == "error"
+    assert engine.read_rows("t") == [{"id": 1, "k": 1}]
+
+
+def test_pipeline_over_tcp(server):
+    loop = asyncio.new_event_loop()
+    holder: dict[str, asyncio.AbstractServer] = {}
+
+    async def start() -> None:
+        holder["server"] = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(start(), loop).result()
+    port = holder["server"].sockets[0].getsockname()[1]
+    conn = Connection("127.0.0.1", port)
+    try:
+        conn.pipeline(["create_table t k:int", "insert t k=1"])
+        with pytest.raises(ValueError):
+            conn.pipeline(["insert t k=2", "insert t k=oops", "insert t k=3"])
+        # Every reply of the failed batch was read, so the connection stays in step.
+        assert "3" in conn.execute("select t where k = 3")
+    finally:
+        conn.close()
+
+        async def stop() -> None:
+            holder["server"].close()
+            await holder["server"].wait_closed()
+
+        asyncio.run_coroutine_threadsafe(stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
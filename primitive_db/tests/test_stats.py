@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import pytest
+
+from primitive_db.constants import TABLE_FORMATS
+from primitive_db.engine import DbEngine
+from primitive_db.parser import parse_where, tokenize
+from primitive_db.predicate import And, Cmp, Or
+from primitive_db.stats import ColumnStats, Histogram, Sketch, TableStats
+
+
+@pytest.mark.parametrize(
+    "values", [list(range(20_000)), [f"user{i}" for i in range(20_000)], [1.5, 2.5] * 100]
+)
+def test_sketch_counts_distinct_values(values):
+    sketch = Sketch()
+    sketch.add_many(values)
+    sketch.add_many(values[: len(values) // 2])  # Repeats change nothing.
+    distinct = len(set(values))
+    assert abs(sketch.count() - distinct) <= distinct * 0.05
+    assert Sketch.from_json(sketch.to_json()).count() == sketch.count()
+
+
+def test_histogram_is_equi_depth():
+    hist = Histogram.build(list(range(100)), buckets=4)
+    assert hist.counts == [25, 25, 25, 25]
+    assert hist.below(50) == pytest.approx(0.5, abs=0.02)
+    assert hist.below(-1) == 0.0
+    assert hist.below(1000) == 1.0
+    hist.add_many([200, 300])
+    assert (hist.bounds[-1], sum(hist.counts)) == (300, 102)
+
+
+def test_removing_a_bound_makes_it_inexact():
+    col = ColumnStats()
+    col.add_many([3, 1, None, 2])
+    assert (col.nulls, col.min, col.max, col.exact_bounds) == (1, 1, 3, True)
+    col.remove(2)
+    assert col.exact_bounds
+    col.remove(3)
+    assert not col.exact_bounds
+
+
+@pytest.mark.parametrize(
+    ("expr", "share"),
+    [
+        (Cmp("k", "=", 5), 0.01),
+        (Cmp("k", "<", 25), 0.25),
+        (Cmp("k", ">=", 90), 0.1),
+        (Cmp("k", "=", 500), 0.0),
+        (Or((Cmp("k", "<", 10), Cmp("k", ">=", 90))), 0.19),
+        (And((Cmp("k", "in", frozenset({1, 2})), Cmp("id", "<", 500))), 0.01),
+    ],
+)
+def test_selectivity(expr, share):
+    rows = ({"id": i, "k": i % 100} for i in range(1000))
+    stats = TableStats.build({"id": "int", "k": "int"}, rows)
+    assert stats.selectivity(expr) == pytest.approx(share, abs=0.03)
+
+
+def snapshot(stats: TableStats) -> dict:
+    return {name: (c.nulls, c.min, c.max) for name, c in stats.columns.items()} | {
+        "rows": stats.rows
+    }
+
+
+@pytest.fixture(params=TABLE_FORMATS)
+def table(request, engine: DbEngine) -> DbEngine:
+    engine.create_table("t", {"k": "int", "s": "str"}, request.param)
+    engine.insert_rows("t", [{"id": i, "k": i % 100, "s": f"s{i % 7}"} for i in range(1, 1001)])
+    return engine
+
+
+def test_writes_keep_stats_in_step(table):
+    table.update_rows("t", table.read_rows("t")[:10], {"k": 500})
+    table.delete_rows("t", table.read_rows("t")[-10:])
+    table.insert_rows("t", [{"id": 1001, "k": -5, "s": "new"}])
+    stats, exact = table.table_stats("t")
+    assert exact
+    rebuilt = table.analyze("t")
+    assert snapshot(stats) == snapshot(rebuilt)
+    assert rebuilt.distinct("s") == 8
+
+
+def test_scan_estimates_come_from_stats(table):
+    for text, actual in [("k < 20", 200), ("k >= 50 and s = s1", 72)]:
+        where = table.resolve_where("t", parse_where(tokenize(text)))
+        assert sum(1 for _ in table.iter_rows("t", where)) == actual
+        assert table.plan_query("t", where).estimate == pytest.approx(actual, rel=0.2)
+
+
+def test_stats_are_saved_and_checked_against_the_file(table):
+    table.flush_stats()
+    other = DbEngine(scan_workers=0)
+    try:
+        stats, exact = other.table_stats("t")
+        assert exact and stats.rows == 1000
+        other.insert_rows("t", [{"id": 2000, "k": 1, "s": "x"}])
+        other.flush_stats()
+    finally:
+        other.close()
+    stats, exact = table.table_stats("t")
+    assert exact and stats.rows == 1001  # Saved for the file as it is now.
+
+    third = DbEngine(scan_workers=0)
+    third.insert_rows("t", [{"id": 2001, "k": 1, "s": "x"}])
+    del third  # Gone without saving its statistics.
+    stats, exact = table.table_stats("t")
+    assert not exact and stats.rows == 1001
+    assert table.analyze("t").rows == 1002
+
+
+def test_analyze_command(run, capsys):
+    run("create_table t k:int", "insert t k=3", "insert t k=1")
+    capsys.readouterr()
+    run("analyze t")
+    assert "Статистика обновлена: t (2 строк)" in capsys.readouterr().out
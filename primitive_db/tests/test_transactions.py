@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+import pytest
+
+from primitive_db.engine import DbEngine
+from primitive_db.utils import commit_intent_path
+
+
+@pytest.fixture
+def tables(engine):
+    for name in ("a", "b"):
+        engine.create_table(name, {"k": "int"})
+        engine.insert_rows(name, [{"id": 1, "k": 0}])
+    return engine
+
+
+def test_changes_stay_private_until_commit(tables):
+    tables.begin()
+    tables.insert_rows("a", [{"id": 2, "k": 1}])
+    assert len(tables.read_rows("a")) == 2
+
+    other = DbEngine(scan_workers=0)
+    try:
+        assert len(other.read_rows("a")) == 1
+        assert tables.commit() == ["a"]
+        assert len(other.read_rows("a")) == 2
+    finally:
+        other.close()
+
+
+def test_rollback_discards_changes(tables):
+    tables.begin()
+    tables.delete_rows("a", None)
+    tables.update_rows("b", tables.read_rows("b"), {"k": 5})
+    tables.rollback()
+    assert tables.read_rows("a") == [{"id": 1, "k": 0}]
+    assert tables.read_rows("b") == [{"id": 1, "k": 0}]
+
+
+def test_conflicting_commit_writes_nothing(tables):
+    tables.begin()
+    tables.update_rows("a", tables.read_rows("a"), {"k": 1})
+    tables.update_rows("b", tables.read_rows("b"), {"k": 1})
+
+    other = DbEngine(scan_workers=0)
+    try:
+        other.insert_rows("b", [{"id": 2, "k": 2}])
+    finally:
+        other.close()
+
+    with pytest.raises(ValueError, match="другой процесс"):
+        tables.commit()
+    assert not tables.in_transaction
+    assert tables.read_rows("a") == [{"id": 1, "k": 0}]
+    assert tables.read_rows("b") == [{"id": 1, "k": 0}, {"id": 2, "k": 2}]
+    assert not os.path.exists(commit_intent_path())
+
+
+def _commit_and_crash(path: str) -> None:
+    os.chdir(path)
+    engine = DbEngine(scan_workers=0)
+    engine.begin()
+    engine.insert_rows("a", [{"id": 2, "k": 1}])
+    engine.insert_rows("b", [{"id": 2, "k": 2}])
+    write_rows = engine.write_rows
+
+    def crash_on_second_table(table, rows):
+        if table == "b":
+            os._exit(1)
+        write_rows(table, rows)
+
+    engine.write_rows = crash_on_second_table  # type: ignore[method-assign]
+    engine.commit()
+
+
+def test_multi_table_commit_is_finished_after_crash(tables, db_dir):
+    proc = multiprocessing.get_context("spawn").Process(
+        target=_commit_and_crash, args=(str(db_dir),)
+    )
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 1
+    assert os.path.exists(commit_intent_path())
+
+    # Any command redoes the interrupted commit before it runs.
+    with tables.command():
+        assert [r["id"] for r in tables.read_rows("a")] == [1, 2]
+        assert [r["id"] for r in tables.read_rows("b")] == [1, 2]
+    assert not os.path.exists(commit_intent_path())
+
+
+def test_failed_command_in_script_rolls_back(run, engine, tmp_path):
+    from primitive_db.core import DbCore
+    from primitive_db.main import run_script
+
+    run("create_table t k:int", "insert t k=1")
+    script = tmp_path / "batch.txt"
+    script.write_text("insert t k=2\ninsert t k=oops\n", encoding="utf-8")
+    assert run_script(DbCore(engine), str(script), batch=True) == 1
+    assert [r["k"] for r in engine.read_rows("t")] == [1]
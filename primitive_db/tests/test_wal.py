@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+import pytest
+
+from primitive_db.engine import DbEngine
+from primitive_db.utils import rows_path, table_log_path
+from primitive_db.wal import SyncPolicy, WriteAheadLog
+
+
+def test_torn_tail_is_not_replayed_and_is_trimmed(db_dir):
+    log = WriteAheadLog(str(db_dir / "t.log"), SyncPolicy("always"))
+    log.append({"op": "insert", "rows": [{"id": 1}]})
+    log.close()
+    with open(log.path, "ab") as f:
+        f.write(b'{"op": "insert", "rows": [{"id"')  # Crash in the middle of an append.
+
+    records, offset = log.read_from(0)
+    assert records == [{"op": "insert", "rows": [{"id": 1}]}]
+
+    log.append({"op": "delete", "ids": [1]})
+    log.close()
+    records, end = log.read_from(0)
+    assert records == [{"op": "insert", "rows": [{"id": 1}]}, {"op": "delete", "ids": [1]}]
+    assert end == os.path.getsize(log.path) > offset
+
+
+def _insert_and_crash(path: str) -> None:
+    os.chdir(path)
+    engine = DbEngine(SyncPolicy("always"), scan_workers=0)
+    engine.insert_rows("t", [{"id": 1, "k": 1}, {"id": 2, "k": 2}])
+    engine.update_rows("t", [{"id": 1, "k": 1}], {"k": 10})
+    engine.delete_rows("t", [{"id": 2, "k": 2}])
+    os._exit(1)  # No close(): nothing is checkpointed or flushed.
+
+
+def test_log_table_replays_after_crash(db_dir):
+    engine = DbEngine(scan_workers=0)
+    engine.create_table("t", {"k": "int"}, "log")
+    engine.close()
+
+    proc = multiprocessing.get_context("spawn").Process(
+        target=_insert_and_crash, args=(str(db_dir),)
+    )
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 1
+    with open(table_log_path("t"), "ab") as f:
+        f.write(b'{"op": "truncate"')  # And a torn record after the durable ones.
+
+    engine = DbEngine(scan_workers=0)
+    try:
+        assert engine.read_rows("t") == [{"id": 1, "k": 10}]
+        engine.insert_rows("t", [{"id": 3, "k": 3}])
+        assert engine.checkpoint() == ["t"]
+        assert os.path.getsize(table_log_path("t")) == 0
+    finally:
+        engine.close()
+    engine = DbEngine(scan_workers=0)
+    try:
+        assert engine.read_rows("t") == [{"id": 1, "k": 10}, {"id": 3, "k": 3}]
+    finally:
+        engine.close()
+
+
+def test_mmap_append_overwrites_torn_record(engine):
+    engine.create_table("t", {"k": "int"}, "mmap")
+    engine.insert_rows("t", [{"id": 1, "k": 1}])
+    with open(rows_path("t"), "ab") as f:
+        f.write(b"\x01torn")  # Part of a record from a crashed append.
+
+    assert engine.read_rows("t") == [{"id": 1, "k": 1}]
+    engine.insert_rows("t", [{"id": 2, "k": 2}])
+    assert engine.read_rows("t") == [{"id": 1, "k": 1}, {"id": 2, "k": 2}]
+
+
+@pytest.mark.parametrize("fmt", ["json", "columnar", "segmented", "mmap"])
+@pytest.mark.parametrize(("mode", "synced"), [("off", False), ("group", True), ("always", True)])
+def test_file_replaces_follow_sync_policy(monkeypatch, fmt, mode, synced):
+    engine = DbEngine(SyncPolicy(mode), scan_workers=0)
+    try:
+        engine.create_table("t", {"k": "int"}, fmt)
+        engine.create_index("t", "k", "hash")
+        calls = []
+        monkeypatch.setattr(os, "fsync", calls.append)
+        engine.insert_rows("t", [{"id": 1, "k": 1}])
+        engine.update_rows("t", engine.read_rows("t"), {"k": 2})
+        engine.flush_indexes()
+        assert bool(calls) is synced
+    finally:
+        engine.close()